@@ -1,20 +1,33 @@
-import undetected_chromedriver as uc
-import random
 import time
 import json
 import logging
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import instrumentation
+from browser_pool import BrowserPool
+from hltv_parser import ParseError, parse_pagination_total, parse_results_page
+from http_fetcher import FetchError, HttpFetcher, hltv_url
+from load_profile import driver_profile, get_load_profile
+from match_index import open_match_index, parse_match_id
 
-# Monkey-patch para suprimir erros no encerramento do driver
-_original_quit = uc.Chrome.quit
-def safe_quit(self):
-    try:
-        _original_quit(self)
-    except Exception:
-        pass
-uc.Chrome.quit = safe_quit
+# undetected_chromedriver e selenium são importados dentro das funções que abrem o navegador:
+# o pipeline importa este módulo em um subprocesso, e uma etapa sem páginas não paga esse custo.
+
+def patch_quit() -> None:
+    """Monkey-patch para suprimir erros no encerramento do driver (aplicado uma única vez)."""
+    import undetected_chromedriver as uc
+
+    original_quit = uc.Chrome.quit
+    if getattr(original_quit, "safe", False):
+        return
+    def safe_quit(self):
+        try:
+            original_quit(self)
+        except Exception:
+            pass
+    safe_quit.safe = True
+    uc.Chrome.quit = safe_quit
 
 # Configuração do logging
 logging.basicConfig(
@@ -22,98 +35,181 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def random_sleep(min_seconds=0.75, max_seconds=2.3):
-    """Pausa aleatória para simular comportamento humano e acelerar o scraping."""
-    time.sleep(random.uniform(min_seconds, max_seconds))
-
-def get_driver():
-    options = uc.ChromeOptions()
+def get_driver(profile=None):
+    """Chrome com o perfil de carregamento `profile` (padrão: HLTV_LOAD_PROFILE, ver load_profile)."""
+    patch_quit()
+    profile = profile or get_load_profile()
+    options = profile.chrome_options()
     options.add_argument('--disable-blink-features=AutomationControlled')
-    options.add_argument("--start-maximized")
-    return uc.Chrome(options=options)
+    return profile.launch(options)
 
 def wait_for_element(driver, by, identifier, timeout=8):
     """Espera explícita por um elemento na página usando o driver fornecido."""
-    return WebDriverWait(driver, timeout).until(
-        EC.presence_of_element_located((by, identifier))
-    )
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    with instrumentation.span("wait"):
+        return WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((by, identifier))
+        )
+
+def get_results_from_page(url, pool=None, fetcher=None):
+    """
+    Coleta os dados da página. Com `fetcher`, tenta primeiro o HTML via HTTP;
+    se não for interpretável, usa um navegador do pool.
+    Sem pool, cria uma instância do navegador e a encerra ao final.
+    """
+    with instrumentation.trace(url):
+        results = _get_results_from_page(url, pool, fetcher)
+    if not results:
+        instrumentation.inc("empty_results", stage="listing")
+    return results
+
+def _get_results_from_page(url, pool=None, fetcher=None):
+    if fetcher is not None:
+        try:
+            html = fetcher.get(url)
+            with instrumentation.span("extract", source="http"):
+                results = parse_results_page(html, url)
+            logging.info(f"Finalizado (HTTP) página: {url} - {len(results)} resultados encontrados")
+            return results
+        except (FetchError, ParseError) as e:
+            instrumentation.inc("fallbacks", stage="listing", reason=type(e).__name__)
+            logging.warning(f"HTTP/parse falhou para {url} ({e}). Usando o Selenium.")
+
+    if pool is None:
+        with BrowserPool(get_driver, size=1) as own_pool:
+            return _get_results_from_page(url, own_pool)
+
+    from selenium.webdriver.common.by import By
 
-def get_results_from_page(url):
-    """Cria uma instância do navegador, coleta os dados da página e a encerra."""
-    driver = get_driver()
+    driver = pool.acquire()
+    failed = False
     try:
         logging.info(f"Iniciando scraping da página: {url}")
-        driver.get(url)
-        random_sleep()
+        start = time.perf_counter()
+        with instrumentation.span("navigate"):
+            driver.get(url)
         wait_for_element(driver, By.CLASS_NAME, 'a-reset', timeout=10)
-        games = driver.find_elements(By.CLASS_NAME, 'a-reset')
-        results = [{"jogo": game.text, "link": game.get_attribute('href')} for game in games]
+        with instrumentation.span("extract", source="browser"):
+            games = driver.find_elements(By.CLASS_NAME, 'a-reset')
+            results = [{"jogo": game.text, "link": game.get_attribute('href')} for game in games]
+        driver_profile(driver).record_page(driver, "listing", time.perf_counter() - start)
         logging.info(f"Finalizado scraping da página: {url} - {len(results)} resultados encontrados")
     except Exception as e:
+        failed = True
+        instrumentation.inc("errors", stage="listing")
         logging.error(f"Erro na página {url}: {e}")
         results = []
     finally:
-        driver.quit()
+        pool.release(driver, failed=failed)
     return results
 
-def get_pagination_offsets():
-    """Obtém o total de resultados e calcula os offsets para cada página."""
-    driver = get_driver()
-    base_url = 'https://www.hltv.org/results'
+def get_total_results(pool, base_url):
+    """Lê o total de resultados no navegador."""
+    from selenium.webdriver.common.by import By
+
+    driver = pool.acquire()
+    failed = False
     try:
-        driver.get(base_url)
-        random_sleep()
+        with instrumentation.span("navigate", url=base_url):
+            driver.get(base_url)
         pagination_elem = wait_for_element(driver, By.CLASS_NAME, 'pagination-data', timeout=10)
         total_text = pagination_elem.text[11:]
         total_results = int(total_text)
         logging.info(f"Total de resultados encontrados: {total_results}")
     except Exception as e:
+        failed = True
         logging.error(f"Erro ao obter total de resultados: {e}")
         total_results = 0
     finally:
-        driver.quit()
+        pool.release(driver, failed=failed)
+    return total_results
+
+def get_pagination_offsets(pool=None, fetcher=None):
+    """Obtém o total de resultados e calcula os offsets para cada página."""
+    base_url = hltv_url('/results')
+    total_results = None
+    if fetcher is not None:
+        try:
+            total_results = parse_pagination_total(fetcher.get(base_url))
+            logging.info(f"Total de resultados encontrados (HTTP): {total_results}")
+        except (FetchError, ParseError) as e:
+            logging.warning(f"HTTP/parse falhou para {base_url} ({e}). Usando o Selenium.")
+    if total_results is None:
+        if pool is None:
+            with BrowserPool(get_driver, size=1) as own_pool:
+                total_results = get_total_results(own_pool, base_url)
+        else:
+            total_results = get_total_results(pool, base_url)
     page_size = 100
     num_pages = (total_results + page_size - 1) // page_size  # Divisão arredondada para cima
     offsets = [i * page_size for i in range(num_pages)]
     logging.info(f"Número de páginas calculadas: {len(offsets)}")
     return offsets
 
-def write_batch_to_file(batch, filename='teste_resultados_partial.ndjson'):
+def write_batch_to_file(batch, filename='teste_resultados_partial.ndjson', index=None):
     """
     Salva cada registro do batch em uma linha (NDJSON) no arquivo,
-    utilizando o modo 'append'.
+    utilizando o modo 'append', e marca as partidas como listadas no índice.
     """
-    with open(filename, 'a', encoding='utf-8') as f:
-        for record in batch:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    with instrumentation.span("persist", records=len(batch)):
+        with open(filename, 'a', encoding='utf-8') as f:
+            for record in batch:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if index is not None:
+            index.mark('listed', (record['link'] for record in batch))
+    instrumentation.inc("records_written", len(batch), stage="listing")
+    instrumentation.export()
     logging.info(f"Batch de {len(batch)} resultados salvos.")
 
-def load_existing_links(filename='teste_resultados_partial.ndjson'):
+def is_new_result(record, index, seen_links):
+    """Um resultado é novo se aponta para uma partida que ainda não está listada no índice."""
+    link = record.get('link')
+    if parse_match_id(link) is None or link in seen_links:
+        return False
+    return not index.has('listed', link)
+
+def iter_pages_in_order(urls, fetch_page, max_workers):
     """
-    Carrega os links já presentes no arquivo salvo para evitar duplicatas.
+    Busca as páginas em paralelo (até `max_workers` à frente), mas entrega os resultados
+    na ordem dos offsets. A janela começa em 1 página e dobra a cada página entregue,
+    então execuções incrementais (que param nas primeiras páginas) buscam praticamente
+    o mesmo que a versão sequencial. Ao fechar o gerador, as páginas em espera são canceladas.
     """
-    links = set()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = deque()
+    next_url = 0
+    window = 1
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    record = json.loads(line)
-                    if 'link' in record:
-                        links.add(record['link'])
-                except Exception as e:
-                    logging.error(f"Erro ao processar linha do arquivo: {e}")
-    except FileNotFoundError:
-        logging.info("Arquivo não encontrado. Iniciando com conjunto vazio de links.")
-    logging.info(f"Registros existentes carregados: {len(links)}")
-    return links
-
-def main():
+        while next_url < len(urls) or in_flight:
+            while next_url < len(urls) and len(in_flight) < window:
+                url = urls[next_url]
+                in_flight.append((url, executor.submit(fetch_page, url)))
+                next_url += 1
+            url, future = in_flight.popleft()
+            yield url, future.result()
+            window = min(window * 2, max_workers)
+    finally:
+        cancelled = sum(future.cancel() for _, future in in_flight)
+        if in_flight:
+            logging.info(f"{cancelled} páginas canceladas; {len(in_flight) - cancelled} já em andamento serão descartadas.")
+        executor.shutdown(wait=True)
+
+def crawl_results(pool, fetcher=None, index=None, max_workers=1):
+    """
+    Percorre as páginas de resultados reaproveitando os navegadores do pool.
+    As páginas são buscadas em paralelo, mas processadas e gravadas na ordem dos offsets;
+    a primeira página sem partidas novas encerra o scraping e cancela as seguintes.
+    """
     filename = 'data/extração_partidas.ndjson'
-    existing_links = load_existing_links(filename)
+    if index is None:
+        index = open_match_index(listing_file=filename)
+    seen_links = set()
     
-    base_url = 'https://www.hltv.org/results'
-    offset_url = 'https://www.hltv.org/results?offset='
-    offsets = get_pagination_offsets()
+    base_url = hltv_url('/results')
+    offset_url = hltv_url('/results?offset=')
+    offsets = get_pagination_offsets(pool, fetcher)
     # Constrói as URLs: a página base para offset 0 e as demais com o offset
     urls = [base_url if offset == 0 else f"{offset_url}{offset}" for offset in offsets]
     
@@ -122,32 +218,44 @@ def main():
     pages_processed = 0
     total_urls = len(urls)
     
-    # Processa as páginas de forma sequencial para manter a ordem
-    for url in urls:
-        results = get_results_from_page(url)
-        new_results = [record for record in results if record['link'] not in existing_links]
-        
-        # Se não houver registros novos, encerra o scraping
-        if not new_results:
-            logging.info(f"Nenhum novo dado encontrado na página {url}. Encerrando o scraping.")
-            break
-        
-        # Atualiza os registros já existentes e acumula os novos resultados
-        for record in new_results:
-            existing_links.add(record['link'])
-        batch_results.extend(new_results)
-        
-        pages_processed += 1
-        logging.info(f"Progresso em {100*pages_processed/total_urls:.2f}%: {pages_processed}/{total_urls} páginas processadas")
-        
-        if pages_processed % batch_size == 0:
-            write_batch_to_file(batch_results, filename)
-            batch_results = []
+    pages = iter_pages_in_order(urls, partial(get_results_from_page, pool=pool, fetcher=fetcher), max_workers)
+    try:
+        for url, results in pages:
+            new_results = [record for record in results if is_new_result(record, index, seen_links)]
+            
+            # Se não houver registros novos, encerra o scraping
+            if not new_results:
+                logging.info(f"Nenhum novo dado encontrado na página {url}. Encerrando o scraping.")
+                break
+            
+            # Atualiza os registros já existentes e acumula os novos resultados
+            for record in new_results:
+                seen_links.add(record['link'])
+            batch_results.extend(new_results)
+            
+            pages_processed += 1
+            logging.info(f"Progresso em {100*pages_processed/total_urls:.2f}%: {pages_processed}/{total_urls} páginas processadas")
+            
+            if pages_processed % batch_size == 0:
+                write_batch_to_file(batch_results, filename, index)
+                batch_results = []
+    finally:
+        pages.close()
     
     if batch_results:
-        write_batch_to_file(batch_results, filename)
+        write_batch_to_file(batch_results, filename, index)
     
     logging.info("Scraping concluído.")
 
+def main(use_http=True, max_workers=4):
+    # Métricas em data/metrics/hltv_extract.prom e trace por URL em hltv_extract.trace.jsonl
+    instrumentation.configure("hltv_extract")
+    with BrowserPool(get_driver, size=max_workers) as pool:
+        if use_http:
+            with HttpFetcher(pool_size=max_workers) as fetcher:
+                crawl_results(pool, fetcher, max_workers=max_workers)
+        else:
+            crawl_results(pool, max_workers=max_workers)
+
 if __name__ == '__main__':
     main()
@@ -1,23 +1,43 @@
-import undetected_chromedriver as uc
+import argparse
+import multiprocessing
+import os
 import random
-import json
+import shutil
 import time
-import pandas as pd
-import os
-from datetime import datetime
+import zlib
 from typing import Dict, List, Optional
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 from threading import Lock
+import instrumentation
+from batch_extract import extract_match_details_js
+from browser_pool import BrowserPool
+from hltv_parser import (PICKS_BANS_KEYS, ChallengeError, ParseError, convert_data_unix,
+                         derive_data_unix_converted, is_challenge_title, is_empty_value, parse_match_page)
+from http_fetcher import FetchError, HttpFetcher, ThrottledError
+from load_profile import LoadProfile, driver_profile, get_load_profile
+from match_index import MatchIndex, open_match_index, parse_match_id
+from match_store import MatchStore, open_match_store
+from page_cache import PAGE_CACHE_DIR, PageCache
+from scrape_scheduler import AsyncScheduler
+
+# selenium e tqdm são importados dentro das funções que os usam: o pipeline importa este
+# módulo em um subprocesso por etapa, e uma etapa sem páginas para abrir não paga esse custo.
 
 # Lock global para garantir que apenas uma thread crie o driver por vez
 driver_creation_lock = Lock()
 
+# Grupos de campos que o modo de reparo sabe reextrair: grupo -> campos do registro
+# (data_unix_converted é derivado do data_unix, sem precisar de visita; ver DERIVED_FIELDS)
+REPAIR_FIELDS = {
+    "data_unix": ["data_unix", "data_unix_converted"],
+    "picks_bans": ["first_pick_by_first_team"] + PICKS_BANS_KEYS,
+    "player_stats": ["player_stats"],
+}
+
+# Campos calculados a partir de outros campos do registro, nunca copiados da página
+DERIVED_FIELDS = {"data_unix_converted"}
+
 # Lista para rotação de User-Agent
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
@@ -25,29 +45,44 @@ USER_AGENTS = [
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36",
 ]
 
+# Seletores que os extratores leem: get_flexbox (obrigatórios) e as tabelas de get_player_stats
+MATCH_PAGE_SELECTORS = [".flexbox-column .results-teamname", ".team1-gradient", ".team2-gradient"]
+PLAYER_STATS_SELECTOR = "#all-content > table"
+MATCH_READY_JS = """
+const [required, stats] = arguments;
+const found = required.every((selector) => document.querySelector(selector));
+return {
+    title: document.title,
+    ready: found && (!!document.querySelector(stats) || document.readyState === 'complete'),
+};
+"""
+
 def get_random_user_agent() -> str:
     return random.choice(USER_AGENTS)
 
-def create_browser(max_retries: int = 3):
+def create_browser(max_retries: int = 3, profile: Optional[LoadProfile] = None):
     """
     Creates an undetected_chromedriver browser instance.
     Implements retry logic with exponential backoff.
-    Manually specifies the Chrome version with `version_main`.
+    Resource blocking, page load strategy and headless mode come from `profile`
+    (default: HLTV_LOAD_PROFILE, see load_profile).
     """
+    profile = profile or get_load_profile()
     for attempt in range(1, max_retries + 1):
         try:
             with driver_creation_lock:
-                options = uc.ChromeOptions()
+                options = profile.chrome_options()
                 options.add_argument("--incognito")
                 options.add_argument(f"user-agent={get_random_user_agent()}")
                 options.add_argument("--disable-blink-features=AutomationControlled")
                 options.add_argument("--disable-popup-blocking")
                 options.add_argument("--no-first-run --no-service-autorun --password-store=basic")
-                browser = uc.Chrome(options=options, use_subprocess=True)
+                browser = profile.launch(options, use_subprocess=True)
             print("\nBrowser created successfully.")
             return browser
         except Exception as e:
             print(f"Attempt {attempt} failed with error: {e}")
+            instrumentation.inc("browser_launch_failures")
             if attempt < max_retries:
                 sleep_time = 2 ** attempt  # Exponential backoff
                 print(f"Retrying in {sleep_time} seconds...")
@@ -57,23 +92,31 @@ def create_browser(max_retries: int = 3):
 
 def human_scroll(browser) -> None:
     """Simula o comportamento de scroll humano com espera reduzida."""
-    for _ in range(random.randint(1, 3)):
-        scroll_height = random.randint(300, 800)
-        browser.execute_script(f"window.scrollBy(0, {scroll_height});")
-        time.sleep(random.uniform(0.5, 1.5))
+    with instrumentation.span("scroll"):
+        for _ in range(random.randint(1, 3)):
+            scroll_height = random.randint(300, 800)
+            browser.execute_script(f"window.scrollBy(0, {scroll_height});")
+            time.sleep(random.uniform(0.5, 1.5))
 
 def human_interaction(browser) -> None:
     """Simula interação humana na página com espera reduzida."""
+    from selenium.webdriver.common.action_chains import ActionChains
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+
     try:
-        body = browser.find_element(By.TAG_NAME, "body")
-        ActionChains(browser).move_to_element(body).perform()
-        body.send_keys(Keys.ARROW_DOWN)
-        time.sleep(random.uniform(1, 2))
+        with instrumentation.span("interaction"):
+            body = browser.find_element(By.TAG_NAME, "body")
+            ActionChains(browser).move_to_element(body).perform()
+            body.send_keys(Keys.ARROW_DOWN)
+            time.sleep(random.uniform(1, 2))
     except Exception:
         pass
     
 def get_data_unix(browser) -> Dict[str, Optional[str]]:
     """Extrai o atributo data-unix do elemento localizado pelo XPath e o converte para data."""
+    from selenium.webdriver.common.by import By
+
     try:
         element = browser.find_element(
             By.XPATH, 
@@ -82,11 +125,7 @@ def get_data_unix(browser) -> Dict[str, Optional[str]]:
         data_unix = element.get_attribute("data-unix")
         converted_date = None
         try:
-            timestamp = int(data_unix)
-            # Se o timestamp possuir mais de 10 dígitos, assume que está em milissegundos
-            if len(data_unix) > 10:
-                timestamp = timestamp / 1000.0
-            converted_date = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+            converted_date = convert_data_unix(data_unix)
         except Exception as conv_err:
             print("Erro ao converter data-unix:", conv_err)
         return {"data_unix": data_unix, "data_unix_converted": converted_date}
@@ -96,6 +135,8 @@ def get_data_unix(browser) -> Dict[str, Optional[str]]:
 
 def get_date(browser) -> Dict[str, Optional[str]]:
     """Retorna a data exibida no topo da página."""
+    from selenium.webdriver.common.by import By
+
     try:
         return {"date": browser.find_element(By.CLASS_NAME, "date").text}
     except Exception:
@@ -103,6 +144,8 @@ def get_date(browser) -> Dict[str, Optional[str]]:
 
 def get_flexbox(browser) -> Dict[str, any]:
     """Extrai dados dos times, placares e resultado do mapa."""
+    from selenium.webdriver.common.by import By
+
     flexbox_dict = {}
     box = browser.find_element(By.CLASS_NAME, "flexbox-column")
     team_names = box.find_elements(By.CLASS_NAME, "results-teamname")
@@ -121,6 +164,8 @@ def get_flexbox(browser) -> Dict[str, any]:
 
 def get_picks_bans(browser, first_team: str) -> Dict[str, any]:
     """Extrai os picks e bans dos mapas."""
+    from selenium.webdriver.common.by import By
+
     picks_bans_dict = {}
     try:
         picks_bans = browser.find_elements(By.CLASS_NAME, "col-6")[1].text.split("\n")
@@ -136,6 +181,10 @@ def get_picks_bans(browser, first_team: str) -> Dict[str, any]:
 
 def get_player_stats(browser) -> List[Dict]:
     """Extrai estatísticas dos jogadores de cada time da partida."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
     stats = []
     try:
         # Aguardar até que o conteúdo completo esteja carregado
@@ -177,51 +226,128 @@ def get_player_stats(browser) -> List[Dict]:
         print(f"Erro ao extrair estatísticas dos jogadores: {e}")
         return []
 
-def process_url(url: str) -> Optional[Dict]:
+def scrape_with_http(url: str, fetcher: HttpFetcher, cache: Optional[PageCache] = None) -> Optional[Dict]:
+    """
+    Baixa a página via HTTP e extrai os detalhes com o parser lxml.
+    Retorna None se a página não puder ser baixada ou interpretada (fallback para o Selenium).
+    Com `cache`, o HTML só é guardado depois de interpretado: desafios do Cloudflare e páginas
+    quebradas (servidos com status 200) não viram a captura mais recente da partida.
+    """
+    try:
+        html = fetcher.get(url)
+        with instrumentation.span("extract", source="http"):
+            details_dict = parse_match_page(html)
+        if cache is not None:
+            with instrumentation.span("cache"):
+                cache.put(url, html)
+        return details_dict
+    except ThrottledError:
+        # 429 não é falha de parse: o escalonador pausa o host e tenta de novo
+        raise
+    except (FetchError, ParseError) as e:
+        instrumentation.inc("fallbacks", stage="details", reason=type(e).__name__)
+        print(f"HTTP/parse falhou para {url} ({e}). Usando o Selenium.")
+        return None
+
+def extract_details_per_element(browser) -> Dict:
+    """Extrai os detalhes da partida elemento a elemento (um round-trip ao WebDriver por campo/célula)."""
+    # Coleta a data e o data-unix convertido
+    details_dict = get_date(browser)
+    details_dict.update(get_data_unix(browser))
+
+    flex = get_flexbox(browser)
+    details_dict.update(flex)
+    picks = get_picks_bans(browser, flex["first_team"])
+    details_dict.update(picks)
+
+    # Coleta as estatísticas dos jogadores
+    player_stats = get_player_stats(browser)
+    details_dict["player_stats"] = player_stats
+    return details_dict
+
+def extract_details_batch(browser) -> Dict:
+    """Extrai os detalhes da partida com um único execute_script (a página já deve estar pronta)."""
+    with instrumentation.span("extract", source="browser"):
+        return extract_match_details_js(browser)
+
+def wait_for_match_page(browser, url: str, timeout: float = 20) -> None:
+    """
+    Espera os seletores lidos por get_flexbox (obrigatórios) e pelas tabelas de
+    get_player_stats. Se a página terminar de carregar sem as tabelas (partida sem
+    estatísticas), não espera mais por elas. ChallengeError se cair no desafio do Cloudflare.
+    """
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    state = {}
+
+    def ready(driver) -> bool:
+        state.update(driver.execute_script(MATCH_READY_JS, MATCH_PAGE_SELECTORS, PLAYER_STATS_SELECTOR))
+        if is_challenge_title(state["title"]):
+            raise ChallengeError(f"Desafio do Cloudflare em {url}")
+        return state["ready"]
+
+    with instrumentation.span("wait", element="match-page"):
+        WebDriverWait(browser, timeout, poll_frequency=0.1).until(ready)
+
+def scrape_with_browser(url: str, pool: BrowserPool, batch_dom: bool = True,
+                        cache: Optional[PageCache] = None) -> Dict:
+    """
+    Extrai os detalhes da partida pelo DOM ao vivo, com um navegador do pool.
+    Com `batch_dom`, todos os campos vêm de um único execute_script.
+    Com `cache`, o HTML renderizado também é guardado no cache de páginas.
+    """
+    with pool.browser() as browser:
+        profile = driver_profile(browser)
+        start = time.perf_counter()
+        with instrumentation.span("navigate"):
+            browser.get(url)
+        wait_for_match_page(browser, url)
+        if profile.humanize:
+            human_scroll(browser)
+            human_interaction(browser)
+
+        if batch_dom:
+            details_dict = extract_details_batch(browser)
+        else:
+            with instrumentation.span("extract", source="browser"):
+                details_dict = extract_details_per_element(browser)
+        profile.record_page(browser, "details", time.perf_counter() - start)
+        if cache is not None:
+            with instrumentation.span("cache"):
+                cache.put(url, browser.page_source)
+        return details_dict
+
+def process_url(url: str, pool: Optional[BrowserPool] = None,
+                fetcher: Optional[HttpFetcher] = None, batch_dom: bool = True,
+                cache: Optional[PageCache] = None) -> Optional[Dict]:
     """
     Processa uma única URL:
-      - Cria seu próprio navegador (com lock na criação)
+      - Tenta primeiro baixar o HTML via HTTP e interpretá-lo com o parser (se houver `fetcher`)
+      - Se falhar, faz checkout de um navegador do pool (ou cria um pool temporário de 1 navegador)
+        e lê o DOM com um único execute_script (`batch_dom`) ou elemento a elemento
       - Extrai os dados da partida (data, times, placares, picks/bans, data-unix convertido) e as estatísticas dos jogadores
       - Se nenhum dado for extraído (exceto url e match_id), retorna None
-      - Fecha o navegador e retorna um dicionário com os detalhes
+      - Retorna um dicionário com os detalhes
+    O ritmo entre páginas é controlado pelo AsyncScheduler; ThrottledError e ChallengeError
+    são propagadas para que ele reduza a concorrência e tente de novo.
+    Com `cache`, o HTML das páginas extraídas (via HTTP ou Selenium) é guardado no cache de páginas.
     """
-    browser = create_browser()
-
-    def is_empty_value(val) -> bool:
-        if val is None:
-            return True
-        if isinstance(val, str) and val.strip() == "":
-            return True
-        if isinstance(val, list) and len(val) == 0:
-            return True
-        if isinstance(val, dict) and len(val) == 0:
-            return True
-        return False
+    with instrumentation.trace(url):
+        return _process_url(url, pool, fetcher, batch_dom, cache)
 
+def _process_url(url: str, pool: Optional[BrowserPool], fetcher: Optional[HttpFetcher],
+                 batch_dom: bool, cache: Optional[PageCache] = None) -> Optional[Dict]:
     try:
-        browser.get(url)
-        # Aguardar carregamento dos elementos chave
-        WebDriverWait(browser, random.randint(2, 4)).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "date"))
-        )
-        human_scroll(browser)
-        human_interaction(browser)
-
-        # Coleta a data e o data-unix convertido
-        details_dict = get_date(browser)
-        details_dict.update(get_data_unix(browser))
-        
-        flex = get_flexbox(browser)
-        details_dict.update(flex)
-        picks = get_picks_bans(browser, flex["first_team"])
-        details_dict.update(picks)
-
-        # Coleta as estatísticas dos jogadores
-        player_stats = get_player_stats(browser)
-        details_dict["player_stats"] = player_stats
+        details_dict = scrape_with_http(url, fetcher, cache) if fetcher is not None else None
+        if details_dict is None:
+            if pool is None:
+                with BrowserPool(create_browser, size=1) as own_pool:
+                    details_dict = scrape_with_browser(url, own_pool, batch_dom, cache)
+            else:
+                details_dict = scrape_with_browser(url, pool, batch_dom, cache)
 
         details_dict["url"] = url
-        details_dict["match_id"] = hash(url)  # Identificador único para rastreamento
+        details_dict["match_id"] = parse_match_id(url)  # Id numérico do HLTV, estável entre execuções
 
         # Verifica se ao menos um campo (exceto url e match_id) possui dado relevante
         data_extracted = False
@@ -232,68 +358,309 @@ def process_url(url: str) -> Optional[Dict]:
                 data_extracted = True
                 break
         if not data_extracted:
+            instrumentation.inc("empty_results", stage="details")
             print(f"Skipping match {url} because no data was extracted.")
             return None
 
-        time.sleep(random.uniform(3, 7))
         return details_dict
+    except (ThrottledError, ChallengeError):
+        # Sinais de limite de taxa sobem para o escalonador (retry com backoff)
+        raise
     except Exception as e:
+        instrumentation.inc("errors", stage="details")
         print(f"Skipping match {url} due to error: {e}")
         return None
-    finally:
+
+def missing_fields(record: Dict, groups: Optional[List[str]] = None) -> List[str]:
+    """Grupos de REPAIR_FIELDS (todos ou só os de `groups`) com algum campo vazio no registro."""
+    return [
+        group for group in (groups or REPAIR_FIELDS)
+        if any(is_empty_value(record.get(field)) for field in REPAIR_FIELDS[group])
+    ]
+
+def fill_missing_fields(record: Dict, details: Dict, groups: List[str]) -> List[str]:
+    """
+    Copia de `details` para o registro (no lugar) apenas os campos vazios dos grupos
+    indicados; campos já preenchidos não são sobrescritos. Retorna os campos preenchidos.
+    """
+    filled = []
+    for group in groups:
+        for field in REPAIR_FIELDS[group]:
+            if field in DERIVED_FIELDS:
+                continue
+            if is_empty_value(record.get(field)) and not is_empty_value(details.get(field)):
+                record[field] = details[field]
+                filled.append(field)
+    if "data_unix" in groups and derive_data_unix_converted(record):
+        filled.append("data_unix_converted")
+    return filled
+
+def repair_url(url: str, records: Dict[str, Dict], groups: List[str], pool: BrowserPool,
+               fetcher: Optional[HttpFetcher] = None, batch_dom: bool = True,
+               cache: Optional[PageCache] = None) -> Optional[Dict]:
+    """
+    Reextrai apenas os campos faltantes de um registro já gravado, numa única visita:
+    o HTML via HTTP e, só se ele não trouxer tudo o que falta, o DOM ao vivo.
+    Retorna o registro atualizado ou None se nada pôde ser preenchido.
+    """
+    with instrumentation.trace(url):
+        record = records[url]
+        groups = missing_fields(record, groups)
+        filled = []
         try:
-            browser.quit()
-        except Exception:
-            pass
+            details = scrape_with_http(url, fetcher, cache) if fetcher is not None else None
+            if details is not None:
+                filled += fill_missing_fields(record, details, groups)
+            if missing_fields(record, groups):
+                if details is not None:
+                    instrumentation.inc("fallbacks", stage="repair", reason="missing_fields")
+                filled += fill_missing_fields(record, scrape_with_browser(url, pool, batch_dom, cache), groups)
+        except (ThrottledError, ChallengeError):
+            raise
+        except Exception as e:
+            instrumentation.inc("errors", stage="repair")
+            print(f"Falha ao reparar {url}: {e}")
+        if not filled:
+            instrumentation.inc("empty_results", stage="repair")
+            return None
+        instrumentation.inc("fields_repaired", len(filled), stage="repair")
+        return record
 
 def chunker(seq: List, size: int) -> List[List]:
     """Divide a lista em sublistas de tamanho 'size'."""
     return [seq[pos:pos + size] for pos in range(0, len(seq), size)]
 
-def extract_players(csv_filename="data/transformacao_intermediaria.csv", sep=";"):
+def run_extraction(urls: List[str], store: MatchStore, index: Optional[MatchIndex] = None,
+                   max_pages_per_browser: int = 50, use_http: bool = True, batch_dom: bool = True,
+                   max_workers: int = 4, rate_per_host: float = 0.5, desc: str = "Processando batches",
+                   records: Optional[Dict[str, Dict]] = None, groups: Optional[List[str]] = None,
+                   page_cache_dir: Optional[str] = None) -> Dict:
+    """
+    Extrai as URLs em batches de 15 e anexa cada batch ao `store` (e ao `index`, se houver).
+    Com `records` (url -> registro já gravado), roda em modo de reparo: cada página é visitada
+    uma vez para preencher só os campos faltantes dos grupos `groups` (padrão: todos).
+    Com `page_cache_dir`, o HTML de cada página visitada é guardado no cache de páginas.
+    Retorna as estatísticas do escalonador e quantos registros foram gravados.
+    """
+    from tqdm import tqdm
+
+    batches = chunker(urls, 15)
+    written = 0
+
+    scheduler = AsyncScheduler(rate_per_host=rate_per_host, max_concurrency=max_workers)
+    cache = PageCache(page_cache_dir) if page_cache_dir is not None else None
+    fetcher = HttpFetcher(pool_size=max_workers) if use_http else None
+    with BrowserPool(create_browser, size=max_workers, max_pages=max_pages_per_browser) as pool:
+        if records is not None:
+            worker = partial(repair_url, records=records, groups=groups or list(REPAIR_FIELDS),
+                             pool=pool, fetcher=fetcher, batch_dom=batch_dom, cache=cache)
+        else:
+            worker = partial(process_url, pool=pool, fetcher=fetcher, batch_dom=batch_dom, cache=cache)
+        overall_progress = tqdm(batches, desc=desc, unit="batch")
+        for batch in overall_progress:
+            progress = tqdm(total=len(batch), desc="Processando jogos", unit="jogo", leave=False)
+            results = scheduler.run_sync(batch, worker, on_done=lambda url, res: progress.update(1))
+            progress.close()
+            batch_details = [res for res in results if res is not None]
+            with instrumentation.span("persist", records=len(batch_details)):
+                store.append(batch_details)
+                if index is not None:
+                    index.mark("detailed", (res["url"] for res in batch_details))
+                    index.mark("dated", (res["url"] for res in batch_details if res.get("data_unix")))
+            written += len(batch_details)
+            instrumentation.inc("records_written", len(batch_details),
+                                stage="details" if records is None else "repair")
+            instrumentation.export()
+            print(f"\nBatch com {len(batch)} jogos processados e salvos. "
+                  f"Concorrência atual: {scheduler.controller.concurrency}.\n")
+    if fetcher is not None:
+        fetcher.close()
+    if cache is not None:
+        cache.close()
+    return dict(scheduler.stats, records_written=written)
+
+def find_incomplete(store: MatchStore, groups: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Registros do armazenamento com algum dos grupos de campos vazio (url -> registro)."""
+    return {
+        record["url"]: record for record in store.iter_records()
+        if record.get("url") and missing_fields(record, groups)
+    }
+
+def repair_matches(store_dir: str = "data/match_details", groups: Optional[List[str]] = None,
+                   max_pages_per_browser: int = 50, use_http: bool = True, batch_dom: bool = True,
+                   max_workers: int = 4, rate_per_host: float = 0.5,
+                   records: Optional[List[Dict]] = None, store: Optional[MatchStore] = None,
+                   index: Optional[MatchIndex] = None, page_cache_dir: Optional[str] = PAGE_CACHE_DIR) -> List[Dict]:
+    """
+    Modo de reparo/backfill: procura no MatchStore os registros com campos faltantes
+    (data_unix, picks/bans, player_stats ou só os grupos de `groups`) e reextrai apenas esses
+    campos, com uma visita por partida, pelo mesmo caminho HTTP -> Selenium da extração.
+    `records` restringe o reparo a esses registros (atualizados no lugar); `store` e `index`
+    permitem reaproveitar os já abertos pelo chamador. As versões reparadas são anexadas ao armazenamento, que é compactado no final.
+    Retorna os registros que foram atualizados.
+    """
+    groups = groups or list(REPAIR_FIELDS)
+    if index is None:
+        index = open_match_index(store_dir=store_dir)
+    if store is None:
+        store = open_match_store(store_dir)
+    if records is None:
+        incomplete = find_incomplete(store, groups)
+    else:
+        incomplete = {record["url"]: record for record in records if missing_fields(record, groups)}
+    print(f"{len(incomplete)} jogos com campos faltantes ({', '.join(groups)}) serão reparados.")
+    if not incomplete:
+        return []
+
+    before = {url: dict(record) for url, record in incomplete.items()}
+    # Registros que já têm data_unix só precisam da conversão, sem visita
+    converted = []
+    if "data_unix" in groups:
+        converted = [record for record in incomplete.values() if derive_data_unix_converted(record)]
+    if converted:
+        store.append(converted)
+        index.mark("dated", (record["url"] for record in converted))
+        print(f"{len(converted)} jogos com data_unix convertido localmente.")
+    to_visit = {url: record for url, record in incomplete.items() if missing_fields(record, groups)}
+
+    stats = {"records_written": 0}
+    if to_visit:
+        stats = run_extraction(list(to_visit), store, index, max_pages_per_browser=max_pages_per_browser,
+                               use_http=use_http, batch_dom=batch_dom, max_workers=max_workers,
+                               rate_per_host=rate_per_host, desc="Reparando batches",
+                               records=to_visit, groups=groups, page_cache_dir=page_cache_dir)
+    if converted or stats["records_written"]:
+        store.compact()
+    print(f"Reparo completo. Estatísticas: {stats}")
+    return [record for url, record in incomplete.items() if record != before[url]]
+
+def shard_of(url: str, shards: int) -> int:
+    """
+    Shard de uma partida, pelo id numérico do HLTV (estável entre execuções e processos).
+    URLs sem id caem no shard do crc32 da própria URL, também estável.
+    """
+    match_id = parse_match_id(url)
+    if match_id is None:
+        return zlib.crc32(url.encode("utf-8")) % shards
+    return match_id % shards
+
+def shard_dirs(store_dir: str) -> List[str]:
+    """Diretórios de shards existentes (inclusive os que sobraram de uma execução interrompida)."""
+    root = f"{store_dir}_shards"
+    if not os.path.isdir(root):
+        return []
+    return sorted(os.path.join(root, name) for name in os.listdir(root) if name.startswith("shard-"))
+
+def extract_shard(shard: int, urls: List[str], shard_dir: str, options: Dict) -> Dict:
+    """
+    Executado em um processo separado: extrai as URLs do shard com seu próprio pool de
+    navegadores e grava em seu próprio MatchStore. URLs já presentes no shard (de uma
+    execução anterior interrompida antes do merge) são puladas.
+    """
+    # Cada processo tem suas próprias métricas (mesmo diretório, um arquivo por shard)
+    instrumentation.configure(f"extract_players-shard-{shard:02d}", shard=shard)
+    store = MatchStore(shard_dir)
+    done = store.keys()
+    urls = [url for url in urls if url not in done]
+    return run_extraction(urls, store, desc=f"Shard {shard}", **options)
+
+def merge_shards(store: MatchStore, index: MatchIndex, directories: List[str]) -> int:
+    """
+    Junta os shards no armazenamento principal de forma determinística: registros
+    deduplicados pelo id da partida (vale o do último shard, em ordem de nome) e
+    anexados em ordem de id. Partidas já detalhadas no índice são ignoradas.
+    Os diretórios dos shards só são removidos depois da gravação.
+    """
+    by_match_id = {}
+    for directory in directories:
+        for record in MatchStore(directory).iter_records():
+            match_id = parse_match_id(record.get("url"))
+            if match_id is not None:
+                by_match_id[match_id] = record
+    records = [
+        by_match_id[match_id] for match_id in sorted(by_match_id)
+        if not index.has("detailed", by_match_id[match_id]["url"])
+    ]
+    store.append(records)
+    index.mark("detailed", (record["url"] for record in records))
+    index.mark("dated", (record["url"] for record in records if record.get("data_unix")))
+    for directory in directories:
+        shutil.rmtree(directory)
+    if directories:
+        print(f"{len(records)} jogos novos incorporados a partir de {len(directories)} shards.")
+    return len(records)
+
+def extract_players(csv_filename="data/transformacao_intermediaria.csv", max_pages_per_browser=50,
+                    use_http=True, batch_dom=True, store_dir="data/match_details",
+                    max_workers=4, rate_per_host=0.5, shards=1, page_cache_dir=PAGE_CACHE_DIR):
     """
     Extrai os detalhes dos jogos:
-      - Lê o input (CSV) e o output (JSON existente) para determinar quais URLs ainda não foram processadas.
+      - Consulta no índice do pipeline as partidas já transformadas que ainda não foram detalhadas.
       - Processa em batches de 15 URLs faltantes.
-      - Utiliza até 4 tarefas paralelas para processar cada batch.
-      - Atualiza o arquivo JSON com os novos dados.
+      - Com `use_http`, baixa o HTML via HTTP e só recorre ao Selenium quando a página não é interpretável.
+      - Com `batch_dom`, o Selenium lê todos os campos em um único execute_script.
+      - O AsyncScheduler limita a taxa a `rate_per_host` páginas/s e ajusta a concorrência
+        (até `max_workers`) conforme latência, 429 e desafios do Cloudflare.
+      - Os navegadores vêm de um pool (cada um é reciclado após `max_pages_per_browser` páginas).
+      - Anexa cada batch ao MatchStore (NDJSON append-only), sem reescrever o histórico.
+      - Com `shards` > 1, divide as URLs pelo id da partida entre processos, cada um com seu
+        pool de navegadores e seu shard de saída, e depois junta os shards no armazenamento.
+        A taxa por host é dividida entre os processos.
+      - Guarda o HTML de cada página em `page_cache_dir` (zstd), para reextrair campos sem
+        baixar de novo (`python page_cache.py reextract`); None desliga o cache.
     """
-    # Carrega o CSV de input
-    data = pd.read_csv(csv_filename, sep=sep, index_col=0)
-    url_list = list(data.index)
-
-    # Tenta ler o arquivo JSON existente para identificar URLs já processadas
-    processed_details = []
-    processed_urls = set()
-    if os.path.exists("data/match_details.json"):
-        try:
-            with open("data/match_details.json", "r") as f:
-                processed_details = json.load(f)
-            processed_urls = {match["url"] for match in processed_details if "url" in match}
-            print(f"Encontrados {len(processed_urls)} jogos já processados. Serão ignorados.")
-        except Exception as e:
-            print(f"Erro ao ler data/match_details.json: {e}. Processando todos os jogos.")
+    # Métricas em data/metrics/extract_players.prom e trace por URL em extract_players.trace.jsonl
+    instrumentation.configure("extract_players")
+    # O CSV de input só é lido para popular o índice na primeira execução
+    index = open_match_index(transformed_file=csv_filename, store_dir=store_dir)
+    store = open_match_store(store_dir)
 
-    # Filtra os URLs para processar somente os que ainda não foram extraídos
-    missing_urls = [url for url in url_list if url not in processed_urls]
+    # Shards que sobraram de uma execução interrompida entram antes de calcular o que falta
+    merge_shards(store, index, shard_dirs(store_dir))
+
+    # Partidas transformadas que ainda não foram extraídas
+    missing_urls = index.pending("detailed", after="transformed")
     print(f"{len(missing_urls)} jogos serão processados nesta execução.")
 
-    batches = chunker(missing_urls, 15)
+    options = dict(max_pages_per_browser=max_pages_per_browser, use_http=use_http, batch_dom=batch_dom,
+                   max_workers=max_workers, rate_per_host=rate_per_host, page_cache_dir=page_cache_dir)
+    if shards <= 1:
+        stats = run_extraction(missing_urls, store, index, **options)
+        print(f"Extração de dados completa. Resultados salvos em {store_dir}. Estatísticas: {stats}")
+        return
+
+    options["rate_per_host"] = rate_per_host / shards
+    by_shard = [[] for _ in range(shards)]
+    for url in missing_urls:
+        by_shard[shard_of(url, shards)].append(url)
+    directories = [os.path.join(f"{store_dir}_shards", f"shard-{shard:02d}") for shard in range(shards)]
 
-    overall_progress = tqdm(batches, desc="Processando batches", unit="batch")
-    for batch in overall_progress:
-        batch_details = []
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            results = list(tqdm(executor.map(process_url, batch), total=len(batch), desc="Processando jogos", unit="jogo"))
-        for res in results:
-            if res is not None:
-                batch_details.append(res)
-        processed_details.extend(batch_details)
-        with open("data/match_details.json", "w") as f:
-            json.dump(processed_details, f, indent=4)
-        print(f"\nBatch com {len(batch)} jogos processados e salvos.\n")
+    # "spawn" evita herdar threads e a conexão SQLite do processo pai
+    with ProcessPoolExecutor(max_workers=shards, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {
+            executor.submit(extract_shard, shard, urls, directories[shard], options): shard
+            for shard, urls in enumerate(by_shard) if urls
+        }
+        for future in as_completed(futures):
+            try:
+                print(f"Shard {futures[future]} concluído. Estatísticas: {future.result()}")
+            except Exception as e:
+                # O que o shard já gravou é incorporado no merge; o restante volta como pendente
+                print(f"Shard {futures[future]} falhou: {e}")
 
-    print("Extração de dados completa. Resultados salvos em data/match_details.json.")
+    merge_shards(store, index, shard_dirs(store_dir))
+    print(f"Extração de dados completa. Resultados salvos em {store_dir}.")
 
 if __name__ == "__main__":
-    extract_players()
+    parser = argparse.ArgumentParser(description="Extrai os detalhes das partidas pendentes.")
+    parser.add_argument("--shards", type=int, default=1, help="Número de processos (backfill em shards)")
+    parser.add_argument("--repair", action="store_true",
+                        help="Reextrai só os campos faltantes dos registros já gravados")
+    parser.add_argument("--fields", nargs="+", choices=list(REPAIR_FIELDS), default=None,
+                        help="Grupos de campos reparados (padrão: todos)")
+    args = parser.parse_args()
+    if args.repair:
+        instrumentation.configure("repair_matches")
+        repair_matches(groups=args.fields)
+    else:
+        extract_players(shards=args.shards)
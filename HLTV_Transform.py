@@ -1,74 +1,212 @@
+import json
+import logging
 import os
-import pandas as pd
-
-# Verifica se o arquivo NDJSON existe e não está vazio
-ndjson_file = 'data/extração_partidas.ndjson'
-if not os.path.exists(ndjson_file) or os.path.getsize(ndjson_file) == 0:
-    print("Arquivo NDJSON não encontrado ou vazio. Encerrando.")
-    exit(0)
-
-# Read NDJSON File
-data = pd.read_json(ndjson_file, lines=True)
-
-# Se já existir um CSV com dados processados, filtra os registros duplicados
-csv_file = 'data/transformacao_intermediaria.csv'
-if os.path.exists(csv_file):
-    processed_data = pd.read_csv(csv_file, sep=';')
-    if 'match_url' in processed_data.columns:
-        processed_links = set(processed_data['match_url'])
-        data = data[~data['link'].isin(processed_links)]
-        if data.empty:
-            print("Nenhum dado novo para processar. Encerrando.")
-            exit(0)
-
-# Tratamento
-# Define Match_ID
-data['match_id'] = data['link'].str.extract(r'matches/(\d+)')
-
-# Remove linhas inválidas
-data.dropna(subset=['match_id', 'jogo'], inplace=True)
-
-# Split da coluna 'jogo'
-data['jogo_split'] = data['jogo'].str.split('\n', expand=False)
-
-# Garante que a lista tenha pelo menos 5 elementos antes de expandir
-data['jogo_split'] = data['jogo_split'].apply(lambda x: x + [None] * (5 - len(x)) if isinstance(x, list) else [None] * 5)
-
-data[['time_1', 'resultado', 'time_2', 'competicao', 'best_of']] = pd.DataFrame(data['jogo_split'].tolist(), index=data.index)
-
-# Preenche valores nulos antes de dividir o resultado
-data['resultado'] = data['resultado'].fillna('0 x 0')
-
-# Split do resultado
-data['resultado_split'] = data['resultado'].str.split(' ')
-
-# Verifica se todas as listas têm pelo menos 3 elementos; caso contrário, define valores padrão
-data['resultado_split'] = data['resultado_split'].apply(lambda x: x if isinstance(x, list) and len(x) == 3 else ['0', 'x', '0'])
-
-# Divide os valores do resultado
-data[['score_t1', '_', 'score_t2']] = pd.DataFrame(data['resultado_split'].tolist(), index=data.index)
-data.drop(columns=['_'], inplace=True)  # Remove coluna extra do separador 'x'
-
-# Drop de colunas desnecessárias e remoção de NaNs
-data.drop(columns=['jogo', 'jogo_split', 'resultado', 'resultado_split'], inplace=True)
-data.dropna(inplace=True)
-data.reset_index(drop=True, inplace=True)
-
-# Renomeia colunas para padronização
-data.rename(columns={
-    'link': 'match_url',
-    'time_1': 'team_A',
-    'time_2': 'team_B',
-    'score_t1': 'score_tA',
-    'score_t2': 'score_tB',
-    'competicao': 'competition',
-    'best_of': 'type_of_match'
-}, inplace=True)
-
-# Salva os dados processados:
-# Se o arquivo CSV já existe, os novos registros são adicionados (append) sem cabeçalho.
-# Caso contrário, um novo arquivo é criado.
-if os.path.exists(csv_file):
-    data.to_csv(csv_file, sep=';', index=False, mode='a', header=False)
-else:
-    data.to_csv(csv_file, sep=';', index=False)
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from match_index import open_match_index
+from match_store import atomic_write_text
+
+# pandas é importado dentro das funções que transformam: a etapa do pipeline sem partidas
+# pendentes termina sem carregá-lo
+if TYPE_CHECKING:
+    import pandas as pd
+
+NDJSON_FILE = 'data/extração_partidas.ndjson'
+CSV_FILE = 'data/transformacao_intermediaria.csv'
+CHUNK_SIZE = 100_000
+
+# Ordem das colunas do CSV intermediário (a mesma gerada desde a primeira versão do script)
+CSV_COLUMNS = ['match_url', 'match_id', 'team_A', 'team_B', 'competition', 'type_of_match',
+               'score_tA', 'score_tB']
+
+# 'jogo' tem 5 linhas: time 1, resultado, time 2, competição e formato (bo1, bo3...)
+JOGO_PARTS = 5
+# Resultado no formato "2 - 1": exatamente três partes separadas por espaço
+RESULTADO_PATTERN = r'^([^ ]*) [^ ]* ([^ ]*)$'
+
+
+def iter_listing_batches(ndjson_file: str, offset: int = 0, chunk_size: int = CHUNK_SIZE,
+                         links: Optional[Set[str]] = None) -> Iterator[Tuple["pd.DataFrame", int]]:
+    """
+    Lê o NDJSON da listagem a partir do byte `offset`, em blocos de até `chunk_size` linhas.
+    Gera (bloco com as colunas 'link' e 'jogo', offset logo após o bloco); com `links`, o
+    bloco traz apenas esses links. Uma última linha sem quebra de linha (ainda sendo
+    gravada pelo HLTV_Extract) fica para a próxima execução.
+    """
+    import pandas as pd
+
+    with open(ndjson_file, 'rb') as f:
+        f.seek(offset)
+        while True:
+            lines = list(islice(f, chunk_size))
+            if lines and not lines[-1].endswith(b'\n'):
+                lines.pop()
+                if not lines:
+                    return
+            if not lines:
+                return
+            offset += sum(len(line) for line in lines)
+            records = []
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    logging.error(f"Linha inválida em {ndjson_file}: {e}")
+                    continue
+                if links is None or record.get('link') in links:
+                    records.append(record)
+            yield pd.DataFrame.from_records(records, columns=['link', 'jogo']), offset
+
+
+def transform_listing(data: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Converte linhas da listagem (colunas 'link' e 'jogo') no formato do CSV intermediário.
+    Linhas sem id de partida ou com 'jogo' incompleto são descartadas; resultados fora do
+    formato "a x b" viram 0 x 0.
+    """
+    import pandas as pd
+
+    match_id = data['link'].str.extract(r'matches/(\d+)', expand=False)
+    valid = match_id.notna() & data['jogo'].notna()
+    data, match_id = data[valid], match_id[valid]
+
+    parts = data['jogo'].str.split('\n', n=JOGO_PARTS - 1, expand=True)
+    parts = parts.reindex(columns=range(JOGO_PARTS))
+    score = parts[1].str.extract(RESULTADO_PATTERN).fillna('0')
+
+    result = pd.DataFrame({
+        'match_url': data['link'],
+        'match_id': match_id,
+        'team_A': parts[0],
+        'team_B': parts[2],
+        'competition': parts[3],
+        'type_of_match': parts[4],
+        'score_tA': score[0],
+        'score_tB': score[1],
+    }, columns=CSV_COLUMNS)
+    return result.dropna().reset_index(drop=True)
+
+
+def _load_checkpoint(checkpoint_file: str) -> Dict[str, int]:
+    if not os.path.exists(checkpoint_file):
+        return {}
+    with open(checkpoint_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _restore_csv(csv_file: str, checkpoint: Dict[str, int]) -> Dict[str, int]:
+    """
+    Deixa o CSV exatamente como estava no último checkpoint, removendo o que uma execução
+    interrompida tenha anexado depois dele. Sem checkpoint, remove só uma última linha
+    incompleta. Retorna o checkpoint a ser usado (vazio se o CSV não corresponde a ele).
+    """
+    size = os.path.getsize(csv_file) if os.path.exists(csv_file) else 0
+    if checkpoint and size < checkpoint['csv_bytes']:
+        logging.warning(f"{csv_file} é menor que o registrado no checkpoint. Relendo o NDJSON desde o início.")
+        checkpoint = {}
+    keep = checkpoint['csv_bytes'] if checkpoint else size
+    if not checkpoint and size:
+        with open(csv_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.seek(0)
+                keep = f.read().rfind(b'\n') + 1
+    if keep < size:
+        with open(csv_file, 'rb+') as f:
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+        logging.warning(f"{size - keep} bytes de uma gravação interrompida removidos de {csv_file}.")
+    return checkpoint
+
+
+def _append_bytes(path: str, payload: bytes) -> int:
+    """Anexa ao arquivo com fsync e retorna o novo tamanho."""
+    with open(path, 'ab') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def transform_listing_file(ndjson_file: str, csv_file: str, pending_links: Set[str],
+                           chunk_size: int = CHUNK_SIZE,
+                           on_chunk: Optional[Callable[["pd.DataFrame"], None]] = None,
+                           checkpoint_file: Optional[str] = None,
+                           on_rejected: Optional[Callable[[List[str]], None]] = None) -> int:
+    """
+    Transforma, bloco a bloco, as linhas do NDJSON cujo link está em `pending_links` e as
+    anexa ao CSV (com cabeçalho apenas se ele estiver vazio). O filtro é aplicado antes do
+    parsing e a memória fica limitada ao tamanho do bloco.
+
+    Depois de cada bloco gravado (com fsync), o checkpoint (`<csv>.checkpoint`) registra o
+    offset lido do NDJSON e o tamanho do CSV. Uma nova execução retoma desse offset e corta
+    do CSV o que tiver sido anexado depois do checkpoint, então uma interrupção nunca deixa
+    linhas pela metade nem duplicadas. `on_chunk` deve ser idempotente: o último bloco
+    confirmado é repassado de novo na retomada, caso a interrupção tenha sido entre o
+    checkpoint e o callback. `on_rejected` recebe os links de cada bloco que `transform_listing`
+    descartou, antes do checkpoint do bloco (também deve ser idempotente). Retorna o número
+    de linhas gravadas.
+    """
+    import pandas as pd
+
+    checkpoint_file = checkpoint_file or f"{csv_file}.checkpoint"
+    checkpoint = _restore_csv(csv_file, _load_checkpoint(checkpoint_file))
+    offset = checkpoint.get('ndjson_offset', 0)
+    if offset > os.path.getsize(ndjson_file):
+        logging.warning(f"{ndjson_file} encolheu desde o checkpoint. Relendo desde o início.")
+        offset = 0
+    last_chunk = checkpoint.get('last_chunk_bytes', 0)
+    if on_chunk is not None and last_chunk < checkpoint.get('csv_bytes', 0):
+        with open(csv_file, 'rb') as f:
+            f.seek(last_chunk)
+            on_chunk(pd.read_csv(f, sep=';', header=0 if last_chunk == 0 else None, names=CSV_COLUMNS,
+                                 dtype=str, keep_default_na=False))
+
+    csv_bytes = os.path.getsize(csv_file) if os.path.exists(csv_file) else 0
+    written = 0
+    for batch, offset in iter_listing_batches(ndjson_file, offset, chunk_size, pending_links):
+        chunk_start = csv_bytes
+        data = transform_listing(batch) if not batch.empty else batch
+        if not data.empty:
+            payload = data.to_csv(sep=';', index=False, header=csv_bytes == 0).encode('utf-8')
+            csv_bytes = _append_bytes(csv_file, payload)
+            written += len(data)
+        if on_rejected is not None and not batch.empty:
+            rejected = batch.loc[~batch['link'].isin(data['match_url'] if not data.empty else []), 'link']
+            if not rejected.empty:
+                on_rejected(rejected.dropna().tolist())
+        atomic_write_text(checkpoint_file, json.dumps({
+            'ndjson_offset': offset, 'csv_bytes': csv_bytes, 'last_chunk_bytes': chunk_start,
+        }))
+        if on_chunk is not None and not data.empty:
+            on_chunk(data)
+    return written
+
+
+def main(ndjson_file: str = NDJSON_FILE, csv_file: str = CSV_FILE, chunk_size: int = CHUNK_SIZE) -> None:
+    # Verifica se o arquivo NDJSON existe e não está vazio
+    if not os.path.exists(ndjson_file) or os.path.getsize(ndjson_file) == 0:
+        print("Arquivo NDJSON não encontrado ou vazio. Encerrando.")
+        return
+
+    # Consulta no índice as partidas listadas que ainda não foram transformadas
+    index = open_match_index(listing_file=ndjson_file, transformed_file=csv_file)
+    pending_links = set(index.pending('transformed', after='listed', include_rejected=False))
+    if not pending_links:
+        print("Nenhum dado novo para processar. Encerrando.")
+        return
+
+    # Cada bloco gravado no CSV é marcado no índice em seguida; as linhas descartadas
+    # (com 'jogo' incompleto) ficam rejeitadas na etapa e não contam mais como pendentes
+    written = transform_listing_file(
+        ndjson_file, csv_file, pending_links, chunk_size,
+        on_chunk=lambda data: index.mark('transformed', data['match_url']),
+        on_rejected=lambda links: index.reject('transformed', links),
+    )
+    print(f"{written} partidas transformadas e salvas em {csv_file}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+from typing import Dict
+
+from hltv_parser import (
+    DATA_UNIX_XPATH, ParseError, build_data_unix, build_flexbox, build_picks_bans,
+    build_player_stats,
+)
+
+# Coleta todos os campos da partida em uma única chamada execute_script.
+# Os textos voltam brutos; a montagem do details_dict fica com as funções build_* do hltv_parser,
+# as mesmas usadas pelo parser de HTML.
+MATCH_EXTRACTION_JS = """
+const dataUnixXpath = arguments[0];
+const text = (el) => (el ? el.innerText : null);
+const byClass = (name, root) => (root || document).getElementsByClassName(name);
+
+const dateEl = byClass('date')[0];
+const unixEl = document.evaluate(
+    dataUnixXpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+
+const box = byClass('flexbox-column')[0];
+const teamNames = box ? Array.from(byClass('results-teamname', box)).map(text) : [];
+const cols = byClass('col-6');
+
+const tables = [];
+const content = document.getElementById('all-content');
+if (content) {
+    const statTables = Array.from(content.children).filter((el) => el.tagName === 'TABLE');
+    for (const table of [statTables[0], statTables[3]]) {
+        if (!table) { continue; }
+        const rows = Array.from(table.getElementsByTagName('tr'));
+        const header = rows.length ? rows[0].querySelector(':scope > td:first-of-type > div > a') : null;
+        tables.push({
+            team: header ? header.innerText.trim() : null,
+            rows: rows.slice(1).map(
+                (row) => Array.from(row.getElementsByTagName('td')).map((td) => td.innerText)
+            ),
+        });
+    }
+}
+
+return {
+    date: text(dateEl),
+    has_date: !!dateEl,
+    data_unix: unixEl ? unixEl.getAttribute('data-unix') : null,
+    has_data_unix: !!unixEl,
+    team_names: teamNames,
+    team1_text: text(byClass('team1-gradient')[0]),
+    team2_text: text(byClass('team2-gradient')[0]),
+    picks_bans_text: cols.length > 1 ? text(cols[1]) : null,
+    has_content: !!content,
+    tables: tables,
+};
+"""
+
+
+def extract_match_details_js(browser) -> Dict[str, any]:
+    """
+    Extrai os detalhes da partida com um único round-trip ao WebDriver.
+    Retorna as mesmas chaves que get_date/get_data_unix/get_flexbox/get_picks_bans/get_player_stats
+    (url e match_id continuam sendo adicionados por process_url).
+    """
+    raw = browser.execute_script(MATCH_EXTRACTION_JS, DATA_UNIX_XPATH)
+
+    details_dict = {"date": raw["date"] if raw["has_date"] else None}
+    if raw["has_data_unix"]:
+        details_dict.update(build_data_unix(raw["data_unix"]))
+    else:
+        details_dict.update({"data_unix": None, "data_unix_converted": None})
+
+    if len(raw["team_names"]) < 2 or raw["team1_text"] is None or raw["team2_text"] is None:
+        raise ParseError("Bloco de times/placar não encontrado.")
+    flex = build_flexbox(raw["team_names"], raw["team1_text"], raw["team2_text"])
+    details_dict.update(flex)
+
+    if raw["picks_bans_text"] is not None:
+        details_dict.update(build_picks_bans(raw["picks_bans_text"].split("\n"), flex["first_team"]))
+
+    # Mesmo comportamento de get_player_stats: qualquer tabela faltando resulta em lista vazia
+    tables = raw["tables"]
+    if len(tables) == 2 and all(table["team"] for table in tables):
+        details_dict["player_stats"] = build_player_stats(
+            [(table["team"], table["rows"]) for table in tables]
+        )
+    else:
+        details_dict["player_stats"] = []
+    return details_dict
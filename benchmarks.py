@@ -0,0 +1,836 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import textwrap
+import time
+from typing import Dict, List, Optional, Tuple
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def count_webdriver_commands(browser) -> Dict[str, int]:
+    """
+    Instrumenta `browser.execute` (por onde passam todos os comandos do WebDriver,
+    inclusive os de WebElement) para contar os round-trips HTTP.
+    """
+    counter = {"commands": 0}
+    original_execute = browser.execute
+
+    def counting_execute(driver_command, params=None):
+        counter["commands"] += 1
+        return original_execute(driver_command, params)
+
+    browser.execute = counting_execute
+    return counter
+
+
+def bench_dom_extraction(urls: List[str], repeat: int = 3) -> Dict:
+    """
+    Compara a extração elemento a elemento com a extração em um único execute_script
+    na mesma página carregada: número de comandos WebDriver, tempo e igualdade das saídas.
+    """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    from HLTV_Extract_Players_Sequencial import create_browser, extract_details_per_element
+    from batch_extract import extract_match_details_js
+
+    modes = {"per_element": extract_details_per_element, "batch_js": extract_match_details_js}
+    pages = []
+    browser = create_browser()
+    try:
+        counter = count_webdriver_commands(browser)
+        for url in urls:
+            browser.get(url)
+            WebDriverWait(browser, 20).until(EC.presence_of_element_located((By.ID, "all-content")))
+            page = {"url": url}
+            outputs = {}
+            for name, extract in modes.items():
+                timings = []
+                for _ in range(repeat):
+                    counter["commands"] = 0
+                    start = time.perf_counter()
+                    outputs[name] = extract(browser)
+                    timings.append(time.perf_counter() - start)
+                page[name] = {
+                    "webdriver_commands": counter["commands"],
+                    "median_seconds": statistics.median(timings),
+                }
+            page["same_output"] = outputs["per_element"] == outputs["batch_js"]
+            if not page["same_output"]:
+                logging.warning(f"Saídas diferentes em {url}")
+            pages.append(page)
+            logging.info(
+                f"{url}: {page['per_element']['webdriver_commands']} -> "
+                f"{page['batch_js']['webdriver_commands']} comandos, "
+                f"{page['per_element']['median_seconds']:.3f}s -> {page['batch_js']['median_seconds']:.3f}s"
+            )
+    finally:
+        browser.quit()
+
+    summary = {
+        name: {
+            "mean_webdriver_commands": statistics.mean(p[name]["webdriver_commands"] for p in pages),
+            "mean_seconds": statistics.mean(p[name]["median_seconds"] for p in pages),
+        }
+        for name in modes
+    } if pages else {}
+    return {"benchmark": "dom_extraction", "repeat": repeat, "pages": pages, "summary": summary}
+
+
+def bench_load_profile(urls: List[str], profiles: List[str] = ("full", "lean", "headless")) -> Dict:
+    """
+    Carrega as mesmas páginas de partida com cada perfil de carregamento (load_profile) e
+    compara o tempo da navegação até o fim da extração, os bytes transferidos, as
+    requisições feitas/bloqueadas e se os detalhes extraídos são iguais aos do primeiro perfil.
+    """
+    from HLTV_Extract_Players_Sequencial import (create_browser, extract_details_batch, human_interaction,
+                                                 human_scroll, wait_for_match_page)
+    from load_profile import get_load_profile, page_transfer
+
+    results, reference = {}, {}
+    for name in profiles:
+        profile = get_load_profile(name).measured()
+        pages = []
+        browser = create_browser(profile=profile)
+        try:
+            page_transfer(browser)  # descarta o tráfego da inicialização
+            for url in urls:
+                start = time.perf_counter()
+                browser.get(url)
+                wait_for_match_page(browser, url)
+                if profile.humanize:
+                    human_scroll(browser)
+                    human_interaction(browser)
+                details = extract_details_batch(browser)
+                page = {"url": url, "time_to_extract_seconds": time.perf_counter() - start}
+                page.update(page_transfer(browser) or {})
+                page["same_output"] = reference.setdefault(url, details) == details
+                if not page["same_output"]:
+                    logging.warning(f"Saída do perfil {name} difere em {url}")
+                pages.append(page)
+                logging.info(f"{name} {url}: {page['time_to_extract_seconds']:.2f}s, "
+                             f"{page.get('bytes', 0) / 1024:.0f} KiB")
+        finally:
+            browser.quit()
+        results[name] = {
+            "pages": pages,
+            "mean_time_to_extract_seconds": statistics.mean(p["time_to_extract_seconds"] for p in pages),
+            "mean_bytes": statistics.mean(p.get("bytes", 0) for p in pages),
+            "mean_requests": statistics.mean(p.get("requests", 0) for p in pages),
+            "mean_blocked_requests": statistics.mean(p.get("blocked", 0) for p in pages),
+            "same_output": all(p["same_output"] for p in pages),
+        }
+    return {"benchmark": "load_profile", "profiles": results}
+
+
+def _legacy_player_stats(records: List[Dict]):
+    """Laço usado originalmente no notebook (HLTV_Modelling.ipynb), mantido como referência."""
+    import pandas as pd
+
+    rows = []
+    for match in records:
+        game_id = match["match_id"]
+        for player in match["player_stats"]:
+            k, d = map(int, player["k_d"].split('-'))
+            rows.append([game_id, player["team"], player["player"], k, d,
+                         player["plus_minus"], player["adr"], player["kast"], player["rating"]])
+    df = pd.DataFrame(rows, columns=["match_id", "team", "player", "k", "d", "plus_minus", "adr", "kast", "rating"])
+    df['kd'] = df['k'] / df['d']
+    df['kast'] = df['kast'].str.replace('%', '')
+    numeric_columns = ["k", "d", "adr", 'plus_minus', "kast", "rating", 'kd']
+    df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+    return df
+
+
+def bench_player_stats(store_dir: str = "data/match_details", scales: List[int] = (1, 10, 100),
+                       repeat: int = 3) -> Dict:
+    """
+    Compara o laço do notebook com stats_transform.player_stats_frame sobre as partidas
+    do armazenamento replicadas `scale` vezes (com ids novos): tempo, memória do
+    DataFrame resultante e igualdade dos valores.
+    """
+    import numpy as np
+
+    from match_index import parse_match_id
+    from match_store import MatchStore
+    from stats_transform import player_stats_frame
+
+    base = []
+    for record in MatchStore(store_dir).iter_records():
+        match_id = parse_match_id(record.get("url"))
+        if match_id is not None and record.get("player_stats"):
+            base.append(dict(record, match_id=match_id))
+    offset = max((r["match_id"] for r in base), default=0) + 1
+
+    modes = {"legacy_loop": _legacy_player_stats, "vectorized": player_stats_frame}
+    runs = []
+    for scale in scales:
+        records = [dict(r, match_id=r["match_id"] + copy * offset) for copy in range(scale) for r in base]
+        run = {"scale": scale, "matches": len(records)}
+        outputs = {}
+        for name, transform in modes.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                outputs[name] = transform(records)
+                timings.append(time.perf_counter() - start)
+            run[name] = {
+                "median_seconds": statistics.median(timings),
+                "memory_bytes": int(outputs[name].memory_usage(deep=True).sum()),
+            }
+        run["rows"] = len(outputs["vectorized"])
+        run["speedup"] = run["legacy_loop"]["median_seconds"] / run["vectorized"]["median_seconds"]
+        run["same_values"] = all(
+            np.allclose(outputs["legacy_loop"][column].astype("float64"),
+                        outputs["vectorized"][column].astype("float64"), equal_nan=True)
+            for column in ("k", "d", "kd", "plus_minus", "adr", "kast", "rating")
+        )
+        logging.info(
+            f"x{scale} ({run['rows']} linhas): {run['legacy_loop']['median_seconds']:.3f}s -> "
+            f"{run['vectorized']['median_seconds']:.3f}s ({run['speedup']:.1f}x)"
+        )
+        runs.append(run)
+    return {"benchmark": "player_stats", "repeat": repeat, "runs": runs}
+
+
+def _write_synthetic_listing(path: str, rows: int, seed: int = 0) -> List[str]:
+    """
+    Gera um NDJSON no formato de extração_partidas.ndjson, com ~1% de linhas com 'jogo'
+    incompleto e ~1% com resultado fora do formato. Retorna os links gerados.
+    """
+    import random
+
+    rng = random.Random(seed)
+    links = []
+    formats = ["bo1", "bo3", "bo5"]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            team_a, team_b = f"Team {rng.randrange(500)}", f"Team {rng.randrange(500)}"
+            link = f"https://www.hltv.org/matches/{2_000_000 + i}/{team_a}-vs-{team_b}".replace(" ", "-").lower()
+            result = f"{rng.randrange(3)} - {rng.randrange(3)}"
+            parts = [team_a, result, team_b, f"Competição {rng.randrange(2000)}", rng.choice(formats)]
+            roll = rng.random()
+            if roll < 0.01:
+                parts = parts[:3]
+            elif roll < 0.02:
+                parts[1] = "-"
+            f.write(json.dumps({"jogo": "\n".join(parts), "link": link}, ensure_ascii=False) + "\n")
+            links.append(link)
+    return links
+
+
+def _legacy_transform(ndjson_file: str, csv_file: str, pending_links) -> None:
+    """Transformação original do HLTV_Transform.py (antes da versão vetorizada), como referência."""
+    import pandas as pd
+
+    data = pd.read_json(ndjson_file, lines=True)
+    data = data[data['link'].isin(pending_links)]
+    data['match_id'] = data['link'].str.extract(r'matches/(\d+)')
+    data.dropna(subset=['match_id', 'jogo'], inplace=True)
+    data['jogo_split'] = data['jogo'].str.split('\n', expand=False)
+    data['jogo_split'] = data['jogo_split'].apply(lambda x: x + [None] * (5 - len(x)) if isinstance(x, list) else [None] * 5)
+    data[['time_1', 'resultado', 'time_2', 'competicao', 'best_of']] = pd.DataFrame(data['jogo_split'].tolist(), index=data.index)
+    data['resultado'] = data['resultado'].fillna('0 x 0')
+    data['resultado_split'] = data['resultado'].str.split(' ')
+    data['resultado_split'] = data['resultado_split'].apply(lambda x: x if isinstance(x, list) and len(x) == 3 else ['0', 'x', '0'])
+    data[['score_t1', '_', 'score_t2']] = pd.DataFrame(data['resultado_split'].tolist(), index=data.index)
+    data.drop(columns=['_'], inplace=True)
+    data.drop(columns=['jogo', 'jogo_split', 'resultado', 'resultado_split'], inplace=True)
+    data.dropna(inplace=True)
+    data.reset_index(drop=True, inplace=True)
+    data.rename(columns={
+        'link': 'match_url', 'time_1': 'team_A', 'time_2': 'team_B', 'score_t1': 'score_tA',
+        'score_t2': 'score_tB', 'competicao': 'competition', 'best_of': 'type_of_match'
+    }, inplace=True)
+    data.to_csv(csv_file, sep=';', index=False)
+
+
+def bench_transform(rows: int = 1_000_000, chunk_size: int = 100_000, pending_fraction: float = 0.5,
+                    repeat: int = 1) -> Dict:
+    """
+    Compara a transformação original com HLTV_Transform.transform_listing_file sobre um
+    NDJSON sintético de `rows` linhas, das quais `pending_fraction` ainda não foram
+    transformadas: tempo, pico de memória (tracemalloc) e igualdade byte a byte dos CSVs.
+    """
+    import os
+    import random
+    import tempfile
+    import tracemalloc
+
+    from HLTV_Transform import transform_listing_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ndjson_file = os.path.join(tmp, "listing.ndjson")
+        links = _write_synthetic_listing(ndjson_file, rows)
+        pending = set(random.Random(1).sample(links, int(len(links) * pending_fraction)))
+        outputs = {name: os.path.join(tmp, f"{name}.csv") for name in ("legacy", "chunked")}
+        modes = {
+            "legacy": lambda: _legacy_transform(ndjson_file, outputs["legacy"], pending),
+            "chunked": lambda: transform_listing_file(ndjson_file, outputs["chunked"], pending, chunk_size),
+        }
+        report = {"benchmark": "transform", "rows": rows, "pending": len(pending),
+                  "chunk_size": chunk_size, "repeat": repeat,
+                  "ndjson_bytes": os.path.getsize(ndjson_file)}
+
+        def reset(name: str) -> None:
+            # Com o checkpoint da rodada anterior a versão em blocos retomaria do fim
+            for path in (outputs[name], f"{outputs[name]}.checkpoint"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        for name, run in modes.items():
+            timings = []
+            for _ in range(repeat):
+                reset(name)
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+            reset(name)
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            report[name] = {"median_seconds": statistics.median(timings), "peak_memory_bytes": peak}
+            logging.info(f"{name}: {report[name]['median_seconds']:.2f}s, pico de {peak / 2 ** 20:.0f} MiB")
+        with open(outputs["legacy"], "rb") as a, open(outputs["chunked"], "rb") as b:
+            report["identical_output"] = a.read() == b.read()
+        report["csv_bytes"] = os.path.getsize(outputs["chunked"])
+        report["speedup"] = report["legacy"]["median_seconds"] / report["chunked"]["median_seconds"]
+    logging.info(f"Saídas idênticas: {report['identical_output']} ({report['speedup']:.1f}x)")
+    return report
+
+
+def _latency_summary(timings: List[float]) -> Dict:
+    timings = sorted(timings)
+    return {
+        "p50_ms": 1000 * timings[len(timings) // 2],
+        "p95_ms": 1000 * timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "max_ms": 1000 * timings[-1],
+    }
+
+
+def bench_prediction_service(version: str = None, registry_dir: str = "data/models", batch_size: int = 16,
+                             requests: int = 200, cold_starts: int = 3) -> Dict:
+    """
+    Mede o cold start do predict_service (processo novo: imports + carga dos modelos do
+    registro) e a latência de previsões em lote, direto no objeto e via HTTP local.
+    """
+    import subprocess
+    import sys
+    import threading
+    import urllib.request
+
+    import numpy as np
+
+    from predict_service import PredictionService, make_server
+
+    script = (
+        "import time; start = time.perf_counter(); "
+        "from predict_service import PredictionService; "
+        f"PredictionService({version!r}, {registry_dir!r}); "
+        "print(time.perf_counter() - start)"
+    )
+    cold = [float(subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                 check=True).stdout.strip().splitlines()[-1])
+            for _ in range(cold_starts)]
+
+    service = PredictionService(version, registry_dir)
+    rng = np.random.default_rng(0)
+    rows = [{column: float(rng.uniform(0.6, 1.4)) for column in service.feature_columns}
+            for _ in range(batch_size)]
+
+    direct = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        service.predict(rows)
+        direct.append(time.perf_counter() - start)
+
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/predict"
+    body = json.dumps({"rows": rows}).encode("utf-8")
+    http = []
+    try:
+        for _ in range(requests):
+            request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+            start = time.perf_counter()
+            with urllib.request.urlopen(request) as response:
+                response.read()
+            http.append(time.perf_counter() - start)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    report = {
+        "benchmark": "prediction_service", "version": service.version, "models": len(service.models),
+        "batch_size": batch_size, "requests": requests,
+        "cold_start_seconds": {"median": statistics.median(cold), "runs": cold},
+        "load_seconds_in_process": service.load_seconds,
+        "direct": _latency_summary(direct),
+        "http": _latency_summary(http),
+    }
+    logging.info(f"Cold start {report['cold_start_seconds']['median']:.2f}s; lote de {batch_size}: "
+                 f"{report['direct']['p50_ms']:.1f}ms direto, {report['http']['p50_ms']:.1f}ms via HTTP (p50)")
+    return report
+
+
+def _run_in_subprocess(code: str, cwd: str, env: Optional[Dict[str, str]] = None, setup: str = "") -> Dict:
+    """
+    Executa `setup` e depois `code` (cronometrado) em um processo Python novo, com o
+    repositório no PYTHONPATH, para que o pico de RSS seja só o da etapa. Retorna o tempo,
+    o pico de RSS e o valor que o código deixar em `result`.
+    """
+    script = "\n".join([
+        "import json, resource, sys, time",
+        "result = None",
+        textwrap.dedent(setup),
+        "start = time.perf_counter()",
+        textwrap.dedent(code),
+        "seconds = time.perf_counter() - start",
+        # ru_maxrss vem em KiB no Linux e em bytes no macOS
+        "peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)",
+        "print('__BENCH__' + json.dumps({'seconds': seconds, 'peak_rss_bytes': peak, 'result': result}, default=str))",
+    ])
+    env = dict(os.environ if env is None else env)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    completed = subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Etapa falhou (código {completed.returncode}):\n{completed.stderr[-3000:]}")
+    line = next(line for line in reversed(completed.stdout.splitlines()) if line.startswith("__BENCH__"))
+    return json.loads(line[len("__BENCH__"):])
+
+
+def _stats_delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {key: after[key] - before.get(key, 0) for key in sorted(after) if after[key] != before.get(key, 0)}
+
+
+def bench_end_to_end(matches: int = 1000, workers: int = 4, rate_per_host: float = 50.0,
+                     latency: Tuple[float, float] = (0.02, 0.1), error_rate: float = 0.01,
+                     throttle_rate: float = 0.0, challenge_rate: float = 0.0, missing_date_rate: float = 0.05,
+                     fixtures_dir: Optional[str] = None) -> Dict:
+    """
+    Roda o pipeline de scraping inteiro contra o mock_hltv_server, num diretório temporário:
+    HLTV_Extract.main (listagem), HLTV_Transform.main, extract_players (detalhes) e
+    update_matches_with_date_unix (datas que faltaram). Cada etapa roda em um processo
+    próprio (HLTV_BASE_URL aponta para o mock) e registra tempo, pico de RSS, vazão e as
+    requisições atendidas pelo servidor. Ao final confere os registros gravados com as
+    partidas servidas.
+    """
+    import glob
+    import tempfile
+
+    from instrumentation import summarize_trace
+    from match_store import MatchStore
+    from mock_hltv_server import MockHLTVServer, store_record, synthetic_matches
+
+    source = synthetic_matches(matches)
+    server = MockHLTVServer(source, latency, error_rate, throttle_rate, challenge_rate, missing_date_rate,
+                            fixtures_dir=fixtures_dir)
+    report = {
+        "benchmark": "end_to_end", "matches": matches, "workers": workers, "rate_per_host": rate_per_host,
+        "server": {"latency": list(latency), "error_rate": error_rate, "throttle_rate": throttle_rate,
+                   "challenge_rate": challenge_rate, "missing_date_rate": missing_date_rate},
+        "stages": {},
+    }
+    stages = {
+        "listing": ("", f"""
+            import HLTV_Extract
+            HLTV_Extract.main(use_http=True, max_workers={workers})
+            result = sum(1 for _ in open('data/extração_partidas.ndjson', encoding='utf-8'))
+        """),
+        "transform": ("", """
+            import HLTV_Transform
+            HLTV_Transform.main()
+            result = sum(1 for _ in open('data/transformacao_intermediaria.csv', encoding='utf-8')) - 1
+        """),
+        "details": ("""
+            from HLTV_Extract_Players_Sequencial import extract_players
+            from match_store import MatchStore
+        """, f"""
+            extract_players(max_workers={workers}, rate_per_host={rate_per_host})
+            result = len(MatchStore('data/match_details').keys())
+        """),
+        "dates": ("""
+            import instrumentation
+            from fetch_data import update_matches_with_date_unix
+            from match_index import open_match_index
+            from match_store import open_match_store
+            instrumentation.configure("fetch_data")
+            index = open_match_index()
+            pending = set(index.pending("dated", after="detailed"))
+            store = open_match_store("data/match_details")
+            matches = [match for match in store.iter_records() if match.get("url") in pending]
+        """, f"""
+            if matches:
+                update_matches_with_date_unix(matches, store, max_workers={workers}, index=index,
+                                              rate_per_host={rate_per_host})
+            result = len(matches)
+        """),
+    }
+    units = {"listing": "rows", "transform": "rows", "details": "matches", "dates": "matches"}
+
+    with tempfile.TemporaryDirectory() as tmp, server:
+        os.makedirs(os.path.join(tmp, "data"))
+        env = dict(os.environ, HLTV_BASE_URL=server.base_url)
+        for name, (setup, code) in stages.items():
+            before = dict(server.stats)
+            run = _run_in_subprocess(code, tmp, env, setup)
+            requests = _stats_delta(before, server.stats)
+            stage = {"seconds": run["seconds"], "peak_rss_bytes": run["peak_rss_bytes"],
+                     units[name]: run["result"], f"{units[name]}_per_second": run["result"] / run["seconds"],
+                     "requests": requests}
+            if name == "listing":
+                stage["pages"] = requests.get("results_200", 0)
+                stage["pages_per_second"] = stage["pages"] / run["seconds"]
+            report["stages"][name] = stage
+            logging.info(f"{name}: {run['result']} {units[name]} em {run['seconds']:.2f}s, "
+                         f"pico de RSS {run['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+
+        # Campos extraídos das páginas vs. partidas servidas
+        expected = {record["url"].split("/matches/")[1]: store_record(record) for record in source}
+        fields = ["first_team", "second_team", "first_team_total_score", "second_team_total_score",
+                  "first_team_won", "first_pick_by_first_team", "ban 1", "pick 3", "player_stats"]
+        stored = list(MatchStore(os.path.join(tmp, "data", "match_details")).iter_records())
+        report["stored_records"] = len(stored)
+        report["dated_records"] = sum(1 for record in stored if record.get("data_unix"))
+        report["mismatched_records"] = sum(
+            1 for record in stored
+            if any(record.get(field) != expected[record["url"].split("/matches/")[1]].get(field) for field in fields)
+        )
+        traces = glob.glob(os.path.join(tmp, "data", "metrics", "*.trace.jsonl"))
+        if traces:
+            summary = summarize_trace(traces)
+            report["instrumentation"] = {
+                stage: {"spans": int(row["spans"]), "total_seconds": row["total (s)"], "p95_seconds": row["p95 (s)"]}
+                for stage, row in summary.iterrows()
+            }
+    report["server"]["requests"] = dict(server.stats)
+    return report
+
+
+def bench_stages(scales: List[int] = (1, 10, 100), base_matches: int = 1000, chunk_size: int = 100_000) -> Dict:
+    """
+    Microbenchmarks das etapas offline sobre dados sintéticos de `base_matches` x escala:
+    HLTV_Transform (listagem -> CSV), build_parquet_dataset (MatchStore -> Parquet) e
+    update_feature_store (Parquet -> features). Cada etapa roda em um processo próprio;
+    registra tempo, vazão e pico de RSS.
+    """
+    import tempfile
+
+    from match_store import MatchStore
+    from mock_hltv_server import store_record, synthetic_matches
+
+    runs = []
+    for scale in scales:
+        count = base_matches * scale
+        run = {"scale": scale, "matches": count}
+        with tempfile.TemporaryDirectory() as tmp:
+            _write_synthetic_listing(os.path.join(tmp, "listing.ndjson"), count)
+            MatchStore(os.path.join(tmp, "store")).append(store_record(m) for m in synthetic_matches(count))
+            stages = {
+                "transform": ("""
+                    import json
+                    from HLTV_Transform import transform_listing_file
+                    links = {json.loads(line)["link"] for line in open("listing.ndjson", encoding="utf-8")}
+                """, f"result = transform_listing_file('listing.ndjson', 'listing.csv', links, {chunk_size})"),
+                "dataset": ("from build_dataset import build_parquet_dataset",
+                            "result = build_parquet_dataset('store', 'dataset')"),
+                "features": ("from feature_store import update_feature_store",
+                             "result = update_feature_store('dataset')"),
+            }
+            for name, (setup, code) in stages.items():
+                stage = _run_in_subprocess(code, tmp, setup=setup)
+                run[name] = {"seconds": stage["seconds"], "rows": stage["result"],
+                             "rows_per_second": stage["result"] / stage["seconds"],
+                             "peak_rss_bytes": stage["peak_rss_bytes"]}
+                logging.info(f"x{scale} {name}: {stage['result']} linhas em {stage['seconds']:.2f}s, "
+                             f"pico de RSS {stage['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+        runs.append(run)
+    return {"benchmark": "stages", "base_matches": base_matches, "runs": runs}
+
+
+def bench_page_cache(pages: int = 10_000, workers: List[int] = (1, None)) -> Dict:
+    """
+    Cache de páginas: grava `pages` páginas de partida sintéticas (tempo e taxa de
+    compressão) e reextrai os detalhes a partir delas com 1 processo e com todos os
+    núcleos (None), conferindo os registros com as partidas de origem.
+    """
+    import shutil
+    import tempfile
+
+    from match_store import MatchStore
+    from mock_hltv_server import render_match_page, store_record, synthetic_matches
+    from page_cache import PageCache, reextract_from_cache
+
+    matches = synthetic_matches(pages)
+    html_pages = [render_match_page(match) for match in matches]
+    report = {"benchmark": "page_cache", "pages": pages, "reextract": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "page_cache")
+        start = time.perf_counter()
+        with PageCache(cache_dir) as cache:
+            for match, page in zip(matches, html_pages):
+                cache.put(match["url"], page)
+            seconds = time.perf_counter() - start
+            report["put"] = dict(cache.stats(), seconds=seconds, pages_per_second=pages / seconds,
+                                 raw_mb_per_second=cache.stats()["raw_bytes"] / 2 ** 20 / seconds)
+
+        expected = {match["url"]: store_record(match) for match in matches}
+        for count in sorted({count or os.cpu_count() for count in workers}):
+            store_dir = os.path.join(tmp, "store")
+            shutil.rmtree(store_dir, ignore_errors=True)
+            index_path = os.path.join(tmp, "data", "pipeline_index.sqlite")
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            cwd = os.getcwd()
+            os.chdir(tmp)  # o índice do pipeline fica em data/ relativo ao diretório atual
+            try:
+                run = reextract_from_cache(cache_dir, store_dir, workers=count)
+            finally:
+                os.chdir(cwd)
+            records = list(MatchStore(store_dir).iter_records())
+            run["workers"] = count
+            run["mismatched_records"] = sum(
+                1 for record in records
+                if {k: v for k, v in record.items() if k != "data_unix_converted"}
+                != {k: v for k, v in expected[record["url"]].items() if k != "data_unix_converted"}
+            )
+            report["reextract"].append(run)
+            logging.info(f"Reextração com {run['workers']} processos: {run['pages_per_second']:.0f} páginas/s")
+    return report
+
+
+def bench_ratings(matches: int = 100_000, increment: float = 0.01, queries: int = 100) -> Dict:
+    """
+    Motor de ratings sobre um MatchStore sintético de `matches` partidas: reconstrução do
+    zero, aplicação incremental de mais `increment` x partidas e consultas no tempo
+    (ratings_at com o histórico carregado e pre_match_ratings). Cada etapa roda em um
+    processo próprio, com o pico de RSS.
+    """
+    import tempfile
+
+    from match_store import MatchStore
+    from mock_hltv_server import store_record, synthetic_matches
+
+    new = max(1, int(matches * increment))
+    report = {"benchmark": "ratings", "matches": matches, "new_matches": new}
+    with tempfile.TemporaryDirectory() as tmp:
+        MatchStore(os.path.join(tmp, "store")).append(store_record(m) for m in synthetic_matches(matches))
+        stages = {
+            "rebuild": ("from rating_engine import update_ratings",
+                        "result = update_ratings('store', 'ratings', rebuild=True)"),
+            "incremental": (f"""
+                from match_store import MatchStore
+                from mock_hltv_server import store_record, synthetic_matches
+                from rating_engine import update_ratings
+                last = MatchStore('store').load_all()[-1]
+                MatchStore('store').append(
+                    store_record(m) for m in synthetic_matches({new}, seed=1, first_id=last['match_id'] + 1,
+                                                               start_unix_ms=int(last['data_unix']) + 1_800_000))
+            """, "result = update_ratings('store', 'ratings')"),
+            "ratings_at": (f"""
+                import random
+                from rating_engine import load_history, ratings_at
+                history = load_history('ratings')
+                low, high = int(history['data_unix'].min()), int(history['data_unix'].max())
+                moments = [random.Random(0).randint(low, high) for _ in range({queries})]
+            """, """
+                for moment in moments:
+                    ratings_at(moment, history=history)
+                result = len(moments)
+            """),
+            "pre_match_ratings": ("from rating_engine import pre_match_ratings",
+                                  "result = len(pre_match_ratings('ratings'))"),
+        }
+        for name, (setup, code) in stages.items():
+            run = _run_in_subprocess(code, tmp, setup=setup)
+            report[name] = {"seconds": run["seconds"], "peak_rss_bytes": run["peak_rss_bytes"], "result": run["result"]}
+            logging.info(f"{name}: {run['seconds']:.2f}s, pico de RSS {run['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+        report["rebuild"]["matches_per_second"] = matches / report["rebuild"]["seconds"]
+        report["incremental"]["matches_per_second"] = new / report["incremental"]["seconds"]
+        report["ratings_at"]["seconds_per_query"] = report["ratings_at"]["seconds"] / queries
+        report["state_bytes"] = os.path.getsize(os.path.join(tmp, "ratings", "state.json"))
+        report["history_bytes"] = sum(entry.stat().st_size for entry in os.scandir(os.path.join(tmp, "ratings", "history")))
+    return report
+
+
+def _replicate_records(records: List[Dict], scale: int) -> List[Dict]:
+    """Cópias dos registros com ids (e URLs) novos, para simular um histórico `scale` vezes maior."""
+    from match_index import parse_match_id
+
+    if scale == 1:
+        return records
+    offset = max(parse_match_id(record.get("url")) or 0 for record in records) + 1
+    copies = []
+    for copy in range(scale):
+        for record in records:
+            match_id = parse_match_id(record.get("url"))
+            if match_id is None:
+                continue
+            new_id = match_id + copy * offset
+            copies.append(dict(record, match_id=new_id,
+                               url=record["url"].replace(f"/matches/{match_id}/", f"/matches/{new_id}/")))
+    return copies
+
+
+def bench_compact_history(source: str = "data/match_details.json", scales: List[int] = (1, 100)) -> Dict:
+    """
+    Formato compacto (compact_history) vs. o JSON atual, na escala atual e ampliada:
+    tamanho em disco e, em processos separados, tempo e pico de RSS para carregar tudo
+    em DataFrames (json.load + DataFrame/json_normalize vs. mmap + frames categóricos),
+    além da abertura só com mmap.
+    """
+    import tempfile
+
+    with open(source, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    runs = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            records = _replicate_records(base, scale)
+            with open(os.path.join(tmp, "match_details.json"), "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False)
+            del records
+            stages = {
+                "build": ("""
+                    import json
+                    from compact_history import build_compact_history
+                    records = json.load(open('match_details.json', encoding='utf-8'))
+                """, "result = build_compact_history(out_dir='compact', records=records)['matches']"),
+                "json_load": ("import json\nimport pandas as pd", """
+                    records = json.load(open('match_details.json', encoding='utf-8'))
+                    matches = pd.DataFrame.from_records(records).drop(columns=['player_stats'])
+                    players = pd.json_normalize(records, 'player_stats', ['match_id'])
+                    result = int(matches.memory_usage(deep=True).sum() + players.memory_usage(deep=True).sum())
+                """),
+                "compact_load": ("from compact_history import CompactHistory", """
+                    history = CompactHistory('compact')
+                    matches, players = history.matches_frame(), history.players_frame()
+                    result = int(matches.memory_usage(deep=True).sum() + players.memory_usage(deep=True).sum())
+                """),
+                "compact_mmap": ("from compact_history import CompactHistory", """
+                    history = CompactHistory('compact')
+                    result = float(history.players['rating'].mean())
+                """),
+            }
+            run = {"scale": scale, "matches": len(base) * scale,
+                   "json_bytes": os.path.getsize(os.path.join(tmp, "match_details.json"))}
+            for name, (setup, code) in stages.items():
+                stage = _run_in_subprocess(code, tmp, setup=setup)
+                run[name] = {"seconds": stage["seconds"], "peak_rss_bytes": stage["peak_rss_bytes"]}
+                if name in ("json_load", "compact_load"):
+                    run[name]["frame_bytes"] = stage["result"]
+                logging.info(f"x{scale} {name}: {stage['seconds']:.3f}s, "
+                             f"pico de RSS {stage['peak_rss_bytes'] / 2 ** 20:.0f} MiB")
+            run["compact_bytes"] = sum(entry.stat().st_size for entry in os.scandir(os.path.join(tmp, "compact")))
+            run["size_ratio"] = run["json_bytes"] / run["compact_bytes"]
+            run["load_speedup"] = run["json_load"]["seconds"] / run["compact_load"]["seconds"]
+        runs.append(run)
+    return {"benchmark": "compact_history", "source": source, "runs": runs}
+
+
+def write_report(report: Dict, output: str = None) -> None:
+    text = json.dumps(report, indent=4, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        logging.info(f"Resultado salvo em {output}")
+    else:
+        print(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline HLTV.")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: stdout)")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    dom = subparsers.add_parser("dom-extraction", help="Extração por elemento vs. execute_script único")
+    dom.add_argument("urls", nargs="+", help="URLs de partidas do HLTV")
+    dom.add_argument("--repeat", type=int, default=3)
+
+    load = subparsers.add_parser("load-profile", help="Bytes e tempo por página com cada perfil de carregamento")
+    load.add_argument("urls", nargs="+", help="URLs de partidas do HLTV")
+    load.add_argument("--profiles", nargs="+", default=["full", "lean", "headless"])
+
+    stats = subparsers.add_parser("player-stats", help="Laço do notebook vs. conversão vetorizada de player_stats")
+    stats.add_argument("--store-dir", default="data/match_details")
+    stats.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    stats.add_argument("--repeat", type=int, default=3)
+
+    transform = subparsers.add_parser("transform", help="HLTV_Transform original vs. vetorizado em blocos")
+    transform.add_argument("--rows", type=int, default=1_000_000)
+    transform.add_argument("--chunk-size", type=int, default=100_000)
+    transform.add_argument("--pending-fraction", type=float, default=0.5)
+    transform.add_argument("--repeat", type=int, default=1)
+
+    service = subparsers.add_parser("prediction-service", help="Cold start e latência do predict_service")
+    service.add_argument("--version", help="Versão do registro (padrão: a mais recente)")
+    service.add_argument("--registry-dir", default="data/models")
+    service.add_argument("--batch-size", type=int, default=16)
+    service.add_argument("--requests", type=int, default=200)
+    service.add_argument("--cold-starts", type=int, default=3)
+
+    e2e = subparsers.add_parser("end-to-end", help="Pipeline de scraping completo contra o mock_hltv_server")
+    e2e.add_argument("--matches", type=int, default=1000)
+    e2e.add_argument("--workers", type=int, default=4)
+    e2e.add_argument("--rate-per-host", type=float, default=50.0)
+    e2e.add_argument("--latency", type=float, nargs=2, default=[0.02, 0.1], metavar=("MIN", "MAX"))
+    e2e.add_argument("--error-rate", type=float, default=0.01)
+    e2e.add_argument("--throttle-rate", type=float, default=0.0)
+    e2e.add_argument("--challenge-rate", type=float, default=0.0)
+    e2e.add_argument("--missing-date-rate", type=float, default=0.05)
+    e2e.add_argument("--fixtures-dir", help="Páginas gravadas com mock_hltv_server.py --record")
+
+    stages = subparsers.add_parser("stages", help="Transform, dataset Parquet e features em dados sintéticos")
+    stages.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    stages.add_argument("--base-matches", type=int, default=1000)
+    stages.add_argument("--chunk-size", type=int, default=100_000)
+
+    cache = subparsers.add_parser("page-cache", help="Gravação e reextração do cache de páginas")
+    cache.add_argument("--pages", type=int, default=10_000)
+
+    ratings = subparsers.add_parser("ratings", help="Reconstrução, atualização incremental e consultas do rating_engine")
+    ratings.add_argument("--matches", type=int, default=100_000)
+    ratings.add_argument("--increment", type=float, default=0.01)
+    ratings.add_argument("--queries", type=int, default=100)
+
+    compact = subparsers.add_parser("compact-history", help="Formato compacto (numpy + dicionários) vs. JSON")
+    compact.add_argument("--source", default="data/match_details.json")
+    compact.add_argument("--scales", type=int, nargs="+", default=[1, 100])
+
+    args = parser.parse_args(argv)
+    if args.benchmark == "dom-extraction":
+        report = bench_dom_extraction(args.urls, args.repeat)
+    elif args.benchmark == "load-profile":
+        report = bench_load_profile(args.urls, args.profiles)
+    elif args.benchmark == "player-stats":
+        report = bench_player_stats(args.store_dir, args.scales, args.repeat)
+    elif args.benchmark == "transform":
+        report = bench_transform(args.rows, args.chunk_size, args.pending_fraction, args.repeat)
+    elif args.benchmark == "prediction-service":
+        report = bench_prediction_service(args.version, args.registry_dir, args.batch_size,
+                                          args.requests, args.cold_starts)
+    elif args.benchmark == "end-to-end":
+        report = bench_end_to_end(args.matches, args.workers, args.rate_per_host, tuple(args.latency),
+                                  args.error_rate, args.throttle_rate, args.challenge_rate,
+                                  args.missing_date_rate, args.fixtures_dir)
+    elif args.benchmark == "stages":
+        report = bench_stages(args.scales, args.base_matches, args.chunk_size)
+    elif args.benchmark == "page-cache":
+        report = bench_page_cache(args.pages)
+    elif args.benchmark == "compact-history":
+        report = bench_compact_history(args.source, args.scales)
+    elif args.benchmark == "ratings":
+        report = bench_ratings(args.matches, args.increment, args.queries)
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
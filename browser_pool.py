@@ -0,0 +1,139 @@
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import instrumentation
+
+
+class BrowserPool:
+    """
+    Pool limitado de navegadores reutilizáveis.
+
+    Os workers fazem checkout de um navegador, usam e devolvem ao pool, evitando
+    abrir um Chrome novo para cada página. Um navegador é reciclado (fechado e
+    substituído) quando atinge `max_pages` páginas ou quando falha no health check.
+    """
+
+    def __init__(self, factory: Callable, size: int = 2, max_pages: int = 50):
+        if size < 1:
+            raise ValueError("size deve ser >= 1")
+        self._factory = factory
+        self._size = size
+        self._max_pages = max_pages
+        self._cond = threading.Condition()
+        self._idle: List = []
+        self._pages: Dict[int, int] = {}
+        self._live = 0
+        self._closed = False
+
+    def __enter__(self) -> "BrowserPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    @staticmethod
+    def is_healthy(browser) -> bool:
+        """Verifica se a sessão do navegador ainda responde."""
+        try:
+            return browser.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(browser) -> None:
+        try:
+            browser.quit()
+        except Exception:
+            pass
+
+    def _discard(self, browser) -> None:
+        """Fecha o navegador e libera a vaga no pool."""
+        self._quit(browser)
+        with self._cond:
+            self._pages.pop(id(browser), None)
+            self._live -= 1
+            self._cond.notify()
+
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Retorna um navegador do pool. Reutiliza um ocioso se houver, cria um novo
+        se o limite permitir ou espera até que algum seja devolvido.
+        """
+        while True:
+            with self._cond:
+                browser = None
+                while True:
+                    if self._closed:
+                        raise RuntimeError("BrowserPool já foi encerrado.")
+                    if self._idle:
+                        browser = self._idle.pop()
+                        break
+                    if self._live < self._size:
+                        self._live += 1
+                        break
+                    if not self._cond.wait(timeout):
+                        raise TimeoutError("Nenhum navegador disponível no pool.")
+
+            if browser is None:
+                try:
+                    with instrumentation.span("launch"):
+                        browser = self._factory()
+                except Exception:
+                    with self._cond:
+                        self._live -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._pages[id(browser)] = 0
+                return browser
+
+            if self.is_healthy(browser):
+                return browser
+            logging.warning("Navegador do pool não respondeu ao health check. Reciclando.")
+            instrumentation.inc("browser_recycled", reason="unhealthy")
+            self._discard(browser)
+
+    def release(self, browser, failed: bool = False) -> None:
+        """
+        Devolve o navegador ao pool. É reciclado se atingiu `max_pages`, se o pool
+        foi encerrado ou se falhou e não passa mais no health check.
+        """
+        with self._cond:
+            pages = self._pages.get(id(browser), 0) + 1
+            self._pages[id(browser)] = pages
+            closed = self._closed
+        recycle = closed or pages >= self._max_pages
+        if recycle and not closed:
+            instrumentation.inc("browser_recycled", reason="max_pages")
+        if not recycle and failed and not self.is_healthy(browser):
+            logging.warning("Navegador travou durante o uso. Reciclando.")
+            instrumentation.inc("browser_recycled", reason="crashed")
+            recycle = True
+        if recycle:
+            self._discard(browser)
+            return
+        with self._cond:
+            self._idle.append(browser)
+            self._cond.notify()
+
+    @contextmanager
+    def browser(self, timeout: Optional[float] = None):
+        """Context manager para checkout/devolução de um navegador."""
+        browser = self.acquire(timeout)
+        failed = True
+        try:
+            yield browser
+            failed = False
+        finally:
+            self.release(browser, failed=failed)
+
+    def close(self) -> None:
+        """Encerra os navegadores ociosos; os que estão em uso fecham ao serem devolvidos."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for browser in idle:
+            self._discard(browser)
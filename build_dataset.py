@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from hltv_parser import PICKS_BANS_KEYS
+from match_index import parse_match_id
+from match_store import open_match_store
+from stats_transform import player_stats_frame
+
+DATASET_DIR = "data/dataset"
+PICKS_BANS_COLUMNS = {key: key.replace(" ", "_") for key in PICKS_BANS_KEYS}
+
+MATCHES_SCHEMA = pa.schema(
+    [
+        ("match_id", pa.int64()),
+        ("url", pa.string()),
+        ("data_unix", pa.int64()),
+        ("match_time", pa.timestamp("ms")),
+        ("first_team", pa.string()),
+        ("second_team", pa.string()),
+        ("first_team_total_score", pa.int16()),
+        ("second_team_total_score", pa.int16()),
+        ("first_team_won", pa.int8()),
+        ("first_pick_by_first_team", pa.int8()),
+    ]
+    + [(column, pa.string()) for column in PICKS_BANS_COLUMNS.values()]
+    + [("record_version", pa.string()), ("year_month", pa.string())]
+)
+
+PLAYERS_SCHEMA = pa.schema([
+    ("match_id", pa.int64()),
+    ("team", pa.string()),
+    ("player", pa.string()),
+    ("k", pa.int16()),
+    ("d", pa.int16()),
+    ("kd", pa.float32()),
+    ("plus_minus", pa.int16()),
+    ("adr", pa.float32()),
+    ("kast", pa.float32()),
+    ("rating", pa.float32()),
+    ("year_month", pa.string()),
+])
+
+
+def _table_dir(dataset_dir: str, table: str) -> str:
+    return os.path.join(dataset_dir, table)
+
+
+def record_version(record: Dict) -> str:
+    """Hash do conteúdo do registro: muda quando o MatchStore recebe uma versão nova da partida."""
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def converted_versions(dataset_dir: str = DATASET_DIR) -> Dict[int, Optional[str]]:
+    """
+    Versão (record_version) de cada partida já presente no dataset, lendo só duas colunas.
+    Partidas gravadas antes da coluna existir, ou com mais de uma linha (conversão
+    interrompida no meio), ficam com None e são convertidas de novo.
+    """
+    path = _table_dir(dataset_dir, "matches")
+    if not os.path.isdir(path):
+        return {}
+    dataset = ds.dataset(path, schema=MATCHES_SCHEMA, format="parquet", partitioning="hive")
+    table = dataset.to_table(columns=["match_id", "record_version"])
+    versions: Dict[int, Optional[str]] = {}
+    for match_id, version in zip(table.column("match_id").to_pylist(), table.column("record_version").to_pylist()):
+        versions[match_id] = None if match_id in versions else version
+    return versions
+
+
+def drop_matches(path: str, match_ids: Set[int], keep_run_id: str) -> int:
+    """
+    Remove as linhas de `match_ids` dos arquivos da tabela em `path`, exceto os da execução
+    `keep_run_id`. Só os arquivos que contêm alguma dessas partidas são regravados
+    (atomicamente); arquivos que ficam vazios são apagados. Retorna quantas linhas saíram.
+    """
+    ids = pa.array(sorted(match_ids), type=pa.int64())
+    removed = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if not name.endswith(".parquet") or name.startswith(f"part-{keep_run_id}-"):
+                continue
+            file_path = os.path.join(root, name)
+            parquet_file = pq.ParquetFile(file_path)
+            stale = pc.is_in(parquet_file.read(columns=["match_id"]).column("match_id"), value_set=ids)
+            if not pc.any(stale).as_py():
+                continue
+            table = parquet_file.read()
+            kept = table.filter(pc.invert(stale))
+            removed += len(table) - len(kept)
+            if len(kept) == 0:
+                os.remove(file_path)
+                continue
+            tmp = f"{file_path}.tmp"
+            pq.write_table(kept, tmp)
+            os.replace(tmp, file_path)
+    return removed
+
+
+def _matches_frame(records: List[Dict]) -> pd.DataFrame:
+    matches = pd.DataFrame.from_records(records)
+    for key in PICKS_BANS_KEYS:
+        if key not in matches.columns:
+            matches[key] = None
+    if "first_pick_by_first_team" not in matches.columns:
+        matches["first_pick_by_first_team"] = None
+    if "data_unix" not in matches.columns:
+        matches["data_unix"] = None
+    matches = matches.rename(columns=PICKS_BANS_COLUMNS)
+
+    data_unix = pd.to_numeric(matches["data_unix"], errors="coerce")
+    # data-unix vem em milissegundos; valores com até 10 dígitos estão em segundos
+    data_unix = data_unix.where(data_unix >= 10 ** 10, data_unix * 1000)
+    matches["data_unix"] = data_unix.astype("Int64")
+    matches["match_time"] = pd.to_datetime(matches["data_unix"], unit="ms")
+    matches["year_month"] = matches["match_time"].dt.strftime("%Y-%m").fillna("unknown")
+    return matches
+
+
+def _players_frame(records: List[Dict], year_month: pd.Series) -> pd.DataFrame:
+    players = player_stats_frame(records)
+    players["year_month"] = players["match_id"].map(year_month)
+    return players
+
+
+def _write(frame: pd.DataFrame, schema: pa.Schema, path: str, run_id: str) -> None:
+    table = pa.Table.from_pandas(frame[schema.names], schema=schema, preserve_index=False)
+    pq.write_to_dataset(
+        table, path, partition_cols=["year_month"],
+        basename_template=f"part-{run_id}-{{i}}.parquet",
+    )
+
+
+def build_parquet_dataset(store_dir: str = "data/match_details", dataset_dir: str = DATASET_DIR) -> int:
+    """
+    Converte para Parquet apenas as partidas do MatchStore que ainda não estão no dataset ou
+    que mudaram desde a conversão (ex.: data_unix ou picks/bans preenchidos pelo modo de
+    reparo); as linhas antigas dessas partidas são removidas das duas tabelas.
+    Gera duas tabelas particionadas por mês (year_month): `matches` (uma linha por partida)
+    e `players` (uma linha por jogador/partida, com k, d, kd e kast já numéricos).
+    O id das partidas é o id numérico do HLTV. Retorna quantas partidas foram convertidas.
+    """
+    start = time.perf_counter()
+    converted = converted_versions(dataset_dir)
+    records, seen, stale = [], set(), set()
+    for record in open_match_store(store_dir).iter_records():
+        match_id = parse_match_id(record.get("url"))
+        if match_id is None or match_id in seen or not record.get("player_stats"):
+            continue
+        seen.add(match_id)
+        version = record_version(record)
+        if match_id in converted:
+            if converted[match_id] == version:
+                continue
+            stale.add(match_id)
+        records.append(dict(record, match_id=match_id, record_version=version))
+    if not records:
+        logging.info("Dataset Parquet já está atualizado.")
+        return 0
+
+    # time_ns evita que duas execuções no mesmo segundo sobrescrevam os arquivos uma da outra
+    run_id = f"{time.strftime('%Y%m%d%H%M%S')}-{time.time_ns()}"
+    matches = _matches_frame(records)
+    players = _players_frame(records, matches.set_index("match_id")["year_month"])
+    _write(matches, MATCHES_SCHEMA, _table_dir(dataset_dir, "matches"), run_id)
+    _write(players, PLAYERS_SCHEMA, _table_dir(dataset_dir, "players"), run_id)
+    # As linhas antigas das partidas reconvertidas saem depois que as novas estão gravadas
+    if stale:
+        for table in ("matches", "players"):
+            drop_matches(_table_dir(dataset_dir, table), stale, run_id)
+    logging.info(f"{len(matches)} partidas ({len(players)} linhas de jogadores) convertidas "
+                 f"em {time.perf_counter() - start:.2f}s ({len(stale)} substituindo versões antigas).")
+    return len(matches)
+
+
+def load_table(table: str, columns: Optional[List[str]] = None, dataset_dir: str = DATASET_DIR) -> pd.DataFrame:
+    """Lê uma tabela do dataset (`matches` ou `players`) apenas com as colunas pedidas."""
+    return pd.read_parquet(_table_dir(dataset_dir, table), columns=columns)
+
+
+def load_modelling_frame(player_columns: Optional[List[str]] = None,
+                         match_columns: Optional[List[str]] = None,
+                         dataset_dir: str = DATASET_DIR) -> pd.DataFrame:
+    """
+    Monta o DataFrame usado no notebook (uma linha por jogador/partida, com os dados
+    da partida ao lado), no mesmo formato do antigo full_dataset.xlsx.
+    """
+    player_columns = player_columns or ["match_id", "team", "player", "k", "d", "plus_minus",
+                                        "adr", "kast", "rating", "kd"]
+    match_columns = match_columns or ["match_id", "first_team", "second_team", "first_team_total_score",
+                                      "second_team_total_score", "first_team_won"]
+    players = load_table("players", player_columns, dataset_dir)
+    matches = load_table("matches", match_columns, dataset_dir)
+    df = players.merge(matches, on="match_id", how="inner")
+    return df.rename(columns={"match_id": "game_id"})
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_parquet_dataset()
@@ -0,0 +1,275 @@
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from build_dataset import PICKS_BANS_COLUMNS
+from hltv_parser import PICKS_BANS_KEYS
+from match_index import parse_match_id
+from match_store import atomic_write_text, open_match_store
+from rating_engine import data_unix_ms
+from stats_transform import player_stats_frame
+
+COMPACT_DIR = "data/compact"
+FORMAT_VERSION = 2
+# Valor ausente nos campos inteiros e nos códigos de dicionário (floats usam NaN)
+MISSING = -1
+# Valor ausente em k, d e plus_minus: -1 é um plus_minus válido, então usa o menor int16
+MISSING_STAT = np.iinfo(np.int16).min
+
+MATCH_DTYPE = np.dtype([
+    ("match_id", "<i8"),
+    ("data_unix", "<i8"),
+    ("first_team", "<i4"),
+    ("second_team", "<i4"),
+    ("first_team_total_score", "<i2"),
+    ("second_team_total_score", "<i2"),
+    ("first_team_won", "i1"),
+    ("first_pick_by_first_team", "i1"),
+    ("picks_bans", "<i4", (len(PICKS_BANS_KEYS),)),
+    # Linhas de `players` da partida: players[offset:offset + count]
+    ("players_offset", "<i8"),
+    ("players_count", "<i2"),
+])
+
+PLAYER_DTYPE = np.dtype([
+    ("match_row", "<i4"),
+    ("team", "<i4"),
+    ("player", "<i4"),
+    # 0 = first_team, 1 = second_team, -1 = time que não bate com nenhum dos dois
+    ("side", "i1"),
+    ("k", "<i2"),
+    ("d", "<i2"),
+    ("plus_minus", "<i2"),
+    ("adr", "<f4"),
+    ("kast", "<f4"),
+    ("rating", "<f4"),
+])
+
+DICTIONARIES = ("team", "player", "map")
+
+
+class StringDictionary:
+    """Codifica textos como inteiros (na ordem em que aparecem); None vira MISSING."""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = list(values or [])
+        self.codes: Dict[str, int] = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value: Optional[str]) -> int:
+        if value is None or value == "":
+            return MISSING
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _int(value, default: int = MISSING) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def build_compact_history(store_dir: str = "data/match_details", out_dir: str = COMPACT_DIR,
+                          records: Optional[Iterable[Dict]] = None) -> Dict[str, int]:
+    """
+    Converte o MatchStore (ou `records`) para o formato compacto em `out_dir`:
+      - `dictionaries.json`: listas de times, jogadores e mapas; os arrays guardam só o índice;
+      - `matches.npy`: array estruturado (MATCH_DTYPE), uma linha por partida, em ordem de
+        (data_unix, match_id), com o offset e a quantidade das linhas de jogadores;
+      - `players.npy`: array estruturado (PLAYER_DTYPE), uma linha por jogador/partida, com as
+        estatísticas já numéricas e contíguas por partida;
+      - `meta.json`: versão do formato e contagens, gravado por último.
+    Os .npy podem ser abertos com mmap (veja CompactHistory), sem parsing.
+    """
+    start = time.perf_counter()
+    if records is None:
+        records = open_match_store(store_dir).iter_records()
+    by_id: Dict[int, Dict] = {}
+    for record in records:
+        # O id do HLTV vem da URL (registros antigos têm outro valor em "match_id")
+        match_id = parse_match_id(record.get("url")) or record.get("match_id")
+        if match_id is not None:
+            by_id[int(match_id)] = dict(record, match_id=int(match_id))
+    ordered = sorted(by_id.values(), key=lambda r: (data_unix_ms(r.get("data_unix")) or MISSING, r["match_id"]))
+
+    dictionaries = {name: StringDictionary() for name in DICTIONARIES}
+    teams, maps = dictionaries["team"], dictionaries["map"]
+    matches = np.zeros(len(ordered), dtype=MATCH_DTYPE)
+    matches["match_id"] = [record["match_id"] for record in ordered]
+    matches["data_unix"] = [data_unix_ms(record.get("data_unix")) or MISSING for record in ordered]
+    for side in ("first", "second"):
+        matches[f"{side}_team"] = [teams.encode(record.get(f"{side}_team")) for record in ordered]
+        matches[f"{side}_team_total_score"] = [_int(record.get(f"{side}_team_total_score")) for record in ordered]
+    matches["first_team_won"] = [_int(record.get("first_team_won")) for record in ordered]
+    matches["first_pick_by_first_team"] = [_int(record.get("first_pick_by_first_team")) for record in ordered]
+    matches["picks_bans"] = [[maps.encode(record.get(key)) for key in PICKS_BANS_KEYS] for record in ordered]
+
+    with_stats = [record for record in ordered if record.get("player_stats")]
+    players = np.zeros(0, dtype=PLAYER_DTYPE)
+    if with_stats:
+        # Conversão vetorizada das estatísticas (a mesma do dataset Parquet)
+        stats = player_stats_frame(with_stats)
+        row_of = {match_id: row for row, match_id in enumerate(matches["match_id"].tolist())}
+        players = np.zeros(len(stats), dtype=PLAYER_DTYPE)
+        players["match_row"] = stats["match_id"].map(row_of).to_numpy()
+        for column in ("team", "player"):
+            categories = stats[column].cat.categories
+            codes = np.array([dictionaries[column].encode(value) for value in categories], dtype="<i4")
+            category_codes = stats[column].cat.codes.to_numpy()
+            players[column] = np.where(category_codes >= 0, codes[category_codes], MISSING)
+        for column in ("k", "d", "plus_minus"):
+            players[column] = stats[column].fillna(MISSING_STAT).to_numpy(dtype="int16")
+        for column in ("adr", "kast", "rating"):
+            players[column] = stats[column].to_numpy(dtype="float32", na_value=np.nan)
+        own = matches[players["match_row"]]
+        players["side"] = np.where(players["team"] == own["first_team"], 0,
+                                   np.where(players["team"] == own["second_team"], 1, MISSING))
+        counts = np.bincount(players["match_row"], minlength=len(matches))
+        matches["players_count"] = counts
+        matches["players_offset"] = np.cumsum(counts) - counts
+
+    os.makedirs(out_dir, exist_ok=True)
+    _save_array(os.path.join(out_dir, "matches.npy"), matches)
+    _save_array(os.path.join(out_dir, "players.npy"), players)
+    atomic_write_text(os.path.join(out_dir, "dictionaries.json"),
+                      json.dumps({name: d.values for name, d in dictionaries.items()}, ensure_ascii=False))
+    meta = {"format": FORMAT_VERSION, "matches": len(matches), "player_rows": len(players),
+            "dictionaries": {name: len(d.values) for name, d in dictionaries.items()}}
+    atomic_write_text(os.path.join(out_dir, "meta.json"), json.dumps(meta))
+    logging.info(f"Histórico compacto: {len(matches)} partidas e {len(players)} linhas de jogadores "
+                 f"em {time.perf_counter() - start:.2f}s.")
+    return meta
+
+
+def _categorical(codes: np.ndarray, categories: List[str]) -> pd.Categorical:
+    return pd.Categorical.from_codes(np.asarray(codes), categories=pd.Index(categories, dtype=object))
+
+
+def _nullable_int(values: np.ndarray, dtype: str, missing: int = MISSING) -> pd.arrays.IntegerArray:
+    """Inteiros com `missing` convertidos em <NA> (dtype nullable do pandas, ex.: "Int16")."""
+    values = np.asarray(values)
+    return pd.arrays.IntegerArray(values.astype(dtype.lower()), values == missing)
+
+
+class CompactHistory:
+    """
+    Histórico de partidas no formato compacto, aberto por padrão com memory map: os arrays
+    `matches` e `players` são lidos do disco sob demanda, sem parsing nem objetos Python por
+    partida. `matches_frame()` e `players_frame()` montam DataFrames com colunas numéricas e
+    nomes categóricos, com as mesmas colunas das tabelas do dataset Parquet.
+    """
+
+    def __init__(self, directory: str = COMPACT_DIR, mmap: bool = True):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["format"] != FORMAT_VERSION:
+            raise ValueError(f"Formato {self.meta['format']} não suportado (esperado {FORMAT_VERSION}).")
+        mode = "r" if mmap else None
+        self.matches: np.ndarray = np.load(os.path.join(directory, "matches.npy"), mmap_mode=mode)
+        self.players: np.ndarray = np.load(os.path.join(directory, "players.npy"), mmap_mode=mode)
+        with open(os.path.join(directory, "dictionaries.json"), "r", encoding="utf-8") as f:
+            dictionaries = json.load(f)
+        self.teams: List[str] = dictionaries["team"]
+        self.player_names: List[str] = dictionaries["player"]
+        self.maps: List[str] = dictionaries["map"]
+
+    def __len__(self) -> int:
+        return len(self.matches)
+
+    def match_players(self, row: int) -> np.ndarray:
+        """Linhas de jogadores da partida na posição `row` (uma fatia, sem cópia)."""
+        match = self.matches[row]
+        return self.players[match["players_offset"]:match["players_offset"] + match["players_count"]]
+
+    def matches_frame(self) -> pd.DataFrame:
+        """Uma linha por partida, em ordem cronológica."""
+        m = self.matches
+        frame = pd.DataFrame({
+            "match_id": m["match_id"],
+            "data_unix": _nullable_int(m["data_unix"], "Int64"),
+            "first_team": _categorical(m["first_team"], self.teams),
+            "second_team": _categorical(m["second_team"], self.teams),
+            "first_team_total_score": _nullable_int(m["first_team_total_score"], "Int16"),
+            "second_team_total_score": _nullable_int(m["second_team_total_score"], "Int16"),
+            "first_team_won": _nullable_int(m["first_team_won"], "Int8"),
+            "first_pick_by_first_team": _nullable_int(m["first_pick_by_first_team"], "Int8"),
+        })
+        frame.insert(2, "match_time", pd.to_datetime(frame["data_unix"], unit="ms"))
+        for i, key in enumerate(PICKS_BANS_KEYS):
+            frame[PICKS_BANS_COLUMNS[key]] = _categorical(m["picks_bans"][:, i], self.maps)
+        return frame
+
+    def players_frame(self) -> pd.DataFrame:
+        """Uma linha por jogador/partida, agrupadas por partida na ordem de `matches`."""
+        p = self.players
+        frame = pd.DataFrame({
+            "match_id": self.matches["match_id"][p["match_row"]],
+            "team": _categorical(p["team"], self.teams),
+            "player": _categorical(p["player"], self.player_names),
+            "side": p["side"],
+            "k": _nullable_int(p["k"], "Int16", MISSING_STAT),
+            "d": _nullable_int(p["d"], "Int16", MISSING_STAT),
+            "plus_minus": _nullable_int(p["plus_minus"], "Int16", MISSING_STAT),
+            "adr": p["adr"],
+            "kast": p["kast"],
+            "rating": p["rating"],
+        })
+        frame.insert(6, "kd", (frame["k"].astype("float32") / frame["d"].astype("float32")).astype("float32"))
+        return frame
+
+    def iter_records(self) -> Iterator[Dict]:
+        """
+        Partidas como dicionários com os campos usados pelo rating_engine (times, placar,
+        resultado, data e player_stats com team/player/rating), em ordem cronológica.
+        """
+        teams, names = self.teams, self.player_names
+        players = self.players
+        for match in self.matches.tolist():
+            (match_id, data_unix, first, second, first_score, second_score,
+             won, _, _, offset, count) = match
+            rows = players[offset:offset + count].tolist()
+            yield {
+                "match_id": match_id,
+                "data_unix": data_unix if data_unix != MISSING else None,
+                "first_team": teams[first] if first != MISSING else None,
+                "second_team": teams[second] if second != MISSING else None,
+                "first_team_total_score": first_score if first_score != MISSING else None,
+                "second_team_total_score": second_score if second_score != MISSING else None,
+                "first_team_won": won if won != MISSING else None,
+                "player_stats": [
+                    {"team": teams[row[1]] if row[1] != MISSING else None,
+                     "player": names[row[2]] if row[2] != MISSING else None, "rating": row[9]}
+                    for row in rows
+                ],
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Histórico de partidas em formato compacto (numpy + dicionários).")
+    parser.add_argument("--store-dir", default="data/match_details")
+    parser.add_argument("--out-dir", default=COMPACT_DIR)
+    args = parser.parse_args(argv)
+    print(build_compact_history(args.store_dir, args.out_dir))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,217 @@
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from build_dataset import DATASET_DIR, build_parquet_dataset, converted_versions, drop_matches
+
+FEATURES_TABLE = "team_features"
+# Versão do registro (build_dataset.record_version) de que as features de cada partida vieram
+VERSION_COLUMN = "record_version"
+SIDES = ("first", "second")
+
+# Agregações aritméticas por (partida, time): nome -> (coluna de players, função)
+ARITHMETIC_FEATURES = {
+    "avg_kills": ("k", "mean"),
+    "avg_deaths": ("d", "mean"),
+    "total_kills": ("k", "sum"),
+    "total_adr": ("adr", "sum"),
+}
+# Médias geométricas sobre os valores positivos (0 se não houver nenhum), como o safe_gmean do notebook
+GEOMETRIC_FEATURES = {
+    "avg_kd": "kd",
+    "avg_rating": "rating",
+    "gmean_adr": "adr",
+}
+TEAM_FEATURES = list(ARITHMETIC_FEATURES) + list(GEOMETRIC_FEATURES)
+# Colunas da tabela players usadas nas agregações
+STAT_COLUMNS = sorted({column for column, _ in ARITHMETIC_FEATURES.values()} | set(GEOMETRIC_FEATURES.values()))
+
+
+def _table_dir(dataset_dir: str, table: str) -> str:
+    return os.path.join(dataset_dir, table)
+
+
+def _dataset(dataset_dir: str, table: str) -> Optional[ds.Dataset]:
+    path = _table_dir(dataset_dir, table)
+    if not os.path.isdir(path):
+        return None
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+
+def feature_versions(dataset_dir: str = DATASET_DIR) -> Dict[int, Optional[str]]:
+    """
+    Versão do registro de que vieram as features de cada partida (lê só duas colunas).
+    Arquivos gravados antes da coluna existir, ou partidas com mais de uma linha, ficam com None.
+    """
+    path = _table_dir(dataset_dir, FEATURES_TABLE)
+    if not os.path.isdir(path):
+        return {}
+    schema = pa.schema([("match_id", pa.int64()), (VERSION_COLUMN, pa.string())])
+    table = ds.dataset(path, schema=schema, format="parquet", partitioning="hive").to_table()
+    versions: Dict[int, Optional[str]] = {}
+    for match_id, version in zip(table.column("match_id").to_pylist(), table.column(VERSION_COLUMN).to_pylist()):
+        versions[match_id] = None if match_id in versions else version
+    return versions
+
+
+def geometric_means(values: pd.DataFrame, keys: List[pd.Series]) -> pd.DataFrame:
+    """
+    Média geométrica de cada coluna por grupo, calculada como exp(média dos logs) apenas
+    sobre os valores positivos. Grupos sem nenhum valor positivo recebem 0.
+    """
+    logs = np.log(values.where(values > 0))
+    return np.exp(logs.groupby(keys).mean()).fillna(0)
+
+
+def team_stats(players: pd.DataFrame) -> pd.DataFrame:
+    """Agrega as linhas de jogadores em uma linha por (match_id, team)."""
+    players = players.astype({column: "float64" for column in STAT_COLUMNS})
+    keys = [players["match_id"], players["team"].astype(str)]
+    arithmetic = players.groupby(keys).agg(**{
+        name: (column, how) for name, (column, how) in ARITHMETIC_FEATURES.items()
+    })
+    geometric = geometric_means(
+        players[list(GEOMETRIC_FEATURES.values())].set_axis(list(GEOMETRIC_FEATURES), axis=1), keys
+    )
+    stats = arithmetic.join(geometric)
+    stats.index.names = ["match_id", "team"]
+    return stats.reset_index()
+
+
+def match_features(stats: pd.DataFrame, matches: pd.DataFrame) -> pd.DataFrame:
+    """
+    Uma linha por partida com as features de cada lado (`<feature>_first` e
+    `<feature>_second`). Partidas em que algum dos times não aparece nas estatísticas
+    ficam de fora, como no merge do notebook.
+    """
+    stats = stats.set_index(["match_id", "team"])
+    features = matches[["match_id"]].copy()
+    for side in SIDES:
+        lookup = pd.MultiIndex.from_arrays([matches["match_id"], matches[f"{side}_team"]])
+        side_stats = stats.reindex(lookup)
+        for column in TEAM_FEATURES:
+            features[f"{column}_{side}"] = side_stats[column].to_numpy()
+    return features.dropna().reset_index(drop=True)
+
+
+def update_feature_store(dataset_dir: str = DATASET_DIR) -> int:
+    """
+    Calcula as features apenas das partidas do dataset que ainda não estão no feature store
+    ou cuja versão no dataset mudou desde o cálculo (partida reconvertida pelo build_dataset),
+    e as grava como um novo arquivo da tabela `team_features`; as linhas antigas das partidas
+    recalculadas são removidas. Retorna quantas partidas foram calculadas.
+    """
+    start = time.perf_counter()
+    players_data = _dataset(dataset_dir, "players")
+    matches_data = _dataset(dataset_dir, "matches")
+    if players_data is None or matches_data is None:
+        logging.info("Dataset Parquet vazio; nada para agregar.")
+        return 0
+
+    done = feature_versions(dataset_dir)
+    pending = [match_id for match_id, version in converted_versions(dataset_dir).items()
+               if version is None or done.get(match_id) != version]
+    if not pending:
+        logging.info("Feature store já está atualizado.")
+        return 0
+    wanted = ds.field("match_id").isin(pending)
+    matches = matches_data.to_table(columns=["match_id", "first_team", "second_team", VERSION_COLUMN],
+                                    filter=wanted).to_pandas()
+    players = players_data.to_table(columns=["match_id", "team"] + STAT_COLUMNS, filter=wanted).to_pandas()
+
+    features = match_features(team_stats(players), matches)
+    features[VERSION_COLUMN] = features["match_id"].map(matches.set_index("match_id")[VERSION_COLUMN])
+    path = _table_dir(dataset_dir, FEATURES_TABLE)
+    run_id = f"{time.strftime('%Y%m%d%H%M%S')}-{time.time_ns()}"
+    if not features.empty:
+        os.makedirs(path, exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(features, preserve_index=False),
+                       os.path.join(path, f"part-{run_id}-0.parquet"))
+    # As linhas antigas saem depois que as novas estão gravadas
+    stale = {match_id for match_id in pending if match_id in done}
+    if stale:
+        drop_matches(path, stale, run_id)
+    logging.info(f"Features de {len(features)} partidas calculadas em {time.perf_counter() - start:.2f}s "
+                 f"({len(stale)} substituindo versões antigas).")
+    return len(features)
+
+
+def load_features(columns: Optional[List[str]] = None, dataset_dir: str = DATASET_DIR) -> pd.DataFrame:
+    """
+    Features por partida indexadas por match_id, prontas para um único `join`.
+    `columns` usa os nomes base (ex.: ["avg_rating"]) e traz os dois lados de cada um.
+    """
+    if columns is None:
+        names = ["match_id"] + [f"{column}_{side}" for side in SIDES for column in TEAM_FEATURES]
+    else:
+        names = ["match_id"] + [f"{column}_{side}" for column in columns for side in SIDES]
+    features = pd.read_parquet(_table_dir(dataset_dir, FEATURES_TABLE), columns=names)
+    return features.set_index("match_id").sort_index()
+
+
+def load_match_modeling(columns: Optional[List[str]] = None, dataset_dir: str = DATASET_DIR) -> pd.DataFrame:
+    """
+    Tabela `match_modeling` do notebook: uma linha por partida (game_id, times, placar e
+    first_team_won) com as features de cada lado, sem groupby nem merges na sessão.
+    """
+    matches = pd.read_parquet(_table_dir(dataset_dir, "matches"), columns=[
+        "match_id", "first_team", "second_team", "first_team_total_score",
+        "second_team_total_score", "first_team_won",
+    ])
+    modeling = matches.join(load_features(columns, dataset_dir), on="match_id", how="inner")
+    return modeling.rename(columns={"match_id": "game_id"}).reset_index(drop=True)
+
+
+def team_history(dataset_dir: str = DATASET_DIR) -> pd.DataFrame:
+    """
+    Features no formato longo (uma linha por partida e time), com o data_unix da partida,
+    em ordem cronológica. Partidas sem data ficam no início.
+    """
+    matches = pd.read_parquet(_table_dir(dataset_dir, "matches"),
+                              columns=["match_id", "data_unix", "first_team", "second_team"])
+    frame = matches.join(load_features(dataset_dir=dataset_dir), on="match_id", how="inner")
+    sides = []
+    for side in SIDES:
+        part = frame[["match_id", "data_unix", f"{side}_team"] + [f"{column}_{side}" for column in TEAM_FEATURES]]
+        sides.append(part.set_axis(["match_id", "data_unix", "team"] + TEAM_FEATURES, axis=1))
+    history = pd.concat(sides, ignore_index=True)
+    return history.sort_values(["data_unix", "match_id"], na_position="first", kind="stable")
+
+
+def latest_team_features(window: int = 1, dataset_dir: str = DATASET_DIR) -> pd.DataFrame:
+    """Média das features de cada time nas suas `window` partidas mais recentes, indexada por time."""
+    history = team_history(dataset_dir)
+    latest = history.groupby("team", sort=False).tail(window)
+    return latest.groupby("team")[TEAM_FEATURES].mean()
+
+
+def fixture_features(fixtures: pd.DataFrame, team_features: pd.DataFrame,
+                     feature_columns: List[str]) -> pd.DataFrame:
+    """
+    Matriz de features para confrontos (colunas team_A e team_B): as features `_first`
+    vêm do team_A e as `_second` do team_B. Times sem histórico ficam com NaN.
+    """
+    first = team_features.reindex(fixtures["team_A"]).add_suffix("_first")
+    second = team_features.reindex(fixtures["team_B"]).add_suffix("_second")
+    features = pd.concat([first.reset_index(drop=True), second.reset_index(drop=True)], axis=1)
+    return features.set_axis(fixtures.index)[feature_columns]
+
+
+def refresh_features(store_dir: str = "data/match_details", dataset_dir: str = DATASET_DIR) -> Dict[str, int]:
+    """Atualiza o dataset Parquet e em seguida o feature store, ambos de forma incremental."""
+    return {
+        "matches": build_parquet_dataset(store_dir, dataset_dir),
+        "features": update_feature_store(dataset_dir),
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    refresh_features()
@@ -1,112 +1,56 @@
-import random
-import time
 import json
-import datetime
-import threading
-import concurrent.futures
 import logging
-import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
-from tqdm import tqdm
+import instrumentation
+from HLTV_Extract_Players_Sequencial import repair_matches
+from match_index import open_match_index
+from match_store import open_match_store
 
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.5993.89 Safari/537.36",
-    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36",
-]
-
-# Lock global para a inicialização do driver, evitando conflitos de patching
-driver_lock = threading.Lock()
+def update_matches_with_date_unix(matches, store, max_workers=4, max_pages_per_browser=50, use_http=True,
+                                  index=None, rate_per_host=0.5):
+    """
+    Preenche 'data_unix' (e 'data_unix_converted', em UTC) das partidas que não o têm;
+    as que já têm data_unix só são convertidas, sem visita.
 
-def update_matches_with_date_unix(matches, file_path):
+    Delega ao modo de reparo do extrator de detalhes (`repair_matches`), restrito ao grupo
+    data_unix: uma visita por partida, via HTTP e, só se a data não vier no HTML, com um
+    navegador do pool, sob o mesmo AsyncScheduler (`rate_per_host` páginas/s por host,
+    até `max_workers` em paralelo). As partidas são atualizadas no lugar, anexadas ao
+    MatchStore e, com `index`, marcadas como 'dated'; ao final o armazenamento é compactado.
     """
-    Processa cada partida em paralelo. Se 'data_unix' estiver vazia,
-    extrai o valor do atributo 'data-unix' utilizando Selenium,
-    converte o timestamp para 'data_unix_converted' e atualiza o registro.
+    updated = repair_matches(store.root, groups=["data_unix"], max_pages_per_browser=max_pages_per_browser,
+                             use_http=use_http, max_workers=max_workers, rate_per_host=rate_per_host,
+                             records=matches, store=store, index=index)
+    logging.info(f"{len(updated)} partidas atualizadas.")
+    return matches
 
-    O arquivo JSON é salvo a cada 15 partidas atualizadas.
+def main(retry_rejected: bool = False):
     """
-    xpath_expr = '/html/body/div[5]/div[8]/div[2]/div[1]/div[2]/div[2]/div[2]/div[2]'
-    updated_count = 0
-    count_lock = threading.Lock()
+    Busca a data das partidas detalhadas ainda sem data_unix. As que continuam sem data depois
+    da visita são rejeitadas na etapa 'dated' do índice e não são visitadas de novo nas próximas
+    execuções, a não ser com `retry_rejected`.
+    """
+    # Métricas em data/metrics/fetch_data.prom e trace por URL em fetch_data.trace.jsonl
+    instrumentation.configure("fetch_data")
+    index = open_match_index()
+    pending_urls = set(index.pending("dated", after="detailed", include_rejected=retry_rejected))
+    store = open_match_store("data/match_details")
+    # Também entram as partidas que têm data_unix mas não data_unix_converted (só conversão, sem visita)
+    match_data = [
+        match for match in store.iter_records()
+        if match.get("url") in pending_urls or (match.get("data_unix") and not match.get("data_unix_converted"))
+    ]
+    if not match_data:
+        logging.info("Nenhuma partida sem data_unix ou data_unix_converted. Encerrando.")
+        return
     
-    def process_match(match):
-        updated = False
-        if not match.get("data_unix"):
-            user_agent = random.choice(USER_AGENTS)
-            options = uc.ChromeOptions()
-            options.add_argument(f'--user-agent={user_agent}')
-            # Garante que apenas uma thread crie o driver por vez
-            with driver_lock:
-                driver = uc.Chrome(options=options)
-            try:
-                driver.get(match["url"])
-                time.sleep(random.uniform(3, 6))
-                
-                # Simula scroll aleatório
-                scroll_height = driver.execute_script("return document.body.scrollHeight")
-                for _ in range(random.randint(2, 4)):
-                    random_position = random.randint(0, scroll_height)
-                    driver.execute_script("window.scrollTo(0, arguments[0]);", random_position)
-                    time.sleep(random.uniform(1, 3))
-                
-                element = driver.find_element(By.XPATH, xpath_expr)
-                # Extrai o valor do atributo 'data-unix'
-                date_unix = element.get_attribute("data-unix")
-                match["data_unix"] = date_unix
-                logging.info(f"Match {match['match_id']} - Extraído data_unix: {date_unix}")
-                updated = True
-            except Exception as e:
-                logging.error(f"Match {match['match_id']} - Erro: {e}")
-            finally:
-                driver.quit()
-        else:
-            logging.info(f"Match {match['match_id']} já possui data_unix: {match['data_unix']}")
-        
-        if match.get("data_unix") and not match.get("data_unix_converted"):
-            try:
-                # Converter timestamp (assumindo milissegundos)
-                timestamp = int(match["data_unix"]) / 1000.0
-                converted_date = datetime.datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-                match["data_unix_converted"] = converted_date
-                logging.info(f"Match {match['match_id']} - data_unix_converted atualizado: {converted_date}")
-                updated = True
-            except Exception as conv_err:
-                logging.error(f"Match {match['match_id']} - Erro na conversão da data: {conv_err}")
-        return updated
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        futures = {executor.submit(process_match, match): match for match in matches}
-        progress_bar = tqdm(total=len(futures), desc="Processando partidas")
-        for future in concurrent.futures.as_completed(futures):
-            progress_bar.update(1)
-            try:
-                was_updated = future.result()
-                if was_updated:
-                    with count_lock:
-                        updated_count += 1
-                        if updated_count % 15 == 0:
-                            with open(file_path, "w", encoding="utf-8") as f:
-                                json.dump(matches, f, indent=4, ensure_ascii=False)
-                            logging.info(f"Arquivo salvo após {updated_count} partidas atualizadas.")
-            except Exception as exc:
-                match_err = futures[future]
-                logging.error(f"Match {match_err['match_id']} gerou exceção: {exc}")
-        progress_bar.close()
+    updated_data = update_matches_with_date_unix(match_data, store, index=index)
+    undated = [match["url"] for match in updated_data if match.get("url") in pending_urls and not match.get("data_unix")]
+    if undated:
+        index.reject("dated", undated)
+        logging.info(f"{len(undated)} partidas continuam sem data e não serão visitadas de novo.")
 
-    # Grava o arquivo final ao término do processamento
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(matches, f, indent=4, ensure_ascii=False)
-    logging.info("Arquivo salvo ao final.")
-    return matches
+    print(json.dumps(updated_data, indent=4, ensure_ascii=False))
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
-    file_path = "data/match_details.json"
-    
-    with open(file_path, "r", encoding="utf-8") as file:
-        match_data = json.load(file)
-    
-    updated_data = update_matches_with_date_unix(match_data, file_path)
-    
-    print(json.dumps(updated_data, indent=4, ensure_ascii=False))
+    main()
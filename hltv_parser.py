@@ -0,0 +1,298 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from lxml import html as lxml_html
+
+# Mesmo XPath usado por get_data_unix no HLTV_Extract_Players_Sequencial.py
+DATA_UNIX_XPATH = '/html/body/div[5]/div[8]/div[2]/div[1]/div[2]/div[2]/div[2]/div[2]'
+DATA_UNIX_FALLBACK_XPATH = "(//*[contains(concat(' ', normalize-space(@class), ' '), ' timeAndEvent ')]//*[@data-unix])[1]"
+
+PICKS_BANS_KEYS = ["ban 1", "ban 2", "pick 1", "pick 2", "ban 3", "ban 4", "pick 3"]
+# player, k_d, plus_minus, adr, kast e rating: colunas lidas de cada linha das tabelas de estatísticas
+PLAYER_STATS_COLUMNS = 6
+
+# Elementos que quebram linha no texto renderizado (equivalente ao .text do Selenium)
+_BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li",
+    "main", "nav", "ol", "p", "section", "table", "tbody", "td", "tfoot", "th",
+    "thead", "tr", "ul",
+}
+_HIDDEN_TAGS = {"script", "style", "noscript", "template", "head"}
+_HIDDEN_CLASSES = {"smartphone-only", "hidden"}
+
+
+class ParseError(ValueError):
+    """A página não tem a estrutura esperada (ex.: desafio do Cloudflare ou layout alterado)."""
+
+
+class ChallengeError(ParseError):
+    """A resposta é uma página de desafio do Cloudflare, e não o conteúdo pedido."""
+
+
+def is_challenge_title(title: Optional[str]) -> bool:
+    title = (title or "").strip().lower()
+    return "just a moment" in title or "attention required" in title
+
+
+def _class_xpath(class_name: str) -> str:
+    """XPath equivalente ao By.CLASS_NAME do Selenium."""
+    return f".//*[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+
+def _is_hidden(element) -> bool:
+    if element.tag in _HIDDEN_TAGS:
+        return True
+    classes = set((element.get("class") or "").split())
+    if classes & _HIDDEN_CLASSES:
+        return True
+    style = (element.get("style") or "").replace(" ", "").lower()
+    return "display:none" in style
+
+
+def element_text(element) -> str:
+    """
+    Aproxima o `.text` do Selenium: texto visível, com quebra de linha entre
+    elementos de bloco e espaços colapsados dentro de cada linha.
+    """
+    lines: List[str] = []
+    buffer: List[str] = []
+
+    def flush() -> None:
+        line = " ".join("".join(buffer).split())
+        if line:
+            lines.append(line)
+        buffer.clear()
+
+    def walk(node) -> None:
+        if not isinstance(node.tag, str) or _is_hidden(node):
+            return
+        is_block = node.tag in _BLOCK_TAGS
+        if is_block:
+            flush()
+        if node.text:
+            buffer.append(node.text)
+        for child in node:
+            walk(child)
+            if child.tail:
+                buffer.append(child.tail)
+        if is_block:
+            flush()
+
+    walk(element)
+    flush()
+    return "\n".join(lines)
+
+
+def parse_document(page_source: str):
+    """Converte o HTML em árvore lxml, detectando páginas de desafio do Cloudflare."""
+    if not page_source or not page_source.strip():
+        raise ParseError("Página vazia.")
+    tree = lxml_html.fromstring(page_source)
+    if is_challenge_title(" ".join(tree.xpath("//title//text()"))):
+        raise ChallengeError("Página de desafio do Cloudflare.")
+    return tree
+
+
+def convert_data_unix(data_unix: Optional[str], utc: bool = False) -> Optional[str]:
+    """
+    Converte o atributo data-unix (segundos ou milissegundos) para 'YYYY-mm-dd HH:MM:SS',
+    no fuso local da máquina (como a extração sempre fez) ou, com `utc`, em UTC (como o
+    backfill de datas sempre fez).
+    """
+    data_unix = str(data_unix)
+    timestamp = int(data_unix)
+    # Se o timestamp possuir mais de 10 dígitos, assume que está em milissegundos
+    if len(data_unix) > 10:
+        timestamp = timestamp / 1000.0
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc) if utc else datetime.fromtimestamp(timestamp)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def is_empty_value(val) -> bool:
+    if val is None:
+        return True
+    if isinstance(val, str) and val.strip() == "":
+        return True
+    if isinstance(val, list) and len(val) == 0:
+        return True
+    if isinstance(val, dict) and len(val) == 0:
+        return True
+    return False
+
+
+def derive_data_unix_converted(record: Dict) -> bool:
+    """
+    Preenche data_unix_converted (em UTC, como o backfill de datas sempre fez) a partir do
+    data_unix já gravado, sem visitar a página. Retorna se o registro foi alterado.
+    """
+    if is_empty_value(record.get("data_unix")) or not is_empty_value(record.get("data_unix_converted")):
+        return False
+    try:
+        record["data_unix_converted"] = convert_data_unix(record["data_unix"], utc=True)
+    except (TypeError, ValueError, OverflowError, OSError) as e:
+        logging.warning(f"Erro ao converter data-unix de {record.get('url')}: {e}")
+        return False
+    return True
+
+
+def parse_results_page(page_source: str, base_url: str) -> List[Dict[str, str]]:
+    """Extrai a listagem de /results no mesmo formato de HLTV_Extract.get_results_from_page."""
+    tree = parse_document(page_source)
+    games = tree.xpath(_class_xpath("a-reset"))
+    if not games:
+        raise ParseError("Nenhum elemento 'a-reset' encontrado.")
+    results = []
+    for game in games:
+        href = game.get("href")
+        results.append({
+            "jogo": element_text(game),
+            "link": urljoin(base_url, href) if href is not None else None,
+        })
+    return results
+
+
+def parse_pagination_total(page_source: str) -> int:
+    """Extrai o total de resultados do elemento 'pagination-data'."""
+    tree = parse_document(page_source)
+    elements = tree.xpath(_class_xpath("pagination-data"))
+    if not elements:
+        raise ParseError("Elemento 'pagination-data' não encontrado.")
+    try:
+        return int(element_text(elements[0])[11:])
+    except ValueError as e:
+        raise ParseError(f"Total de resultados inválido: {e}") from e
+
+
+def build_data_unix(data_unix: Optional[str]) -> Dict[str, Optional[str]]:
+    """Monta data_unix/data_unix_converted a partir do valor bruto do atributo."""
+    try:
+        converted_date = convert_data_unix(data_unix)
+    except (TypeError, ValueError, OverflowError, OSError):
+        converted_date = None
+    return {"data_unix": data_unix, "data_unix_converted": converted_date}
+
+
+def build_flexbox(team_names: List[str], first_team_text: str, second_team_text: str) -> Dict[str, any]:
+    """Monta times, placares e vencedor a partir dos textos do bloco de placar."""
+    flexbox_dict = {
+        "first_team": team_names[0],
+        "second_team": team_names[1],
+    }
+    try:
+        flexbox_dict["first_team_total_score"] = int(first_team_text.strip().split("\n")[-1])
+        flexbox_dict["second_team_total_score"] = int(second_team_text.strip().split("\n")[-1])
+    except ValueError as e:
+        raise ParseError(f"Placar inválido: {e}") from e
+    flexbox_dict["first_team_won"] = int(
+        flexbox_dict["first_team_total_score"] > flexbox_dict["second_team_total_score"]
+    )
+    return flexbox_dict
+
+
+def build_picks_bans(picks_bans: List[str], first_team: str) -> Dict[str, any]:
+    """Monta picks/bans a partir das linhas do segundo bloco 'col-6'."""
+    picks_bans_dict = {}
+    first_ban = picks_bans[0].split(".")[-1].strip().split(" ")[0].lower()
+    picks_bans_dict["first_pick_by_first_team"] = int(first_ban == first_team.lower())
+    for i, key in enumerate(PICKS_BANS_KEYS):
+        if i < len(picks_bans):
+            picks_bans_dict[key] = picks_bans[i].split(" ")[-1]
+    return picks_bans_dict
+
+
+def build_player_stats(tables: List[Tuple[str, List[List[str]]]]) -> List[Dict[str, str]]:
+    """
+    Monta as estatísticas a partir de (nome do time, linhas de células) de cada tabela.
+    As linhas não incluem o cabeçalho. Linhas de uma célula só (separadores) são ignoradas;
+    linhas com menos colunas que as estatísticas levantam ParseError, para cair no fallback.
+    """
+    stats = []
+    for team_name, rows in tables:
+        for cols in rows:
+            if len(cols) <= 1:
+                continue
+            if len(cols) < PLAYER_STATS_COLUMNS:
+                raise ParseError(f"Linha de estatísticas com {len(cols)} colunas (esperado {PLAYER_STATS_COLUMNS}).")
+            stats.append({
+                "team": team_name,
+                "player": cols[0].strip(),
+                "k_d": cols[1].strip(),
+                "plus_minus": cols[2].strip(),
+                "adr": cols[3].strip(),
+                "kast": cols[4].strip(),
+                "rating": cols[5].strip(),
+            })
+    return stats
+
+
+def parse_date(tree) -> Dict[str, Optional[str]]:
+    elements = tree.xpath(_class_xpath("date"))
+    return {"date": element_text(elements[0]) if elements else None}
+
+
+def parse_data_unix(tree) -> Dict[str, Optional[str]]:
+    elements = tree.xpath(DATA_UNIX_XPATH) or tree.xpath(DATA_UNIX_FALLBACK_XPATH)
+    if not elements:
+        return {"data_unix": None, "data_unix_converted": None}
+    return build_data_unix(elements[0].get("data-unix"))
+
+
+def parse_flexbox(tree) -> Dict[str, any]:
+    boxes = tree.xpath(_class_xpath("flexbox-column"))
+    team_names = boxes[0].xpath(_class_xpath("results-teamname")) if boxes else []
+    first_gradient = tree.xpath(_class_xpath("team1-gradient"))
+    second_gradient = tree.xpath(_class_xpath("team2-gradient"))
+    if len(team_names) < 2 or not first_gradient or not second_gradient:
+        raise ParseError("Bloco de times/placar não encontrado.")
+    return build_flexbox(
+        [element_text(name) for name in team_names],
+        element_text(first_gradient[0]),
+        element_text(second_gradient[0]),
+    )
+
+
+def parse_picks_bans(tree, first_team: str) -> Dict[str, any]:
+    columns = tree.xpath(_class_xpath("col-6"))
+    if len(columns) < 2:
+        return {}
+    return build_picks_bans(element_text(columns[1]).split("\n"), first_team)
+
+
+def parse_player_stats(tree) -> List[Dict[str, str]]:
+    content = tree.xpath('//*[@id="all-content"]')
+    if not content:
+        raise ParseError("Tabela de estatísticas (#all-content) não encontrada.")
+    tables = content[0].xpath("./table")
+    if len(tables) < 4:
+        raise ParseError("Tabelas de estatísticas incompletas.")
+
+    parsed_tables = []
+    for table in (tables[0], tables[3]):
+        # O HTML bruto nem sempre tem <tbody> (é o navegador que o insere)
+        rows = table.xpath(".//tr")
+        header = rows[0].xpath("./td[1]/div/a") if rows else []
+        if not header:
+            raise ParseError("Nome do time não encontrado na tabela de estatísticas.")
+        team_name = element_text(header[0]).strip()
+        cells = [[element_text(col) for col in row.xpath(".//td")] for row in rows[1:]]
+        parsed_tables.append((team_name, cells))
+    return build_player_stats(parsed_tables)
+
+
+def parse_match_page(page_source: str) -> Dict[str, any]:
+    """
+    Extrai os detalhes de uma partida a partir do HTML, com as mesmas chaves do
+    `details_dict` montado por process_url (exceto url e match_id).
+    Levanta ParseError quando a página não tem a estrutura esperada.
+    """
+    tree = parse_document(page_source)
+    details_dict = parse_date(tree)
+    details_dict.update(parse_data_unix(tree))
+    flex = parse_flexbox(tree)
+    details_dict.update(flex)
+    details_dict.update(parse_picks_bans(tree, flex["first_team"]))
+    details_dict["player_stats"] = parse_player_stats(tree)
+    return details_dict
@@ -0,0 +1,98 @@
+import logging
+import os
+import random
+from typing import List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import instrumentation
+
+DEFAULT_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.5993.89 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36",
+]
+
+
+def hltv_url(path: str = "") -> str:
+    """
+    URL do HLTV para `path`. A variável de ambiente HLTV_BASE_URL troca o host, por exemplo
+    pelo mock_hltv_server nos benchmarks.
+    """
+    return os.environ.get("HLTV_BASE_URL", "https://www.hltv.org").rstrip("/") + path
+
+
+class FetchError(Exception):
+    """Falha ao baixar a página via HTTP (status inesperado ou erro de rede)."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class ThrottledError(FetchError):
+    """O servidor pediu para diminuir o ritmo (HTTP 429). `retry_after` em segundos, se informado."""
+
+    def __init__(self, message: str, status: Optional[int] = 429, retry_after: Optional[float] = None):
+        super().__init__(message, status=status)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Interpreta o cabeçalho Retry-After em segundos (a forma com data HTTP é ignorada)."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpFetcher:
+    """
+    Cliente HTTP com pool de conexões keep-alive para páginas renderizadas no servidor.
+    Pode apontar para o hltv.org ou para um servidor local com páginas salvas.
+    """
+
+    def __init__(self, pool_size: int = 8, timeout: float = 15, max_retries: int = 2,
+                 user_agents: Optional[List[str]] = None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        # 429 fica de fora: quem controla o ritmo é o escalonador (scrape_scheduler)
+        retry = Retry(total=max_retries, backoff_factor=0.5, respect_retry_after_header=False,
+                      status_forcelist=(500, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": random.choice(user_agents or DEFAULT_USER_AGENTS),
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+        })
+
+    def __enter__(self) -> "HttpFetcher":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def get(self, url: str) -> str:
+        """Retorna o HTML da página ou levanta FetchError."""
+        try:
+            with instrumentation.span("fetch"):
+                response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            instrumentation.inc("http_responses", status="network_error")
+            raise FetchError(f"Erro de rede em {url}: {e}") from e
+        instrumentation.inc("http_responses", status=response.status_code)
+        instrumentation.inc("http_bytes", len(response.content))
+        if response.status_code == 429:
+            raise ThrottledError(f"Status 429 em {url}",
+                                 retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        if response.status_code != 200:
+            raise FetchError(f"Status {response.status_code} em {url}", status=response.status_code)
+        logging.debug(f"HTTP {url} - {len(response.content)} bytes")
+        return response.text
+
+    def close(self) -> None:
+        self.session.close()
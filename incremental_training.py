@@ -0,0 +1,264 @@
+import argparse
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import accuracy_score, log_loss
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.preprocessing import StandardScaler
+import xgboost as xgb
+from xgboost import XGBClassifier
+
+from build_dataset import DATASET_DIR
+from feature_store import SIDES, _table_dir, load_match_modeling
+from model_registry import REGISTRY_DIR, list_versions, load_array, load_manifest, load_models, save_models
+
+TRAINED_MATCHES = "trained_matches"
+# Partidas mais recentes usadas no refit com warm start da regressão logística
+DEFAULT_WINDOW = 5000
+# Árvores acrescentadas ao XGBoost a cada atualização
+UPDATE_ROUNDS = 10
+CLASSES = np.array([0, 1])
+
+
+def incremental_models() -> Dict[str, object]:
+    """Modelos que podem ser atualizados sem retreinar todo o histórico."""
+    return {
+        "SGD Logistic": make_pipeline(StandardScaler(), SGDClassifier(loss="log_loss", random_state=42)),
+        "Logistic Regression warm start": LogisticRegression(solver="lbfgs", max_iter=5000, warm_start=True,
+                                                             random_state=42),
+        "XGBoost": XGBClassifier(n_estimators=100, eval_metric="logloss", random_state=42),
+    }
+
+
+def load_time_ordered(columns: Optional[List[str]] = None, dataset_dir: str = DATASET_DIR) -> pd.DataFrame:
+    """
+    `match_modeling` com o data_unix de cada partida, em ordem cronológica (empates pelo id).
+    Partidas sem data ou com features não finitas ficam de fora: não há como posicioná-las
+    no tempo ou usá-las no treino.
+    """
+    modeling = load_match_modeling(columns, dataset_dir)
+    dates = pd.read_parquet(_table_dir(dataset_dir, "matches"), columns=["match_id", "data_unix"])
+    modeling = modeling.join(dates.set_index("match_id"), on="game_id")
+    feature_columns = feature_columns_of(modeling)
+    modeling[feature_columns] = modeling[feature_columns].replace([np.inf, -np.inf], np.nan)
+    valid = modeling["data_unix"].notna() & modeling[feature_columns].notna().all(axis=1)
+    if not valid.all():
+        logging.info(f"{(~valid).sum()} partidas sem data ou com features inválidas ignoradas.")
+    return modeling[valid].sort_values(["data_unix", "game_id"], kind="stable").reset_index(drop=True)
+
+
+def feature_columns_of(modeling: pd.DataFrame) -> List[str]:
+    return [column for column in modeling.columns if column.endswith(("_first", "_second"))]
+
+
+def _update_model(model, X_new, y_new, X_window, y_window, initial: bool, update_rounds: int):
+    """
+    Atualiza um modelo com as partidas novas:
+    - SGD (pipeline com StandardScaler): partial_fit do scaler e do classificador só nas novas;
+    - XGBoost: `update_rounds` árvores a mais, treinadas só nas novas (xgb_model);
+    - LogisticRegression(warm_start=True): refit na janela recente partindo dos coeficientes
+      anteriores. Treinar só nas novas faria o modelo esquecer o histórico; com warm start o
+      refit converge em poucas iterações e o custo fica limitado ao tamanho da janela.
+    No treino inicial todos são ajustados do zero (a regressão logística só na janela).
+    """
+    estimator = model[-1] if isinstance(model, Pipeline) else model
+    if isinstance(estimator, LogisticRegression):
+        if not estimator.warm_start:
+            raise ValueError("LogisticRegression precisa de warm_start=True para treino incremental.")
+        model.fit(X_window, y_window)
+    elif initial:
+        model.fit(X_new, y_new)
+    elif isinstance(estimator, SGDClassifier):
+        scaler = model[0] if isinstance(model, Pipeline) else None
+        if scaler is not None:
+            scaler.partial_fit(X_new)
+            X_new = scaler.transform(X_new)
+        estimator.partial_fit(X_new, y_new, classes=CLASSES)
+    elif isinstance(estimator, XGBClassifier):
+        # Pela API nativa: o fit do wrapper recusa lotes com uma só classe (comum em um dia)
+        booster = xgb.train(model.get_xgb_params(), xgb.DMatrix(X_new, y_new),
+                            num_boost_round=update_rounds, xgb_model=model.get_booster())
+        model.load_model(bytearray(booster.save_raw()))
+    else:
+        raise ValueError(f"{type(estimator).__name__} não suporta treino incremental.")
+    return model
+
+
+def update_models(models: Dict[str, object], X_new: pd.DataFrame, y_new: pd.Series,
+                  X_window: pd.DataFrame, y_window: pd.Series, initial: bool = False,
+                  update_rounds: int = UPDATE_ROUNDS) -> pd.DataFrame:
+    """Atualiza os modelos no lugar e retorna o tempo de cada um."""
+    stats = []
+    for name, model in models.items():
+        start = time.perf_counter()
+        _update_model(model, X_new, y_new, X_window, y_window, initial, update_rounds)
+        stats.append({"Modelo": name, "Partidas novas": len(X_new),
+                      "Tempo de treino (s)": time.perf_counter() - start})
+    return pd.DataFrame(stats)
+
+
+def latest_incremental_version(registry_dir: str = REGISTRY_DIR) -> Optional[str]:
+    """Versão mais recente do registro publicada pelo treino incremental."""
+    for version in reversed(list_versions(registry_dir)):
+        if load_manifest(version, registry_dir)["metadata"].get("incremental"):
+            return version
+    return None
+
+
+def incremental_retrain(columns: Optional[List[str]] = None, dataset_dir: str = DATASET_DIR,
+                        registry_dir: str = REGISTRY_DIR, window: int = DEFAULT_WINDOW,
+                        update_rounds: int = UPDATE_ROUNDS,
+                        models_factory: Callable[[], Dict[str, object]] = incremental_models) -> Optional[str]:
+    """
+    Continua o treino da última versão incremental do registro apenas com as partidas que
+    ela ainda não viu, em ordem de data_unix, e publica o resultado como uma nova versão,
+    sem mover LATEST (quem usa a versão padrão do registro continua nos modelos do notebook).
+    Sem versão anterior, treina do zero em todo o histórico. Partidas que ganharam data
+    depois (mesmo que mais antigas) entram na atualização seguinte, pois a seleção é pelos
+    ids já treinados e não por um corte de data. Retorna a versão publicada, ou None se
+    não havia partidas novas.
+    """
+    parent = latest_incremental_version(registry_dir)
+    if parent is None:
+        models, trained = models_factory(), np.array([], dtype="int64")
+        columns = columns or ["avg_rating"]
+    else:
+        models, manifest = load_models(parent, registry_dir, mmap_mode=None)
+        trained = load_array(TRAINED_MATCHES, parent, registry_dir)
+        parent_columns = list(dict.fromkeys(c.rsplit("_", 1)[0] for c in manifest["feature_columns"]))
+        if columns is not None and list(columns) != parent_columns:
+            raise ValueError(f"A versão {parent} foi treinada com {parent_columns}; use as mesmas colunas.")
+        columns = parent_columns
+    modeling = load_time_ordered(columns, dataset_dir)
+    feature_columns = [f"{column}_{side}" for column in columns for side in SIDES]
+
+    new = ~modeling["game_id"].isin(trained)
+    if not new.any():
+        logging.info(f"Nenhuma partida nova desde a versão {parent}.")
+        return None
+    # Janela da regressão logística: as partidas mais recentes, já treinadas ou novas
+    window_rows = modeling.tail(window)
+    stats = update_models(
+        models, modeling.loc[new, feature_columns], modeling.loc[new, "first_team_won"],
+        window_rows[feature_columns], window_rows["first_team_won"],
+        initial=parent is None, update_rounds=update_rounds,
+    )
+    logging.info(f"{new.sum()} partidas novas treinadas em {stats['Tempo de treino (s)'].sum():.2f}s "
+                 f"(versão anterior: {parent}).")
+
+    trained = np.union1d(trained, modeling.loc[new, "game_id"].to_numpy(dtype="int64"))
+    return save_models(models, feature_columns, metadata={
+        "incremental": True,
+        "parent": parent,
+        "matches": int(len(trained)),
+        "new_matches": int(new.sum()),
+        "trained_until": int(modeling.loc[new, "data_unix"].max()),
+        "window": window,
+    }, registry_dir=registry_dir, arrays={TRAINED_MATCHES: trained}, set_latest=False)
+
+
+def _proba(model, X) -> np.ndarray:
+    proba = model.predict_proba(X)
+    return proba[:, list(model.classes_).index(1)]
+
+
+def rolling_backtest(modeling: pd.DataFrame, period: str = "1D", window: int = DEFAULT_WINDOW,
+                     min_train: int = 100, mode: str = "incremental", update_rounds: int = UPDATE_ROUNDS,
+                     models_factory: Callable[[], Dict[str, object]] = incremental_models) -> pd.DataFrame:
+    """
+    Backtest walk-forward sobre `load_time_ordered`: as partidas são agrupadas em períodos
+    (`period`, ex.: "1D" simula o retreino diário) e cada período é previsto só com modelos
+    treinados nas partidas anteriores a ele.
+
+    - mode="incremental": treino inicial nas primeiras `min_train` partidas e, depois de
+      prever cada período, atualização com as partidas dele (como o `incremental_retrain`);
+    - mode="refit": modelos novos a cada período, treinados do zero nas últimas `window`
+      partidas (janela deslizante), para comparação.
+
+    Retorna uma linha por (período, modelo) com acurácia, log loss e tempo de treino.
+    """
+    if mode not in ("incremental", "refit"):
+        raise ValueError(f"mode inválido: {mode}")
+    feature_columns = feature_columns_of(modeling)
+    X, y = modeling[feature_columns], modeling["first_team_won"]
+    periods = pd.to_datetime(modeling["data_unix"], unit="ms").dt.floor(period)
+    # Períodos que começam depois das primeiras min_train partidas
+    start = periods.iloc[min(min_train, len(modeling) - 1)]
+    boundaries = np.flatnonzero((periods >= start) & (periods != periods.shift()))
+
+    models, stats = None, None
+    rows = []
+    for i, begin in enumerate(boundaries):
+        end = boundaries[i + 1] if i + 1 < len(boundaries) else len(modeling)
+        if models is None or mode == "refit":
+            models = models_factory()
+            lo = max(0, begin - window)
+            stats = update_models(models, X.iloc[lo:begin], y.iloc[lo:begin], X.iloc[lo:begin], y.iloc[lo:begin],
+                                  initial=True, update_rounds=update_rounds)
+        y_test = y.iloc[begin:end]
+        for name, model in models.items():
+            proba = _proba(model, X.iloc[begin:end])
+            rows.append({
+                "Período": periods.iloc[begin], "Modelo": name, "Partidas treino": begin, "Partidas teste": end - begin,
+                "Acurácia": accuracy_score(y_test, proba >= 0.5),
+                "Log loss": log_loss(y_test, proba, labels=CLASSES),
+                "Tempo de treino (s)": stats.loc[stats["Modelo"] == name, "Tempo de treino (s)"].iloc[0],
+            })
+        if mode == "incremental":
+            lo = max(0, end - window)
+            stats = update_models(models, X.iloc[begin:end], y.iloc[begin:end], X.iloc[lo:end], y.iloc[lo:end],
+                                  update_rounds=update_rounds)
+    return pd.DataFrame(rows)
+
+
+def summarize_backtest(results: pd.DataFrame) -> pd.DataFrame:
+    """Acurácia e log loss ponderados pelo número de partidas de cada período, por modelo."""
+    weights = results["Partidas teste"]
+    summary = results.assign(
+        acertos=results["Acurácia"] * weights, perda=results["Log loss"] * weights,
+    ).groupby("Modelo", sort=False).agg(
+        periodos=("Período", "size"), partidas=("Partidas teste", "sum"), acertos=("acertos", "sum"),
+        perda=("perda", "sum"), treino=("Tempo de treino (s)", "sum"),
+    )
+    return pd.DataFrame({
+        "Períodos": summary["periodos"],
+        "Partidas": summary["partidas"],
+        "Acurácia": summary["acertos"] / summary["partidas"],
+        "Log loss": summary["perda"] / summary["partidas"],
+        "Tempo total de treino (s)": summary["treino"],
+    }).reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Treino incremental em ordem cronológica.")
+    parser.add_argument("--dataset-dir", default=DATASET_DIR)
+    parser.add_argument("--columns", nargs="+", help="Features base (padrão: avg_rating)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update = subparsers.add_parser("update", help="Treina as partidas novas e publica uma versão")
+    update.add_argument("--registry-dir", default=REGISTRY_DIR)
+
+    backtest = subparsers.add_parser("backtest", help="Backtest walk-forward")
+    backtest.add_argument("--period", default="1D")
+    backtest.add_argument("--min-train", type=int, default=100)
+    backtest.add_argument("--mode", choices=["incremental", "refit", "both"], default="both")
+
+    args = parser.parse_args(argv)
+    if args.command == "update":
+        incremental_retrain(args.columns, args.dataset_dir, args.registry_dir, args.window)
+        return
+    modeling = load_time_ordered(args.columns or ["avg_rating"], args.dataset_dir)
+    for mode in (["incremental", "refit"] if args.mode == "both" else [args.mode]):
+        results = rolling_backtest(modeling, args.period, args.window, args.min_train, mode)
+        print(f"\n{mode}:")
+        print(summarize_backtest(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
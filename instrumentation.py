@@ -0,0 +1,261 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from match_store import atomic_write_text
+
+METRICS_DIR = "data/metrics"
+PREFIX = "hltv_"
+# Limites (em segundos) dos histogramas de latência: de parsing (ms) a navegações lentas
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# URL em processamento na thread/tarefa atual; spans aninhados a herdam no trace
+_current_url: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_url", default=None)
+
+
+def _labels(labels: Dict) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class Metrics:
+    """
+    Contadores, gauges e histogramas em memória (thread-safe), exportados no formato texto
+    do Prometheus, mais um trace JSONL opcional com um registro por span.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        self.gauges: Dict[Tuple[str, LabelKey], float] = {}
+        # (nome, labels) -> [contagem por bucket, soma, total]
+        self.histograms: Dict[Tuple[str, LabelKey], List] = {}
+        self.constant_labels: LabelKey = ()
+        self.metrics_file: Optional[str] = None
+        self._trace = None
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    def record_span(self, stage: str, start: float, seconds: float, error: Optional[str], attrs: Dict) -> None:
+        self.observe("stage_seconds", seconds, stage=stage, status="error" if error else "ok")
+        if self._trace is None:
+            return
+        record = {"ts": round(start, 3), "stage": stage, "url": attrs.pop("url", None) or _current_url.get(),
+                  "seconds": round(seconds, 6), "status": "error" if error else "ok"}
+        if error:
+            record["error"] = error
+        record.update(attrs)
+        record["pid"] = os.getpid()
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._trace is not None:
+                self._trace.write(line)
+
+    def prometheus_text(self) -> str:
+        """Todas as métricas no formato de exposição texto do Prometheus."""
+        lines = []
+        with self._lock:
+            counters, gauges = dict(self.counters), dict(self.gauges)
+            histograms = {key: [list(value[0]), value[1], value[2]] for key, value in self.histograms.items()}
+        constant = self.constant_labels
+
+        def by_name(items):
+            grouped: Dict[str, List] = {}
+            for (name, labels), value in sorted(items.items()):
+                grouped.setdefault(name, []).append((constant + labels, value))
+            return grouped.items()
+
+        for name, series in by_name(counters):
+            lines.append(f"# TYPE {PREFIX}{name}_total counter")
+            lines.extend(f"{PREFIX}{name}_total{_format_labels(labels)} {value:g}" for labels, value in series)
+        for name, series in by_name(gauges):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.extend(f"{PREFIX}{name}{_format_labels(labels)} {value:g}" for labels, value in series)
+        for name, series in by_name(histograms):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for labels, (buckets, total, count) in series:
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS, buckets):
+                    cumulative += bucket
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self) -> None:
+        """Regrava o arquivo .prom (atomicamente) e descarrega o trace."""
+        with self._lock:
+            if self._trace is not None:
+                self._trace.flush()
+        if self.metrics_file is not None:
+            atomic_write_text(self.metrics_file, self.prometheus_text())
+
+    def close(self) -> None:
+        self.export()
+        with self._lock:
+            trace, self._trace = self._trace, None
+        if trace is not None:
+            trace.close()
+
+
+METRICS = Metrics()
+
+
+def configure(name: str, directory: Optional[str] = METRICS_DIR, port: Optional[int] = None,
+              **labels) -> Metrics:
+    """
+    Ativa a saída das métricas do processo: `<directory>/<name>.prom` (regravado a cada
+    `export()` e ao sair) e o trace `<directory>/<name>.trace.jsonl` (anexado). Com `port`,
+    serve também GET /metrics em localhost. `labels` são acrescentados a todas as séries.
+    """
+    labels.setdefault("script", name)
+    METRICS.close()
+    METRICS.constant_labels = _labels(labels)
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        METRICS.metrics_file = os.path.join(directory, f"{name}.prom")
+        METRICS._trace = open(os.path.join(directory, f"{name}.trace.jsonl"), "a", encoding="utf-8")
+    if port is not None:
+        serve_metrics(port)
+    atexit.unregister(METRICS.close)
+    atexit.register(METRICS.close)
+    return METRICS
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Endpoint /metrics para o Prometheus raspar durante a execução (thread daemon)."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = METRICS.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Métricas em http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    METRICS.inc(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    METRICS.set_gauge(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    METRICS.observe(name, value, **labels)
+
+
+def export() -> None:
+    METRICS.export()
+
+
+@contextmanager
+def trace(url: Optional[str]) -> Iterator[None]:
+    """Associa os spans executados dentro do bloco (na mesma thread/tarefa) à `url`."""
+    token = _current_url.set(url)
+    try:
+        yield
+    finally:
+        _current_url.reset(token)
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[None]:
+    """
+    Mede o bloco como uma etapa (launch, navigate, wait, sleep, extract, persist...):
+    alimenta o histograma `hltv_stage_seconds{stage, status}` e, se configurado, grava
+    uma linha no trace com a URL corrente. Exceções marcam o span como erro e sobem.
+    """
+    start = time.time()
+    began = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        METRICS.record_span(stage, start, time.perf_counter() - began, error, attrs)
+
+
+def summarize_trace(paths: List[str]):
+    """
+    Resumo por etapa de um ou mais traces JSONL: quantidade, erros, tempo total e
+    percentis, com a fração do tempo total gasta em cada etapa.
+    """
+    import pandas as pd
+
+    frame = pd.concat([pd.read_json(path, lines=True) for path in paths], ignore_index=True)
+    grouped = frame.groupby("stage")["seconds"]
+    summary = pd.DataFrame({
+        "spans": grouped.size(),
+        "erros": frame["status"].eq("error").groupby(frame["stage"]).sum(),
+        "total (s)": grouped.sum(),
+        "média (s)": grouped.mean(),
+        "p50 (s)": grouped.quantile(0.5),
+        "p95 (s)": grouped.quantile(0.95),
+        "máx (s)": grouped.max(),
+    })
+    summary["fração do tempo"] = summary["total (s)"] / summary["total (s)"].sum()
+    return summary.sort_values("total (s)", ascending=False)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Uso: python instrumentation.py {METRICS_DIR}/<script>.trace.jsonl [...]")
+        sys.exit(1)
+    print(summarize_trace(sys.argv[1:]).to_string(float_format=lambda value: f"{value:.3f}"))
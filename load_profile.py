@@ -0,0 +1,166 @@
+import copy
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import instrumentation
+
+if TYPE_CHECKING:
+    import undetected_chromedriver as uc
+
+# Padrões de URL (sintaxe de Network.setBlockedURLs, com curinga *) por tipo de recurso.
+# Folhas de estilo não entram: o innerText lido pelos extratores depende do CSS
+# (display:none, quebras de linha dos blocos), e bloquear o CSS mudaria os textos extraídos.
+RESOURCE_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"],
+}
+
+# Anúncios, analytics e rastreadores de terceiros carregados pelas páginas do HLTV.
+# O desafio do Cloudflare (challenges.cloudflare.com) não pode entrar aqui.
+THIRD_PARTY_DOMAINS = [
+    "doubleclick.net", "googlesyndication.com", "googletagservices.com", "googletagmanager.com",
+    "google-analytics.com", "adservice.google.com", "amazon-adsystem.com", "adnxs.com", "criteo.com",
+    "criteo.net", "taboola.com", "outbrain.com", "scorecardresearch.com", "quantserve.com",
+    "hotjar.com", "facebook.net", "twitter.com", "twitch.tv", "youtube.com", "ytimg.com",
+]
+
+
+class LoadProfile:
+    """
+    Como o Chrome carrega as páginas: estratégia de carregamento, modo headless e o que a
+    interceptação de rede (CDP) bloqueia. Com `humanize`, o scraping de partidas mantém o
+    scroll e a interação com pausas fixas do fluxo antigo; sem ele, só espera os seletores
+    que os extratores leem. Com `measure` (desligado por padrão, pois custa memória e CPU
+    a cada página; o benchmark load-profile liga), o log de performance do Chrome fica ativo
+    para medir os bytes transferidos por página (ver `page_transfer`).
+    """
+
+    def __init__(self, name: str, page_load_strategy: str = "eager", headless: bool = False,
+                 block_resources: Sequence[str] = ("image", "font", "media"),
+                 block_domains: Sequence[str] = THIRD_PARTY_DOMAINS, humanize: bool = False,
+                 measure: bool = False):
+        self.name = name
+        self.page_load_strategy = page_load_strategy
+        self.headless = headless
+        self.block_resources = tuple(block_resources)
+        self.block_domains = tuple(block_domains)
+        self.humanize = humanize
+        self.measure = measure
+
+    def __repr__(self) -> str:
+        return f"LoadProfile({self.name!r})"
+
+    def measured(self) -> "LoadProfile":
+        """Cópia do perfil com o log de performance ativo, para medir bytes por página."""
+        profile = copy.copy(self)
+        profile.measure = True
+        return profile
+
+    def blocked_urls(self) -> List[str]:
+        patterns = [pattern for resource in self.block_resources for pattern in RESOURCE_PATTERNS[resource]]
+        return patterns + [f"*{domain}/*" for domain in self.block_domains]
+
+    def chrome_options(self) -> "uc.ChromeOptions":
+        """Opções do Chrome do perfil; quem chama acrescenta os próprios argumentos."""
+        # Import tardio: quem só lê perfis ou métricas não precisa carregar o Selenium
+        import undetected_chromedriver as uc
+
+        options = uc.ChromeOptions()
+        options.page_load_strategy = self.page_load_strategy
+        if self.headless:
+            options.add_argument("--window-size=1920,1080")
+        else:
+            options.add_argument("--start-maximized")
+        if "image" in self.block_resources:
+            # Além do bloqueio por URL, desliga a decodificação de imagens sem extensão na URL
+            options.add_argument("--blink-settings=imagesEnabled=false")
+        if self.measure:
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        return options
+
+    def launch(self, options: "uc.ChromeOptions", **kwargs) -> "uc.Chrome":
+        """Inicia o Chrome com `options` (de `chrome_options`) e instala o bloqueio de rede."""
+        import undetected_chromedriver as uc
+
+        driver = uc.Chrome(options=options, headless=self.headless, **kwargs)
+        try:
+            self.install(driver)
+        except Exception:
+            driver.quit()
+            raise
+        driver.load_profile = self
+        return driver
+
+    def install(self, driver) -> None:
+        urls = self.blocked_urls()
+        if not urls:
+            return
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
+
+    def record_page(self, driver, stage: str, seconds: float) -> Optional[Dict[str, int]]:
+        """
+        Registra o tempo da navegação até o fim da extração (`hltv_time_to_extract_seconds`)
+        e, se o perfil mede (`measure`), os bytes/requisições da página (`hltv_browser_bytes`,
+        `hltv_browser_requests`, `hltv_browser_blocked_requests`) com o nome do perfil como label.
+        """
+        instrumentation.observe("time_to_extract_seconds", seconds, stage=stage, profile=self.name)
+        transfer = page_transfer(driver) if self.measure else None
+        if transfer is not None:
+            instrumentation.inc("browser_bytes", transfer["bytes"], stage=stage, profile=self.name)
+            instrumentation.inc("browser_requests", transfer["requests"], stage=stage, profile=self.name)
+            instrumentation.inc("browser_blocked_requests", transfer["blocked"], stage=stage, profile=self.name)
+        return transfer
+
+
+PROFILES = {
+    # Comportamento anterior: carrega tudo e simula scroll/interação com pausas
+    "full": LoadProfile("full", page_load_strategy="normal", block_resources=(), block_domains=(),
+                        humanize=True),
+    "lean": LoadProfile("lean"),
+    "headless": LoadProfile("headless", headless=True),
+}
+DEFAULT_PROFILE = "lean"
+
+
+def get_load_profile(name: Optional[str] = None) -> LoadProfile:
+    """
+    Perfil `name`; sem nome, o da variável de ambiente HLTV_LOAD_PROFILE (padrão: lean).
+    """
+    name = name or os.environ.get("HLTV_LOAD_PROFILE", DEFAULT_PROFILE)
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Perfil de carregamento desconhecido: {name} (opções: {', '.join(PROFILES)})") from None
+
+
+def driver_profile(driver) -> LoadProfile:
+    """Perfil com que o driver foi iniciado (drivers criados fora de `launch` contam como full)."""
+    return getattr(driver, "load_profile", PROFILES["full"])
+
+
+def page_transfer(driver) -> Optional[Dict[str, int]]:
+    """
+    Bytes recebidos (encodedDataLength, inclusive cabeçalhos), requisições feitas e
+    requisições bloqueadas desde a chamada anterior, lidos do log de performance do Chrome
+    (a leitura esvazia o log). None se o log não estiver ativo.
+    """
+    try:
+        entries = driver.get_log("performance")
+    except Exception as e:
+        logging.debug(f"Log de performance indisponível: {e}")
+        return None
+    transfer = {"bytes": 0, "requests": 0, "blocked": 0}
+    for entry in entries:
+        message = json.loads(entry["message"])["message"]
+        method, params = message.get("method"), message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            transfer["requests"] += 1
+        elif method == "Network.loadingFinished":
+            transfer["bytes"] += int(params.get("encodedDataLength", 0))
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            transfer["blocked"] += 1
+    return transfer
@@ -0,0 +1,209 @@
+import csv
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Set
+
+from match_store import open_match_store
+
+# Etapas do pipeline, na ordem em que um jogo passa por elas
+STAGES = ("listed", "transformed", "detailed", "dated")
+MATCH_ID_PATTERN = re.compile(r"matches/(\d+)")
+
+
+def parse_match_id(url: Optional[str]) -> Optional[int]:
+    """Retorna o id numérico do HLTV presente na URL (`/matches/<id>/...`) ou None."""
+    if not url:
+        return None
+    match = MATCH_ID_PATTERN.search(url)
+    return int(match.group(1)) if match else None
+
+
+def _check_stage(stage: str) -> str:
+    if stage not in STAGES:
+        raise ValueError(f"Etapa desconhecida: {stage}. Use uma de {STAGES}.")
+    return stage
+
+
+class MatchIndex:
+    """
+    Índice em SQLite das partidas conhecidas, chaveado pelo id numérico do HLTV,
+    com o status de cada etapa (listed, transformed, detailed, dated).
+
+    Consultas por chave usam a chave primária e "o que falta para a etapa X" usa
+    índices parciais sobre as linhas pendentes, então o custo não cresce com o histórico.
+    """
+
+    def __init__(self, path: str = "data/pipeline_index.sqlite"):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            columns = ", ".join(f"{stage} INTEGER NOT NULL DEFAULT 0" for stage in STAGES)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS matches (match_id INTEGER PRIMARY KEY, url TEXT NOT NULL, {columns})"
+            )
+            for stage in STAGES:
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS pending_{stage} ON matches(match_id) WHERE {stage} = 0"
+                )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Partidas já tentadas que não têm como concluir a etapa (ex.: páginas sem data)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rejected (stage TEXT NOT NULL, match_id INTEGER NOT NULL, "
+                "PRIMARY KEY (stage, match_id))"
+            )
+
+    def __enter__(self) -> "MatchIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def mark(self, stage: str, urls: Iterable[str]) -> int:
+        """Marca a etapa como concluída para as URLs (inserindo as partidas ainda desconhecidas)."""
+        _check_stage(stage)
+        rows = []
+        for url in urls:
+            match_id = parse_match_id(url)
+            if match_id is not None:
+                rows.append((match_id, url))
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO matches (match_id, url, {stage}) VALUES (?, ?, 1) "
+                f"ON CONFLICT(match_id) DO UPDATE SET {stage} = 1",
+                rows,
+            )
+        return len(rows)
+
+    def unmark(self, stage: str, urls: Iterable[str]) -> int:
+        """Volta a etapa para pendente nas URLs já conhecidas (ex.: a data se perdeu)."""
+        _check_stage(stage)
+        ids = [(match_id,) for match_id in map(parse_match_id, urls) if match_id is not None]
+        if not ids:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(f"UPDATE matches SET {stage} = 0 WHERE match_id = ?", ids)
+        return len(ids)
+
+    def has(self, stage: str, url: str) -> bool:
+        """Indica se a partida da URL já concluiu a etapa."""
+        _check_stage(stage)
+        match_id = parse_match_id(url)
+        if match_id is None:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {stage} FROM matches WHERE match_id = ?", (match_id,)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def reject(self, stage: str, urls: Iterable[str]) -> int:
+        """Registra que as partidas foram tentadas e não têm como concluir a etapa."""
+        _check_stage(stage)
+        rows = [(stage, match_id) for match_id in map(parse_match_id, urls) if match_id is not None]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO rejected (stage, match_id) VALUES (?, ?)", rows)
+        return len(rows)
+
+    def pending(self, stage: str, after: Optional[str] = None, include_rejected: bool = True) -> List[str]:
+        """
+        URLs que ainda não concluíram `stage`. Com `after`, apenas as que já
+        concluíram a etapa anterior (ex.: pending("detailed", after="transformed")).
+        Sem `include_rejected`, as rejeitadas na etapa (ver `reject`) ficam de fora.
+        """
+        _check_stage(stage)
+        query = f"SELECT url FROM matches WHERE {stage} = 0"
+        if after is not None:
+            query += f" AND {_check_stage(after)} = 1"
+        params = ()
+        if not include_rejected:
+            query += " AND match_id NOT IN (SELECT match_id FROM rejected WHERE stage = ?)"
+            params = (stage,)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query + " ORDER BY match_id", params)]
+
+    def urls(self, stage: str) -> Set[str]:
+        _check_stage(stage)
+        with self._lock:
+            return {row[0] for row in self._conn.execute(f"SELECT url FROM matches WHERE {stage} = 1")}
+
+    def count(self, stage: str) -> int:
+        _check_stage(stage)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM matches WHERE {stage} = 1").fetchone()[0]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+
+def _links_from_ndjson(path: str) -> Iterable[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                link = json.loads(line).get("link")
+            except json.JSONDecodeError:
+                continue
+            if link:
+                yield link
+
+
+def _urls_from_csv(path: str, sep: str = ";") -> Iterable[str]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f, delimiter=sep):
+            if row.get("match_url"):
+                yield row["match_url"]
+
+
+def bootstrap_index(index: MatchIndex,
+                    listing_file: str = "data/extração_partidas.ndjson",
+                    transformed_file: str = "data/transformacao_intermediaria.csv",
+                    store_dir: str = "data/match_details") -> None:
+    """
+    Popula o índice uma única vez a partir dos artefatos já existentes de cada etapa.
+    Execuções seguintes não releem esses arquivos.
+    """
+    if index.get_meta("bootstrapped"):
+        return
+    if os.path.exists(listing_file):
+        logging.info(f"Índice: {index.mark('listed', _links_from_ndjson(listing_file))} partidas listadas importadas.")
+    if os.path.exists(transformed_file):
+        logging.info(f"Índice: {index.mark('transformed', _urls_from_csv(transformed_file))} partidas transformadas importadas.")
+    store = open_match_store(store_dir)
+    records = store.load_all()
+    index.mark("detailed", (r["url"] for r in records if r.get("url")))
+    index.mark("dated", (r["url"] for r in records if r.get("url") and r.get("data_unix")))
+    logging.info(f"Índice: {len(records)} partidas detalhadas importadas.")
+    index.set_meta("bootstrapped", "1")
+
+
+def open_match_index(path: str = "data/pipeline_index.sqlite", **bootstrap_kwargs) -> MatchIndex:
+    """Abre o índice, populando-o a partir dos arquivos existentes na primeira vez."""
+    index = MatchIndex(path)
+    bootstrap_index(index, **bootstrap_kwargs)
+    return index
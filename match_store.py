@@ -0,0 +1,276 @@
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{6})\.ndjson$")
+INDEX_FILENAME = "keys.idx"
+
+
+def _fsync_dir(path: str) -> None:
+    """Garante que renomeações/criações no diretório cheguem ao disco (no-op onde não é suportado)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path: str, text: str) -> None:
+    """Escreve o arquivo inteiro em um temporário e o renomeia por cima do destino."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+class MatchStore:
+    """
+    Armazenamento append-only dos detalhes das partidas em segmentos NDJSON.
+
+    Cada gravação acrescenta linhas ao segmento ativo (com fsync), então o custo é
+    proporcional ao lote e não ao histórico. Uma atualização de registro é apenas um
+    novo append com a mesma chave: na leitura vale a última versão. `compact()` reescreve
+    a versão mais recente de cada registro em um segmento novo, de forma atômica.
+
+    O arquivo `keys.idx` guarda as chaves (uma por linha) para que a deduplicação
+    não precise ler os segmentos. Ele é gravado depois dos registros: se o processo cair
+    entre as duas gravações, no pior caso a partida é extraída de novo e a nova versão
+    prevalece na leitura.
+    """
+
+    def __init__(self, root: str = "data/match_details", key_field: str = "url",
+                 segment_max_bytes: int = 64 * 1024 * 1024):
+        self.root = root
+        self.key_field = key_field
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self._keys: Optional[Set[str]] = None
+        self._tail_checked = False
+        os.makedirs(root, exist_ok=True)
+
+    # ------------------------------------------------------------------ segmentos
+    def _segment_numbers(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.root):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.root, f"segment-{number:06d}.ndjson")
+
+    def segment_paths(self) -> List[str]:
+        return [self._segment_path(n) for n in self._segment_numbers()]
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.root, INDEX_FILENAME)
+
+    def _repair_tail(self, path: str) -> None:
+        """Remove uma última linha incompleta (gravação interrompida) antes de voltar a anexar."""
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            data = f.read()
+            keep = data.rfind(b"\n") + 1
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+        logging.warning(f"Linha incompleta removida do final de {path}.")
+
+    def _active_segment(self) -> str:
+        numbers = self._segment_numbers()
+        if not numbers:
+            return self._segment_path(1)
+        path = self._segment_path(numbers[-1])
+        if not self._tail_checked:
+            self._repair_tail(path)
+            self._tail_checked = True
+        if os.path.getsize(path) >= self.segment_max_bytes:
+            return self._segment_path(numbers[-1] + 1)
+        return path
+
+    @staticmethod
+    def _read_segment(path: str) -> Iterator[Dict]:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    # Linha truncada por uma gravação interrompida
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    logging.error(f"Linha inválida em {path}: {e}")
+
+    # ------------------------------------------------------------------ leitura
+    def _key(self, record: Dict) -> Optional[str]:
+        value = record.get(self.key_field)
+        return None if value is None else str(value)
+
+    def is_empty(self) -> bool:
+        return not any(os.path.getsize(path) for path in self.segment_paths())
+
+    def keys(self) -> Set[str]:
+        """Chaves já gravadas, lidas do índice (reconstruído a partir dos segmentos se não existir)."""
+        with self._lock:
+            return set(self._load_keys())
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return str(key) in self._load_keys()
+
+    def _load_keys(self) -> Set[str]:
+        if self._keys is not None:
+            return self._keys
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                self._keys = {line[:-1] for line in f if line.endswith("\n")}
+        else:
+            self._keys = set()
+            for record in self._iter_raw():
+                key = self._key(record)
+                if key is not None:
+                    self._keys.add(key)
+            atomic_write_text(self._index_path, "".join(f"{key}\n" for key in self._keys))
+        return self._keys
+
+    def _iter_raw(self) -> Iterator[Dict]:
+        for path in self.segment_paths():
+            yield from self._read_segment(path)
+
+    def iter_records(self) -> Iterator[Dict]:
+        """Registros na ordem da primeira gravação, cada um na sua versão mais recente."""
+        latest: Dict[str, Dict] = {}
+        order: List = []
+        for record in self._iter_raw():
+            key = self._key(record)
+            if key is None:
+                order.append(record)
+                continue
+            if key not in latest:
+                order.append(key)
+            latest[key] = record
+        for item in order:
+            yield latest[item] if isinstance(item, str) else item
+
+    def end_position(self) -> Tuple[int, int]:
+        """Fim atual do armazenamento como (número do segmento, bytes), para leituras incrementais."""
+        numbers = self._segment_numbers()
+        if not numbers:
+            return (0, 0)
+        return numbers[-1], os.path.getsize(self._segment_path(numbers[-1]))
+
+    def iter_since(self, start: Tuple[int, int], end: Optional[Tuple[int, int]] = None) -> Iterator[Dict]:
+        """
+        Linhas gravadas entre as posições `start` e `end` (padrão: o fim atual), na ordem de
+        gravação e sem deduplicar versões. Como os segmentos só crescem e a compactação cria
+        um segmento de número maior, depois de um compact() a leitura volta a cobrir tudo.
+        """
+        end = self.end_position() if end is None else end
+        for number in self._segment_numbers():
+            if number < start[0] or number > end[0]:
+                continue
+            with open(self._segment_path(number), "rb") as f:
+                if number == start[0]:
+                    f.seek(start[1])
+                limit = end[1] if number == end[0] else None
+                for line in f:
+                    if limit is not None and f.tell() > limit or not line.endswith(b"\n"):
+                        break
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        logging.error(f"Linha inválida no segmento {number}: {e}")
+
+    def load_all(self) -> List[Dict]:
+        return list(self.iter_records())
+
+    # ------------------------------------------------------------------ escrita
+    def append(self, records: Iterable[Dict]) -> int:
+        """Anexa os registros ao segmento ativo e as chaves ao índice. Retorna quantos foram gravados."""
+        records = list(records)
+        if not records:
+            return 0
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self._lock:
+            keys = self._load_keys()
+            with open(self._active_segment(), "a", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            new_keys = []
+            for record in records:
+                key = self._key(record)
+                if key is not None and key not in keys:
+                    keys.add(key)
+                    new_keys.append(key)
+            if new_keys:
+                with open(self._index_path, "a", encoding="utf-8") as f:
+                    f.write("".join(f"{key}\n" for key in new_keys))
+                    f.flush()
+                    os.fsync(f.fileno())
+        return len(records)
+
+    def compact(self) -> int:
+        """
+        Reescreve a versão mais recente de cada registro em um único segmento novo.
+        O segmento novo é criado via arquivo temporário + rename antes de os antigos serem
+        removidos, então uma interrupção nunca deixa o armazenamento sem os dados.
+        """
+        with self._lock:
+            old_paths = self.segment_paths()
+            if not old_paths:
+                return 0
+            records = list(self.iter_records())
+            numbers = self._segment_numbers()
+            new_path = self._segment_path(numbers[-1] + 1)
+            atomic_write_text(new_path, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+            keys = {self._key(r) for r in records if self._key(r) is not None}
+            atomic_write_text(self._index_path, "".join(f"{key}\n" for key in keys))
+            self._keys = keys
+            for path in old_paths:
+                os.remove(path)
+            _fsync_dir(self.root)
+            self._tail_checked = True
+        logging.info(f"Compactação concluída: {len(records)} registros em {new_path}.")
+        return len(records)
+
+    # ------------------------------------------------------------------ compatibilidade
+    def import_json(self, json_path: str) -> int:
+        """Importa um arquivo no formato antigo (lista JSON única)."""
+        with open(json_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        count = self.append(records)
+        logging.info(f"{count} registros importados de {json_path}.")
+        return count
+
+    def export_json(self, json_path: str) -> int:
+        """Exporta a versão mais recente dos registros como lista JSON (formato antigo), de forma atômica."""
+        records = self.load_all()
+        atomic_write_text(json_path, json.dumps(records, indent=4, ensure_ascii=False))
+        return len(records)
+
+
+def open_match_store(root: str = "data/match_details",
+                     legacy_json: str = "data/match_details.json") -> MatchStore:
+    """Abre o armazenamento, importando o match_details.json antigo na primeira vez."""
+    store = MatchStore(root)
+    if store.is_empty() and legacy_json and os.path.exists(legacy_json):
+        store.import_json(legacy_json)
+    return store
@@ -0,0 +1,324 @@
+import argparse
+import html
+import json
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlparse
+
+from http_fetcher import HttpFetcher
+from match_index import parse_match_id
+
+PAGE_SIZE = 100
+MAPS = ["Ancient", "Anubis", "Dust2", "Inferno", "Mirage", "Nuke", "Train"]
+CHALLENGE_PAGE = "<html><head><title>Just a moment...</title></head><body>Checking your browser</body></html>"
+
+
+def synthetic_matches(count: int, seed: int = 0, teams: int = 200,
+                      first_id: int = 2_300_000, start_unix_ms: int = 1_704_067_200_000) -> List[Dict]:
+    """
+    Partidas no formato do MatchStore (o mesmo que process_url grava), com ids crescentes
+    e uma partida a cada ~30 minutos. Cada time tem sempre os mesmos 5 jogadores. As chaves
+    que começam com "_" só servem para montar as páginas (veja `store_record`).
+    """
+    rng = random.Random(seed)
+    # Nomes de uma palavra: o parser de picks/bans compara só a primeira palavra do time
+    names = [f"Team{i}" for i in range(teams)]
+    matches = []
+    for i in range(count):
+        first, second = rng.sample(names, 2)
+        bo = rng.choice((1, 3, 3, 5))
+        if bo == 1:
+            scores = (16, rng.randrange(14)) if rng.random() < 0.5 else (rng.randrange(14), 16)
+        else:
+            wins = bo // 2 + 1
+            scores = (wins, rng.randrange(wins)) if rng.random() < 0.5 else (rng.randrange(wins), wins)
+        data_unix = start_unix_ms + i * 1_800_000
+        maps = rng.sample(MAPS, 7)
+        picks_bans = {key: maps[j] for j, key in enumerate(["ban 1", "ban 2", "pick 1", "pick 2",
+                                                             "ban 3", "ban 4", "pick 3"])}
+        first_ban_team = rng.choice((first, second))
+        stats = []
+        for team in (first, second):
+            for player in range(5):
+                kills, deaths = rng.randint(5, 40), rng.randint(5, 40)
+                stats.append({
+                    "team": team,
+                    "player": f"{team} Player {player}",
+                    "k_d": f"{kills}-{deaths}",
+                    "plus_minus": f"{kills - deaths:+d}" if kills != deaths else "0",
+                    "adr": f"{rng.uniform(40, 120):.1f}",
+                    "kast": f"{rng.uniform(50, 90):.1f}%",
+                    "rating": f"{rng.uniform(0.4, 1.8):.2f}",
+                })
+        match_id = first_id + i
+        matches.append({
+            "date": time.strftime("%Y-%m-%d", time.gmtime(data_unix / 1000)),
+            "data_unix": str(data_unix),
+            "data_unix_converted": None,
+            "first_team": first,
+            "second_team": second,
+            "first_team_total_score": scores[0],
+            "second_team_total_score": scores[1],
+            "first_team_won": int(scores[0] > scores[1]),
+            "first_pick_by_first_team": int(first_ban_team == first),
+            **picks_bans,
+            "player_stats": stats,
+            "url": f"https://www.hltv.org/matches/{match_id}/{first}-vs-{second}".lower(),
+            "match_id": match_id,
+            # Usados só na listagem
+            "_event": f"Event {rng.randrange(300)}",
+            "_bo": f"bo{bo}",
+            "_first_ban_team": first_ban_team,
+        })
+    return matches
+
+
+def store_record(match: Dict) -> Dict:
+    """A partida sem as chaves auxiliares, como ficaria no MatchStore."""
+    return {key: value for key, value in match.items() if not key.startswith("_")}
+
+
+def render_results_page(matches: List[Dict], offset: int, total: int) -> str:
+    """Página /results com a paginação e um 'a-reset' por partida, como no HLTV."""
+    e = html.escape
+    rows = "".join(
+        f'<div class="result-con"><a href="{e(urlparse(m["url"]).path)}" class="a-reset">'
+        f'<div class="team">{e(m["first_team"])}</div>'
+        f'<div class="result-score">{m["first_team_total_score"]} - {m["second_team_total_score"]}</div>'
+        f'<div class="team">{e(m["second_team"])}</div>'
+        f'<div class="event-name">{e(m["_event"])}</div>'
+        f'<div class="map-text">{e(m["_bo"])}</div></a></div>'
+        for m in matches
+    )
+    return (
+        "<html><head><title>CS2 Results | HLTV.org</title></head><body>"
+        f'<div class="pagination-component"><span class="pagination-data">'
+        f"{offset + 1} - {offset + PAGE_SIZE} of {total}</span></div>"
+        f'<div class="results-all">{rows}</div></body></html>'
+    )
+
+
+def _stats_table(team: str, players: List[Dict]) -> str:
+    e = html.escape
+    header = (f'<tr class="header-row"><td class="players"><div><a href="/team/1/x">{e(team)}</a></div></td>'
+              "<td>K-D</td><td>+/-</td><td>ADR</td><td>KAST</td><td>Rating</td></tr>")
+    rows = "".join(
+        f'<tr><td class="players">{e(p["player"])}</td><td class="kd">{e(p["k_d"])}</td>'
+        f'<td class="plus-minus">{e(p["plus_minus"])}</td><td class="adr">{e(p["adr"])}</td>'
+        f'<td class="kast">{e(p["kast"])}</td><td class="rating">{e(p["rating"])}</td></tr>'
+        for p in players
+    )
+    return f'<table class="table totalstats">{header}{rows}</table>'
+
+
+def render_match_page(match: Dict, with_date: bool = True) -> str:
+    """Página de partida com os elementos lidos por hltv_parser.parse_match_page."""
+    e = html.escape
+    first, second = match["first_team"], match["second_team"]
+    data_unix = f' data-unix="{e(match["data_unix"])}"' if with_date else ""
+    ban_lines = []
+    for j, key in enumerate(["ban 1", "ban 2", "pick 1", "pick 2", "ban 3", "ban 4", "pick 3"]):
+        team = match["_first_ban_team"] if j % 2 == 0 else (second if match["_first_ban_team"] == first else first)
+        action = "picked" if key.startswith("pick") else "removed"
+        ban_lines.append(f"<div>{j + 1}. {e(team)} {action} {e(match[key])}</div>")
+    players = [[p for p in match["player_stats"] if p["team"] == team] for team in (first, second)]
+    tables = _stats_table(first, players[0]) + _stats_table(first, players[0]) \
+        + _stats_table(second, players[1]) + _stats_table(second, players[1])
+    return (
+        f"<html><head><title>{e(first)} vs. {e(second)} | HLTV.org</title></head><body>"
+        f'<div class="timeAndEvent"><div class="time"{data_unix}>12:00</div>'
+        f'<div class="date"{data_unix}>{e(match["date"])}</div>'
+        f'<div class="event">{e(match["_event"])}</div></div>'
+        f'<div class="flexbox-column"><div class="results-teamname">{e(first)}</div>'
+        f'<div class="results-teamname">{e(second)}</div></div>'
+        f'<div class="team1-gradient"><a href="/team/1/a">{e(first)}</a>'
+        f'<div class="score">{match["first_team_total_score"]}</div></div>'
+        f'<div class="team2-gradient"><a href="/team/2/b">{e(second)}</a>'
+        f'<div class="score">{match["second_team_total_score"]}</div></div>'
+        f'<div class="veto-box"><div class="col-6">{e(match["_bo"])}</div>'
+        f'<div class="col-6">{"".join(ban_lines)}</div></div>'
+        f'<div id="all-content">{tables}</div></body></html>'
+    )
+
+
+def fixture_path(directory: str, path: str) -> str:
+    """Arquivo de uma página gravada: o caminho da URL (com query) codificado no nome."""
+    return os.path.join(directory, quote(path, safe="") + ".html")
+
+
+def record_fixtures(urls: Iterable[str], directory: str) -> int:
+    """Baixa páginas reais (via HttpFetcher) e as grava como fixtures para o servidor."""
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    with HttpFetcher(pool_size=1) as fetcher:
+        for url in urls:
+            parsed = urlparse(url)
+            path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+            with open(fixture_path(directory, path), "w", encoding="utf-8") as f:
+                f.write(fetcher.get(url))
+            count += 1
+    return count
+
+
+class MockHLTVServer:
+    """
+    Servidor HTTP local no lugar do hltv.org: serve /results?offset=N e /matches/<id>/<slug>
+    a partir de `matches` (ex.: `synthetic_matches`), ou as páginas gravadas em
+    `fixtures_dir` quando existirem. Cada requisição espera uma latência uniforme em
+    `latency` e pode, com as taxas dadas, responder 503, 429 (com Retry-After), a página de
+    desafio do Cloudflare ou uma página de partida sem o data-unix.
+    """
+
+    def __init__(self, matches: List[Dict], latency: Tuple[float, float] = (0.0, 0.0), error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, challenge_rate: float = 0.0, missing_date_rate: float = 0.0,
+                 retry_after: float = 1.0, fixtures_dir: Optional[str] = None, seed: int = 0):
+        # Listagem da mais recente para a mais antiga, como no HLTV
+        self.listing = sorted(matches, key=lambda m: int(m["data_unix"]), reverse=True)
+        self.by_id = {m["match_id"]: m for m in matches}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.challenge_rate = challenge_rate
+        self.missing_date_rate = missing_date_rate
+        self.retry_after = retry_after
+        self.fixtures_dir = fixtures_dir
+        self.stats: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _roll(self) -> Tuple[float, float]:
+        with self._lock:
+            return self._rng.uniform(*self.latency), self._rng.random()
+
+    def handle(self, path: str) -> Tuple[int, Dict[str, str], str]:
+        """(status, cabeçalhos extras, corpo) de uma requisição GET."""
+        parsed = urlparse(path)
+        route = "results" if parsed.path.rstrip("/") == "/results" else \
+            "matches" if parsed.path.startswith("/matches/") else "other"
+        delay, roll = self._roll()
+        if delay:
+            time.sleep(delay)
+        if roll < self.error_rate:
+            self._count(f"{route}_503")
+            return 503, {}, "Service Unavailable"
+        roll -= self.error_rate
+        if roll < self.throttle_rate:
+            self._count(f"{route}_429")
+            return 429, {"Retry-After": f"{self.retry_after:g}"}, "Too Many Requests"
+        roll -= self.throttle_rate
+        if roll < self.challenge_rate:
+            self._count(f"{route}_challenge")
+            return 200, {}, CHALLENGE_PAGE
+        roll -= self.challenge_rate
+
+        if self.fixtures_dir is not None and os.path.exists(fixture_path(self.fixtures_dir, path)):
+            self._count(f"{route}_fixture")
+            with open(fixture_path(self.fixtures_dir, path), "r", encoding="utf-8") as f:
+                return 200, {}, f.read()
+        if route == "results":
+            offset = int(parse_qs(parsed.query).get("offset", ["0"])[0])
+            self._count("results_200")
+            return 200, {}, render_results_page(self.listing[offset:offset + PAGE_SIZE], offset, len(self.listing))
+        match = self.by_id.get(parse_match_id(path)) if route == "matches" else None
+        if match is None:
+            self._count(f"{route}_404")
+            return 404, {}, "Not Found"
+        self._count("matches_200")
+        return 200, {}, render_match_page(match, with_date=roll >= self.missing_date_rate)
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if self.path == "/__stats":
+                    status, headers, body = 200, {}, json.dumps(server.stats)
+                else:
+                    status, headers, body = server.handle(self.path)
+                payload = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logging.debug(f"mock {self.address_string()} - {format % args}")
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "MockHLTVServer":
+        if self._server is None:
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local com páginas no formato do HLTV.")
+    parser.add_argument("--matches", type=int, default=1000, help="Partidas sintéticas servidas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.05, 0.2], metavar=("MIN", "MAX"))
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--challenge-rate", type=float, default=0.0)
+    parser.add_argument("--missing-date-rate", type=float, default=0.0)
+    parser.add_argument("--fixtures-dir", help="Páginas gravadas (servidas no lugar das sintéticas)")
+    parser.add_argument("--record", nargs="+", metavar="URL", help="Grava estas URLs em --fixtures-dir e sai")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        if not args.fixtures_dir:
+            parser.error("--record exige --fixtures-dir")
+        print(f"{record_fixtures(args.record, args.fixtures_dir)} páginas gravadas em {args.fixtures_dir}.")
+        return
+
+    server = MockHLTVServer(
+        synthetic_matches(args.matches), tuple(args.latency), args.error_rate, args.throttle_rate,
+        args.challenge_rate, args.missing_date_rate, fixtures_dir=args.fixtures_dir,
+    )
+    base_url = server.start(args.host, args.port)
+    print(f"Servindo {args.matches} partidas em {base_url}. Use: export HLTV_BASE_URL={base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
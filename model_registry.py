@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+
+from match_store import atomic_write_text
+
+REGISTRY_DIR = "data/models"
+MANIFEST_FILENAME = "manifest.json"
+LATEST_FILENAME = "LATEST"
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def supports_mmap(model) -> bool:
+    """
+    Ensembles de árvores do sklearn (florestas, gradient boosting) funcionam com os arrays
+    mapeados somente leitura; SVC e outros precisam de arrays graváveis na previsão.
+    """
+    return hasattr(model, "estimators_")
+
+
+def list_versions(registry_dir: str = REGISTRY_DIR) -> List[str]:
+    """Versões publicadas (diretórios com manifest), da mais antiga para a mais recente."""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if os.path.exists(os.path.join(registry_dir, name, MANIFEST_FILENAME))
+    )
+
+
+def latest_version(registry_dir: str = REGISTRY_DIR) -> Optional[str]:
+    path = os.path.join(registry_dir, LATEST_FILENAME)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        if version:
+            return version
+    # Sem LATEST, a mais recente entre as publicadas como principais (ver `set_latest`)
+    for version in reversed(list_versions(registry_dir)):
+        with open(os.path.join(registry_dir, version, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            if json.load(f).get("set_latest", True):
+                return version
+    return None
+
+
+def save_models(models: Dict[str, object], feature_columns: Sequence[str],
+                metadata: Optional[Dict] = None, registry_dir: str = REGISTRY_DIR,
+                arrays: Optional[Dict[str, np.ndarray]] = None, set_latest: bool = True) -> str:
+    """
+    Publica os modelos treinados como uma nova versão do registro e a marca como a mais recente.
+    Com `set_latest=False`, a versão é publicada sem mexer em LATEST: quem carrega a versão
+    padrão (PredictionService, predict_service.py) continua na anterior, e a nova só é usada
+    quando pedida pelo nome (caso das versões do treino incremental).
+
+    Cada modelo vai para um arquivo joblib sem compressão; os ensembles de árvores ficam
+    marcados no manifest para terem seus arrays numpy mapeados em memória na carga.
+    `arrays` guarda junto da versão arrays numpy auxiliares (ex.: ids das partidas usadas
+    no treino), lidos com `load_array`. A versão é montada em um diretório temporário e
+    renomeada ao final, então uma versão incompleta nunca é publicada.
+    """
+    version = time.strftime("%Y%m%d-%H%M%S")
+    final_dir = os.path.join(registry_dir, version)
+    suffix = 1
+    while os.path.exists(final_dir):
+        suffix += 1
+        final_dir = os.path.join(registry_dir, f"{version}-{suffix}")
+    version = os.path.basename(final_dir)
+    tmp_dir = f"{final_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    files = {}
+    for name, model in models.items():
+        filename = f"{_slug(name)}.joblib"
+        joblib.dump(model, os.path.join(tmp_dir, filename))
+        files[name] = {"file": filename, "mmap": supports_mmap(model)}
+    array_files = {}
+    for name, values in (arrays or {}).items():
+        filename = f"{_slug(name)}.npy"
+        np.save(os.path.join(tmp_dir, filename), np.asarray(values))
+        array_files[name] = filename
+    manifest = {
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "feature_columns": list(feature_columns),
+        "models": files,
+        "arrays": array_files,
+        "metadata": metadata or {},
+        "set_latest": set_latest,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_dir, final_dir)
+    if set_latest:
+        atomic_write_text(os.path.join(registry_dir, LATEST_FILENAME), version + "\n")
+    logging.info(f"{len(files)} modelos publicados na versão {version}.")
+    return version
+
+
+def load_manifest(version: Optional[str] = None, registry_dir: str = REGISTRY_DIR) -> Dict:
+    version = version or latest_version(registry_dir)
+    if version is None:
+        raise FileNotFoundError(f"Nenhuma versão de modelos em {registry_dir}.")
+    with open(os.path.join(registry_dir, version, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_models(version: Optional[str] = None, registry_dir: str = REGISTRY_DIR,
+                names: Optional[Sequence[str]] = None,
+                mmap_mode: Optional[str] = "r") -> Tuple[Dict[str, object], Dict]:
+    """
+    Carrega os modelos de uma versão (a mais recente por padrão). Com `mmap_mode='r'` os
+    arrays dos ensembles de árvores ficam mapeados do disco em vez de copiados para a memória.
+    Retorna (modelos, manifest).
+    """
+    manifest = load_manifest(version, registry_dir)
+    directory = os.path.join(registry_dir, manifest["version"])
+    models = {}
+    for name, entry in manifest["models"].items():
+        if names is not None and name not in names:
+            continue
+        models[name] = joblib.load(os.path.join(directory, entry["file"]),
+                                   mmap_mode=mmap_mode if entry["mmap"] else None)
+    return models, manifest
+
+
+def load_array(name: str, version: Optional[str] = None, registry_dir: str = REGISTRY_DIR) -> np.ndarray:
+    """Array auxiliar salvo com a versão; KeyError se a versão não tiver esse array."""
+    manifest = load_manifest(version, registry_dir)
+    filename = manifest.get("arrays", {})[name]
+    return np.load(os.path.join(registry_dir, manifest["version"], filename))
@@ -0,0 +1,288 @@
+import argparse
+import hashlib
+import logging
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple, Union
+
+import zstandard
+
+from hltv_parser import ParseError, derive_data_unix_converted, is_empty_value, parse_match_page
+from match_index import open_match_index, parse_match_id
+from match_store import open_match_store
+
+PAGE_CACHE_DIR = "data/page_cache"
+# Limite padrão do cache (bytes comprimidos); uma página de partida fica em ~30-40 KB com zstd
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+# A eviction libera espaço até esta fração do limite, para não rodar a cada página nova
+EVICT_TO = 0.9
+COMPRESSION_LEVEL = 10
+
+
+def read_page(path: str) -> str:
+    """Descomprime um blob do cache (função de módulo para rodar em outros processos)."""
+    with open(path, "rb") as f:
+        return zstandard.ZstdDecompressor().decompress(f.read()).decode("utf-8")
+
+
+class PageCache:
+    """
+    Cache do HTML bruto das páginas de partida, para reextrair campos sem baixar de novo.
+
+    Os blobs são endereçados pelo conteúdo (sha256 do HTML), comprimidos com zstd em
+    `objects/<2 primeiros hex>/<digest>.zst`, então a mesma página baixada duas vezes ocupa
+    espaço uma vez só. Um SQLite (`index.sqlite`) guarda cada captura por (match_id, fetched_at)
+    e o tamanho dos blobs. Quando o total passa de `max_bytes`, as capturas mais antigas são
+    descartadas (e os blobs que ficarem sem referência, apagados).
+    """
+
+    def __init__(self, root: str = PAGE_CACHE_DIR, max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+                 level: int = COMPRESSION_LEVEL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.level = level
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        # Compressores zstd não são thread-safe: um por thread
+        self._local = threading.local()
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages (match_id INTEGER NOT NULL, fetched_at REAL NOT NULL, "
+                "url TEXT NOT NULL, digest TEXT NOT NULL, PRIMARY KEY (match_id, fetched_at))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages(fetched_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_digest ON pages(digest)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                "raw_size INTEGER NOT NULL)"
+            )
+        self._total = self._total_bytes()
+
+    def __enter__(self) -> "PageCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+        return compressor
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.zst")
+
+    def put(self, url: str, html: str, fetched_at: Optional[float] = None) -> str:
+        """Guarda a página de uma partida capturada em `fetched_at` (padrão: agora). Retorna o digest."""
+        match_id = parse_match_id(url)
+        if match_id is None:
+            raise ValueError(f"URL sem id de partida: {url}")
+        raw = html.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+        else:
+            data = self._compressor().compress(raw)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            size = len(data)
+        with self._lock, self._conn:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO blobs (digest, size, raw_size) VALUES (?, ?, ?)",
+                (digest, size, len(raw)),
+            ).rowcount
+            self._total += size * inserted
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (match_id, fetched_at, url, digest) VALUES (?, ?, ?, ?)",
+                (match_id, time.time() if fetched_at is None else fetched_at, url, digest),
+            )
+        if self.max_bytes is not None and self._total > self.max_bytes:
+            self.evict()
+        return digest
+
+    def get(self, key: Union[str, int], at: Optional[float] = None) -> Optional[str]:
+        """
+        HTML da captura mais recente da partida (`key` é a URL ou o id). Com `at`, a mais
+        recente até esse instante. None se a partida não estiver no cache.
+        """
+        match_id = key if isinstance(key, int) else parse_match_id(key)
+        query = "SELECT digest FROM pages WHERE match_id = ?"
+        params: Tuple = (match_id,)
+        if at is not None:
+            query += " AND fetched_at <= ?"
+            params += (at,)
+        with self._lock:
+            row = self._conn.execute(query + " ORDER BY fetched_at DESC LIMIT 1", params).fetchone()
+        return read_page(self.blob_path(row[0])) if row else None
+
+    def latest(self) -> List[Tuple[str, str, float]]:
+        """(url, caminho do blob, fetched_at) da captura mais recente de cada partida, por id."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, digest, MAX(fetched_at) FROM pages GROUP BY match_id ORDER BY match_id"
+            ).fetchall()
+        return [(url, self.blob_path(digest), fetched_at) for url, digest, fetched_at in rows]
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Descarta as capturas mais antigas até o total comprimido ficar abaixo de
+        EVICT_TO x `max_bytes` (padrão: o limite do cache). Retorna quantos blobs foram apagados.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        target = int(max_bytes * EVICT_TO)
+        removed = 0
+        self._total = self._total_bytes()
+        while self._total > target:
+            with self._lock, self._conn:
+                # Lote estimado pelo tamanho médio dos blobs, para não descartar além do necessário
+                blobs = self._conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+                batch = min(500, max(1, math.ceil((self._total - target) / max(1, self._total / max(1, blobs)))))
+                oldest = self._conn.execute(
+                    "SELECT match_id, fetched_at FROM pages ORDER BY fetched_at LIMIT ?", (batch,)
+                ).fetchall()
+                if not oldest:
+                    break
+                self._conn.executemany("DELETE FROM pages WHERE match_id = ? AND fetched_at = ?", oldest)
+                orphans = self._conn.execute(
+                    "SELECT digest, size FROM blobs WHERE NOT EXISTS "
+                    "(SELECT 1 FROM pages WHERE pages.digest = blobs.digest)"
+                ).fetchall()
+                self._conn.executemany("DELETE FROM blobs WHERE digest = ?", [(d,) for d, _ in orphans])
+            for digest, size in orphans:
+                try:
+                    os.remove(self.blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                self._total -= size
+            removed += len(orphans)
+        if removed:
+            logging.info(f"Cache de páginas: {removed} blobs removidos; {self._total / 2 ** 20:.1f} MiB em uso.")
+        return removed
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            pages, matches = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT match_id) FROM pages").fetchone()
+            blobs, size, raw_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0) FROM blobs"
+            ).fetchone()
+        return {"pages": pages, "matches": matches, "blobs": blobs, "bytes": size, "raw_bytes": raw_size,
+                "compression_ratio": raw_size / size if size else 0.0}
+
+
+def _reextract_chunk(entries: List[Tuple[str, str, float]]) -> Tuple[List[Dict], int]:
+    """Executado em outro processo: reinterpreta as páginas do lote com o parser atual."""
+    records, failures = [], 0
+    for url, path, _ in entries:
+        try:
+            record = parse_match_page(read_page(path))
+        except (ParseError, OSError, zstandard.ZstdError) as e:
+            logging.warning(f"Não foi possível reextrair {url}: {e}")
+            failures += 1
+            continue
+        record["url"] = url
+        record["match_id"] = parse_match_id(url)
+        records.append(record)
+    return records, failures
+
+
+def merge_reextracted(record: Optional[Dict], parsed: Dict) -> Dict:
+    """
+    Registro gravado atualizado com os campos não vazios da reextração: o que o fallback do
+    Selenium ou o modo de reparo já preencheu e a página em cache não traz fica como está.
+    data_unix_converted é derivado do data_unix em UTC, como no backfill de datas.
+    """
+    merged = dict(record or {})
+    for field, value in parsed.items():
+        if field == "data_unix_converted" or is_empty_value(value):
+            continue
+        if field == "data_unix" and value != merged.get("data_unix"):
+            merged["data_unix_converted"] = None
+        merged[field] = value
+    derive_data_unix_converted(merged)
+    return merged
+
+
+def reextract_from_cache(cache_dir: str = PAGE_CACHE_DIR, store_dir: str = "data/match_details",
+                         workers: Optional[int] = None, chunk_size: int = 500) -> Dict[str, float]:
+    """
+    Modo "reextrair do cache": roda o parser atual sobre a captura mais recente de cada
+    partida do cache, em lotes distribuídos por todos os núcleos, sem nenhum acesso à rede.
+    Os campos extraídos são mesclados nos registros do MatchStore (ver `merge_reextracted`),
+    que é compactado no final, e o índice do pipeline é atualizado; partidas que terminam
+    sem data voltam a ficar pendentes em `dated`. Páginas que o parser rejeita mantêm o
+    registro antigo.
+    """
+    start = time.perf_counter()
+    with PageCache(cache_dir, max_bytes=None) as cache:
+        entries = cache.latest()
+    index = open_match_index(store_dir=store_dir)
+    store = open_match_store(store_dir)
+    stored = {parse_match_id(record.get("url")): record for record in store.iter_records()}
+    chunks = [entries[pos:pos + chunk_size] for pos in range(0, len(entries), chunk_size)]
+    written = failures = 0
+
+    # "spawn" evita herdar threads e a conexão SQLite do processo pai
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        for future in as_completed([executor.submit(_reextract_chunk, chunk) for chunk in chunks]):
+            parsed, chunk_failures = future.result()
+            records = [merge_reextracted(stored.get(record["match_id"]), record) for record in parsed]
+            store.append(records)
+            index.mark("detailed", (record["url"] for record in records))
+            index.mark("dated", (record["url"] for record in records if not is_empty_value(record.get("data_unix"))))
+            index.unmark("dated", (record["url"] for record in records if is_empty_value(record.get("data_unix"))))
+            written += len(records)
+            failures += chunk_failures
+    if written:
+        store.compact()
+    seconds = time.perf_counter() - start
+    logging.info(f"{written} partidas reextraídas do cache em {seconds:.1f}s ({failures} falhas).")
+    return {"pages": len(entries), "records": written, "failures": failures, "seconds": seconds,
+            "pages_per_second": len(entries) / seconds if seconds else 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cache comprimido do HTML das páginas de partida.")
+    parser.add_argument("--cache-dir", default=PAGE_CACHE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Tamanho e taxa de compressão do cache")
+    reextract = subparsers.add_parser("reextract", help="Reextrai os detalhes das páginas em cache")
+    reextract.add_argument("--store-dir", default="data/match_details")
+    reextract.add_argument("--workers", type=int, default=None, help="Processos (padrão: todos os núcleos)")
+    evict = subparsers.add_parser("evict", help="Reduz o cache a um tamanho máximo")
+    evict.add_argument("--max-gb", type=float, required=True)
+
+    args = parser.parse_args(argv)
+    if args.command == "reextract":
+        print(reextract_from_cache(args.cache_dir, args.store_dir, args.workers))
+        return
+    with PageCache(args.cache_dir, max_bytes=None) as cache:
+        if args.command == "evict":
+            cache.evict(int(args.max_gb * 1024 ** 3))
+        print(cache.stats())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,364 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+from match_index import MatchIndex, parse_match_id
+from match_store import atomic_write_text
+
+# Este módulo só importa a biblioteca padrão e os módulos leves do índice/armazenamento:
+# pandas, pyarrow, selenium e cia. ficam nos subprocessos das etapas que de fato rodam.
+# Por isso os caminhos abaixo repetem as constantes dos módulos de cada etapa.
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = "data/pipeline_state.json"
+LOGS_DIR = "data/pipeline_logs"
+INDEX_FILE = "data/pipeline_index.sqlite"
+LISTING_FILE = "data/extração_partidas.ndjson"
+CSV_FILE = "data/transformacao_intermediaria.csv"
+STORE_DIR = "data/match_details"
+DATASET_DIR = "data/dataset"
+
+# Executado em um subprocesso por etapa: importa o módulo da etapa e chama a função
+RUNNER = f"""
+import importlib, logging, sys
+sys.path.insert(0, {REPO_DIR!r})
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+module, function = sys.argv[1:3]
+getattr(importlib.import_module(module), function)()
+"""
+
+
+class Stage:
+    """
+    Uma etapa do pipeline: a função `target` ("módulo:função", chamada sem argumentos em
+    um subprocesso), as etapas de que depende e os arquivos/diretórios que lê e grava.
+
+    A impressão digital da etapa combina tamanho e mtime de cada arquivo de `inputs` com
+    o trabalho pendente informado por `pending` (partidas pendentes no índice, por exemplo).
+    A etapa está em dia quando `pending` é 0, ou quando a impressão digital é a mesma da
+    última execução bem-sucedida e as saídas que ela deixou continuam lá. Se `pending`
+    não souber dizer (None), a etapa roda. A impressão digital salva é tirada depois da
+    execução, então etapas que gravam nas próprias entradas (dates) não ficam sempre
+    desatualizadas.
+    """
+
+    def __init__(self, name: str, target: str, deps: Sequence[str] = (), inputs: Sequence[str] = (),
+                 outputs: Sequence[str] = (), pending: Optional[Callable[[], Optional[int]]] = None,
+                 remote: bool = False):
+        self.name = name
+        self.target = target
+        self.deps = tuple(deps)
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.pending = pending
+        # Etapas remotas consultam o HLTV para saber se há trabalho (não rodam em modo offline)
+        self.remote = remote
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name!r})"
+
+    def fingerprint(self, pending: Optional[int]) -> str:
+        payload = {"target": self.target, "inputs": [_path_stats(path) for path in self.inputs],
+                   "pending": pending}
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def outputs_exist(self) -> bool:
+        return all(os.path.exists(path) for path in self.outputs)
+
+
+def _path_stats(path: str) -> List:
+    """(caminho, tamanho, mtime) de um arquivo, ou de cada arquivo sob um diretório."""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [[path, stat.st_size, stat.st_mtime_ns]]
+    stats = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            try:
+                stat = os.stat(full)
+            except FileNotFoundError:
+                continue
+            stats.append([os.path.relpath(full, path), stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+def index_pending(stage: str, after: str) -> Callable[[], Optional[int]]:
+    """
+    Partidas que concluíram `after` e não `stage` no índice, sem as já rejeitadas na etapa
+    (tentadas e sem como concluir); None se o índice ainda não existe.
+    """
+
+    def count() -> Optional[int]:
+        if not os.path.exists(INDEX_FILE):
+            return None
+        with MatchIndex(INDEX_FILE) as index:
+            return len(index.pending(stage, after=after, include_rejected=False))
+
+    return count
+
+
+def new_listing_results() -> Optional[int]:
+    """
+    Resultados da primeira página de /results que ainda não estão listados no índice
+    (uma requisição HTTP). None se a página não puder ser baixada ou interpretada:
+    nesse caso a listagem roda e usa o navegador.
+    """
+    from hltv_parser import ParseError, parse_results_page
+    from http_fetcher import FetchError, HttpFetcher, hltv_url
+
+    if not os.path.exists(INDEX_FILE):
+        return None
+    url = hltv_url("/results")
+    try:
+        with HttpFetcher(pool_size=1) as fetcher:
+            results = parse_results_page(fetcher.get(url), url)
+    except (FetchError, ParseError) as e:
+        logging.warning(f"Não foi possível verificar {url} via HTTP ({e}).")
+        return None
+    links = {result["link"] for result in results if parse_match_id(result["link"]) is not None}
+    with MatchIndex(INDEX_FILE) as index:
+        return sum(not index.has("listed", link) for link in links)
+
+
+STAGES = [
+    Stage("listing", "HLTV_Extract:main", outputs=[LISTING_FILE], pending=new_listing_results, remote=True),
+    Stage("transform", "HLTV_Transform:main", deps=["listing"], inputs=[LISTING_FILE], outputs=[CSV_FILE],
+          pending=index_pending("transformed", after="listed")),
+    Stage("details", "HLTV_Extract_Players_Sequencial:extract_players", deps=["transform"], inputs=[CSV_FILE],
+          outputs=[STORE_DIR], pending=index_pending("detailed", after="transformed")),
+    Stage("dates", "fetch_data:main", deps=["details"], inputs=[STORE_DIR], outputs=[STORE_DIR],
+          pending=index_pending("dated", after="detailed")),
+    Stage("dataset", "build_dataset:build_parquet_dataset", deps=["dates"], inputs=[STORE_DIR],
+          outputs=[os.path.join(DATASET_DIR, "matches"), os.path.join(DATASET_DIR, "players")]),
+    Stage("features", "feature_store:update_feature_store", deps=["dataset"],
+          inputs=[os.path.join(DATASET_DIR, "matches"), os.path.join(DATASET_DIR, "players")],
+          outputs=[os.path.join(DATASET_DIR, "team_features")]),
+    Stage("ratings", "rating_engine:update_ratings", deps=["dates"], inputs=[STORE_DIR], outputs=["data/ratings"]),
+    Stage("compact", "compact_history:build_compact_history", deps=["dates"], inputs=[STORE_DIR],
+          outputs=["data/compact"]),
+    Stage("train", "incremental_training:incremental_retrain", deps=["features"],
+          inputs=[os.path.join(DATASET_DIR, "team_features")], outputs=["data/models"]),
+]
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+def load_state(path: str = STATE_FILE) -> Dict[str, Dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def select_stages(targets: Optional[Sequence[str]] = None) -> List[Stage]:
+    """As etapas `targets` e todas as de que dependem, em ordem topológica (padrão: todas)."""
+    if not targets:
+        return list(STAGES)
+    unknown = [name for name in targets if name not in STAGES_BY_NAME]
+    if unknown:
+        raise ValueError(f"Etapas desconhecidas: {unknown}. Use uma de {list(STAGES_BY_NAME)}.")
+    selected = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo.extend(STAGES_BY_NAME[name].deps)
+    return [stage for stage in STAGES if stage.name in selected]
+
+
+def check_stage(stage: Stage, state: Dict[str, Dict], offline: bool = False) -> Dict:
+    """
+    Verifica se `stage` precisa rodar. Retorna {"stale", "reason", "pending", "fingerprint"};
+    em modo `offline`, etapas remotas não são consultadas e contam como em dia.
+    """
+    if stage.remote and offline:
+        return {"stale": False, "reason": "offline", "pending": None, "fingerprint": None}
+    pending = stage.pending() if stage.pending is not None else None
+    fingerprint = stage.fingerprint(pending)
+    previous = state.get(stage.name, {})
+    if pending == 0:
+        return {"stale": False, "reason": "nada pendente", "pending": pending, "fingerprint": fingerprint}
+    if stage.pending is not None and pending is None:
+        reason = "pendências desconhecidas"
+    elif not previous:
+        reason = "nunca executada"
+    elif previous["outputs"] and not stage.outputs_exist():
+        reason = "saída ausente"
+    elif previous["fingerprint"] == fingerprint:
+        return {"stale": False, "reason": "entradas inalteradas", "pending": pending, "fingerprint": fingerprint}
+    elif pending is not None:
+        reason = f"{pending} pendentes"
+    else:
+        reason = "entradas alteradas"
+    return {"stale": True, "reason": reason, "pending": pending, "fingerprint": fingerprint}
+
+
+class Pipeline:
+    """
+    Executa as etapas como um DAG: cada etapa é verificada quando todas as suas dependências
+    terminaram (a verificação vê as saídas novas delas), é pulada se estiver em dia e roda
+    em um subprocesso próprio; etapas independentes (ratings, compact e dataset, por
+    exemplo) rodam ao mesmo tempo, até `jobs`. A falha de uma etapa bloqueia só as que
+    dependem dela. O estado (impressão digital e duração da última execução bem-sucedida
+    de cada etapa) fica em `state_file`, e a saída de cada etapa em `<logs_dir>/<etapa>.log`.
+    """
+
+    def __init__(self, stages: Sequence[Stage], jobs: int = 2, force: bool = False, offline: bool = False,
+                 dry_run: bool = False, state_file: str = STATE_FILE, logs_dir: str = LOGS_DIR):
+        self.stages = list(stages)
+        self.jobs = jobs
+        self.force = force
+        self.offline = offline
+        self.dry_run = dry_run
+        self.state_file = state_file
+        self.logs_dir = logs_dir
+        self.state = load_state(state_file)
+        self._lock = threading.Lock()
+
+    def _save_state(self, stage: Stage, fingerprint: str, seconds: float) -> None:
+        with self._lock:
+            self.state[stage.name] = {"fingerprint": fingerprint, "finished_at": time.time(),
+                                      "seconds": round(seconds, 3), "outputs": stage.outputs_exist()}
+            atomic_write_text(self.state_file, json.dumps(self.state, indent=2, ensure_ascii=False) + "\n")
+
+    def _execute(self, stage: Stage) -> Dict:
+        check = check_stage(stage, self.state, self.offline)
+        if self.force and not (stage.remote and self.offline):
+            check.update(stale=True, reason="forçada")
+        result = {"stage": stage.name, "reason": check["reason"], "pending": check["pending"], "seconds": 0.0}
+        if not check["stale"]:
+            return dict(result, status="skipped")
+        if self.dry_run:
+            return dict(result, status="would-run")
+
+        module, function = stage.target.split(":")
+        os.makedirs(self.logs_dir, exist_ok=True)
+        log_path = os.path.join(self.logs_dir, f"{stage.name}.log")
+        logging.info(f"Executando {stage.name} ({check['reason']}); saída em {log_path}")
+        start = time.perf_counter()
+        with open(log_path, "a", encoding="utf-8") as log:
+            log.write(f"\n=== {time.strftime('%Y-%m-%d %H:%M:%S')} {stage.target} ===\n")
+            log.flush()
+            returncode = subprocess.run([sys.executable, "-c", RUNNER, module, function],
+                                        stdout=log, stderr=subprocess.STDOUT).returncode
+        seconds = time.perf_counter() - start
+        if returncode != 0:
+            logging.error(f"{stage.name} falhou (código {returncode}); veja {log_path}")
+            return dict(result, status="failed", seconds=seconds)
+        # Etapas remotas não repetem a consulta ao HLTV só para a impressão digital
+        fingerprint = check["fingerprint"] if stage.remote else stage.fingerprint(
+            stage.pending() if stage.pending is not None else None)
+        self._save_state(stage, fingerprint, seconds)
+        logging.info(f"{stage.name} concluída em {seconds:.1f}s")
+        return dict(result, status="ok", seconds=seconds)
+
+    def run(self) -> List[Dict]:
+        names = {stage.name for stage in self.stages}
+        waiting = list(self.stages)
+        finished: Dict[str, str] = {}
+        results = []
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            running = {}
+            while waiting or running:
+                for stage in list(waiting):
+                    deps = [dep for dep in stage.deps if dep in names]
+                    if any(finished.get(dep) in ("failed", "blocked") for dep in deps):
+                        waiting.remove(stage)
+                        finished[stage.name] = "blocked"
+                        results.append({"stage": stage.name, "status": "blocked", "seconds": 0.0,
+                                        "reason": "dependência falhou", "pending": None})
+                    elif self.dry_run and any(finished.get(dep) == "would-run" for dep in deps):
+                        # Sem executar a dependência não dá para saber o que ela vai produzir
+                        waiting.remove(stage)
+                        finished[stage.name] = "would-run"
+                        results.append({"stage": stage.name, "status": "would-run", "seconds": 0.0,
+                                        "reason": "dependência vai rodar", "pending": None})
+                    elif all(dep in finished for dep in deps):
+                        waiting.remove(stage)
+                        running[executor.submit(self._execute, stage)] = stage
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logging.error(f"Erro ao verificar/executar {stage.name}: {e}")
+                        result = {"stage": stage.name, "status": "failed", "seconds": 0.0,
+                                  "reason": type(e).__name__, "pending": None}
+                    finished[stage.name] = result["status"]
+                    results.append(result)
+        order = {stage.name: position for position, stage in enumerate(self.stages)}
+        return sorted(results, key=lambda result: order[result["stage"]])
+
+
+def status(offline: bool = True, state_file: str = STATE_FILE) -> List[Dict]:
+    """
+    Estado de cada etapa sem executar nada. Por padrão não consulta o HLTV (a listagem
+    aparece como "offline"); cada etapa é verificada com os arquivos como estão agora.
+    """
+    state = load_state(state_file)
+    rows = []
+    for stage in STAGES:
+        check = check_stage(stage, state, offline)
+        last = state.get(stage.name, {})
+        rows.append({"stage": stage.name, "status": "stale" if check["stale"] else "up-to-date",
+                     "reason": check["reason"], "pending": check["pending"],
+                     "last_run": time.strftime("%Y-%m-%d %H:%M", time.localtime(last["finished_at"]))
+                     if last else None,
+                     "seconds": last.get("seconds")})
+    return rows
+
+
+def print_table(rows: List[Dict], columns: Sequence[str]) -> None:
+    widths = {column: max(len(column), *(len(str(row.get(column, ""))) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str("" if row.get(column) is None else row[column]).ljust(widths[column])
+                        for column in columns))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pipeline HLTV: executa só as etapas desatualizadas.")
+    parser.add_argument("--state-file", default=STATE_FILE)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    status_parser = subparsers.add_parser("status", help="Estado de cada etapa (sem executar)")
+    status_parser.add_argument("--online", action="store_true",
+                               help="Consulta a primeira página de /results para saber se há partidas novas")
+
+    run = subparsers.add_parser("run", help="Executa as etapas desatualizadas (padrão: todas)")
+    run.add_argument("stages", nargs="*", help=f"Etapas alvo, com suas dependências ({', '.join(STAGES_BY_NAME)})")
+    run.add_argument("--dry-run", action="store_true", help="Só mostra o que rodaria")
+    run.add_argument("--force", action="store_true", help="Executa mesmo as etapas em dia")
+    run.add_argument("--offline", action="store_true", help="Não consulta o HLTV nem roda a listagem")
+    run.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Etapas em paralelo")
+
+    args = parser.parse_args(argv)
+    if args.command == "status":
+        print_table(status(not args.online, args.state_file),
+                    ["stage", "status", "reason", "pending", "last_run", "seconds"])
+        return 0
+
+    pipeline = Pipeline(select_stages(args.stages), args.jobs, args.force, args.offline, args.dry_run,
+                        args.state_file)
+    results = pipeline.run()
+    for result in results:
+        result["seconds"] = round(result["seconds"], 1)
+    print_table(results, ["stage", "status", "reason", "pending", "seconds"])
+    return 1 if any(result["status"] in ("failed", "blocked") for result in results) else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
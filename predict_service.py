@@ -0,0 +1,197 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from build_dataset import DATASET_DIR
+from feature_store import fixture_features, latest_team_features
+from model_registry import REGISTRY_DIR, load_models
+
+ENSEMBLE_COLUMN = "Ensemble (soft vote)"
+
+
+def positive_proba(model, X) -> np.ndarray:
+    """Probabilidade da classe 1 (first_team_won) segundo o modelo."""
+    proba = model.predict_proba(X)
+    classes = list(model.classes_)
+    return proba[:, classes.index(1)] if 1 in classes else np.zeros(len(proba))
+
+
+class PredictionService:
+    """
+    Modelos de uma versão do registro carregados uma única vez, prontos para prever lotes
+    de partidas. Cada previsão devolve a probabilidade de vitória do first_team por modelo.
+    """
+
+    def __init__(self, version: Optional[str] = None, registry_dir: str = REGISTRY_DIR,
+                 names: Optional[Sequence[str]] = None, mmap_mode: Optional[str] = "r",
+                 n_jobs: Optional[int] = -1, dataset_dir: str = DATASET_DIR, window: int = 1):
+        start = time.perf_counter()
+        self.models, self.manifest = load_models(version, registry_dir, names, mmap_mode)
+        self.version = self.manifest["version"]
+        self.feature_columns: List[str] = self.manifest["feature_columns"]
+        # Inferência paralela nos estimadores que aceitam n_jobs (florestas, XGBoost)
+        for model in self.models.values():
+            if n_jobs is not None and "n_jobs" in model.get_params():
+                model.set_params(n_jobs=n_jobs)
+        self.dataset_dir = dataset_dir
+        self.window = window
+        self._team_features: Optional[pd.DataFrame] = None
+        self.load_seconds = time.perf_counter() - start
+        # Estimadores do sklearn não são garantidamente thread-safe no predict
+        self._lock = threading.Lock()
+        logging.info(f"{len(self.models)} modelos da versão {self.version} carregados em {self.load_seconds:.3f}s.")
+
+    def features(self, rows: Union[pd.DataFrame, List[Dict]]) -> pd.DataFrame:
+        """Monta a matriz de features na ordem do treino; colunas ausentes geram KeyError."""
+        frame = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame.from_records(rows)
+        missing = [column for column in self.feature_columns if column not in frame.columns]
+        if missing:
+            raise KeyError(f"Colunas ausentes: {missing}")
+        return frame[self.feature_columns].astype("float64")
+
+    def predict(self, rows: Union[pd.DataFrame, List[Dict]]) -> pd.DataFrame:
+        """Uma linha por partida e uma coluna por modelo com P(first_team_won = 1)."""
+        X = self.features(rows)
+        with self._lock:
+            return pd.DataFrame({name: positive_proba(model, X) for name, model in self.models.items()},
+                                index=X.index)
+
+    @property
+    def team_features(self) -> pd.DataFrame:
+        """Features mais recentes de cada time (média das últimas `window` partidas), lidas uma vez."""
+        if self._team_features is None:
+            self._team_features = latest_team_features(self.window, self.dataset_dir)
+        return self._team_features
+
+    def refresh_team_features(self) -> None:
+        """Relê o feature store (ex.: depois de novas partidas entrarem no dataset)."""
+        self._team_features = None
+
+    def predict_fixtures(self, fixtures: Union[pd.DataFrame, Sequence[Tuple[str, str]]]) -> pd.DataFrame:
+        """
+        Prevê um lote de confrontos (team_A, team_B) de uma vez: monta as features de todos
+        a partir das estatísticas mais recentes de cada time, roda cada modelo sobre o lote
+        inteiro e acrescenta a média das probabilidades (soft vote) e o favorito.
+        Confrontos com time sem histórico ficam com probabilidades NaN.
+        """
+        if isinstance(fixtures, pd.DataFrame):
+            fixtures = fixtures[["team_A", "team_B"]].reset_index(drop=True)
+        else:
+            fixtures = pd.DataFrame(list(fixtures), columns=["team_A", "team_B"])
+        X = fixture_features(fixtures, self.team_features, self.feature_columns)
+        X = X.replace([np.inf, -np.inf], np.nan)
+        known = X.notna().all(axis=1)
+        if not known.all():
+            unknown = sorted(set(fixtures.loc[~known, "team_A"]) | set(fixtures.loc[~known, "team_B"])
+                             - set(self.team_features.index))
+            logging.warning(f"{(~known).sum()} confrontos sem histórico suficiente (times: {unknown}).")
+
+        probabilities = pd.DataFrame(np.nan, index=fixtures.index, columns=list(self.models))
+        if known.any():
+            probabilities.loc[known] = self.predict(X[known]).to_numpy()
+        result = pd.concat([fixtures, probabilities], axis=1)
+        result[ENSEMBLE_COLUMN] = probabilities.mean(axis=1, skipna=False)
+        result["Favorito"] = np.where(result[ENSEMBLE_COLUMN] >= 0.5, result["team_A"], result["team_B"])
+        result.loc[result[ENSEMBLE_COLUMN].isna(), "Favorito"] = None
+        return result
+
+
+def make_handler(service: PredictionService):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        """
+        GET /health, POST /predict com {"rows": [{feature: valor, ...}, ...]} e
+        POST /fixtures com {"fixtures": [["time A", "time B"], ...]}.
+        """
+
+        def _send(self, status: int, payload: Dict) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send(404, {"error": "not found"})
+                return
+            self._send(200, {"version": service.version, "models": list(service.models),
+                             "feature_columns": service.feature_columns})
+
+        def do_POST(self):
+            if self.path not in ("/predict", "/fixtures"):
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                start = time.perf_counter()
+                if self.path == "/predict":
+                    predictions = service.predict(payload.get("rows", []))
+                else:
+                    predictions = service.predict_fixtures([tuple(f) for f in payload.get("fixtures", [])])
+            except (KeyError, ValueError, AttributeError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            # NaN não é JSON válido
+            predictions = predictions.astype(object).where(predictions.notna(), None)
+            self._send(200, {
+                "version": service.version,
+                "seconds": time.perf_counter() - start,
+                "predictions": predictions.to_dict("records"),
+            })
+
+        def log_message(self, format, *args):
+            logging.debug(f"{self.address_string()} - {format % args}")
+
+    return PredictionHandler
+
+
+def make_server(service: PredictionService, host: str = "127.0.0.1", port: int = 8050) -> ThreadingHTTPServer:
+    return ThreadingHTTPServer((host, port), make_handler(service))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Previsões com os modelos do registro.")
+    parser.add_argument("--version", help="Versão do registro (padrão: a mais recente)")
+    parser.add_argument("--registry-dir", default=REGISTRY_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Servidor HTTP local")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8050)
+
+    predict = subparsers.add_parser("predict", help="Previsão em lote a partir de um .xlsx ou .csv")
+    predict.add_argument("input", help="Arquivo com as mesmas colunas de features do treino")
+
+    fixtures = subparsers.add_parser("fixtures", help="Previsão dos confrontos do dia (pares de times)")
+    fixtures.add_argument("input", help="Arquivo .xlsx ou .csv com as colunas team_A e team_B")
+    fixtures.add_argument("--window", type=int, default=1, help="Partidas recentes usadas por time")
+
+    args = parser.parse_args(argv)
+    service = PredictionService(args.version, args.registry_dir, window=getattr(args, "window", 1))
+    if args.command == "serve":
+        server = make_server(service, args.host, args.port)
+        logging.info(f"Servindo a versão {service.version} em http://{args.host}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    else:
+        rows = pd.read_excel(args.input) if args.input.endswith(".xlsx") else pd.read_csv(args.input)
+        predictions = service.predict(rows) if args.command == "predict" else service.predict_fixtures(rows)
+        print(predictions.to_string())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,343 @@
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from match_index import parse_match_id
+from match_store import atomic_write_text, open_match_store
+
+RATINGS_DIR = "data/ratings"
+INITIAL_RATING = 1500.0
+TEAM_K = 32.0
+PLAYER_K = 16.0
+# Limites do peso de desempenho individual (rating HLTV do jogador / média do time)
+PERFORMANCE_WEIGHT = (0.5, 2.0)
+
+HISTORY_SCHEMA = pa.schema([
+    ("match_id", pa.int64()),
+    ("data_unix", pa.int64()),
+    ("kind", pa.string()),
+    ("name", pa.string()),
+    ("side", pa.string()),
+    ("before", pa.float64()),
+    ("after", pa.float64()),
+])
+
+
+def expected_score(rating: float, opponent: float) -> float:
+    """Probabilidade de vitória pela fórmula do Elo."""
+    return 1.0 / (1.0 + 10 ** ((opponent - rating) / 400.0))
+
+
+def margin_multiplier(score_diff: int) -> float:
+    """Peso da margem do placar: 1 para diferença de 1 mapa, crescendo em log."""
+    return math.log2(1 + max(1, abs(score_diff)))
+
+
+def data_unix_ms(value) -> Optional[int]:
+    """data_unix em milissegundos (valores em segundos são convertidos, como no build_dataset)."""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 10 ** 10 else value * 1000
+
+
+def match_order_key(record: Dict) -> Optional[Tuple[int, int]]:
+    """Ordem cronológica das partidas: (data_unix em ms, id). None se faltar algum dos dois."""
+    data_unix = data_unix_ms(record.get("data_unix"))
+    # O id do HLTV vem da URL (registros antigos têm outro valor em "match_id")
+    match_id = parse_match_id(record.get("url")) or record.get("match_id")
+    if data_unix is None or match_id is None:
+        return None
+    return data_unix, int(match_id)
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def slim_record(record: Dict) -> Dict:
+    """Só os campos que o motor usa, para manter milhares de partidas em memória na ordenação."""
+    slim = {field: record.get(field) for field in (
+        "url", "match_id", "data_unix", "first_team", "second_team",
+        "first_team_total_score", "second_team_total_score", "first_team_won",
+    )}
+    slim["player_stats"] = [{"team": row.get("team"), "player": row.get("player"), "rating": row.get("rating")}
+                            for row in record.get("player_stats") or []]
+    return slim
+
+
+def lineups(player_stats: List[Dict]) -> List[List[Tuple[str, Optional[float]]]]:
+    """
+    Jogadores de cada time, na ordem das tabelas da página (a primeira é a do first_team),
+    como (nome, rating HLTV da partida).
+    """
+    by_team: Dict[str, List[Tuple[str, Optional[float]]]] = {}
+    for row in player_stats or []:
+        if row.get("player"):
+            by_team.setdefault(row.get("team"), []).append((row["player"], _float(row.get("rating"))))
+    return list(by_team.values())
+
+
+class RatingEngine:
+    """
+    Ratings Elo de times e jogadores atualizados partida a partida, em ordem de data_unix.
+
+    Cada partida custa O(jogadores): o Elo dos times usa first_team_won e a margem do placar;
+    o de cada jogador usa o resultado contra a média dos Elos da outra escalação, com o
+    ajuste ponderado pelo rating HLTV do jogador na partida (quem jogou melhor ganha mais na
+    vitória e perde menos na derrota). As linhas de histórico (Elo antes/depois de cada
+    partida) permitem consultas no tempo sem vazar o resultado da própria partida.
+    """
+
+    def __init__(self, team_k: float = TEAM_K, player_k: float = PLAYER_K, initial: float = INITIAL_RATING):
+        self.team_k = team_k
+        self.player_k = player_k
+        self.initial = initial
+        # nome -> [rating, partidas, último data_unix]
+        self.teams: Dict[str, List] = {}
+        self.players: Dict[str, List] = {}
+        self.cursor: Tuple[int, int] = (0, 0)
+        # Até onde o MatchStore já foi lido (veja MatchStore.iter_since)
+        self.store_position: Tuple[int, int] = (0, 0)
+        self.matches = 0
+        self.history_parts: List[str] = []
+        # Linhas de histórico ainda não gravadas
+        self.pending: List[Tuple] = []
+
+    def _entry(self, table: Dict[str, List], name: str) -> List:
+        entry = table.get(name)
+        if entry is None:
+            entry = table[name] = [self.initial, 0, None]
+        return entry
+
+    def _update(self, entry: List, kind: str, name: str, side: str, delta: float, key: Tuple[int, int]) -> None:
+        self.pending.append((key[1], key[0], kind, name, side, entry[0], entry[0] + delta))
+        entry[0] += delta
+        entry[1] += 1
+        entry[2] = key[0]
+
+    def apply(self, record: Dict) -> bool:
+        """Aplica uma partida (registro do MatchStore). Retorna False se faltarem dados."""
+        key = match_order_key(record)
+        first, second = record.get("first_team"), record.get("second_team")
+        won = record.get("first_team_won")
+        if key is None or not first or not second or won is None:
+            return False
+        won = int(won)
+        multiplier = margin_multiplier(
+            (record.get("first_team_total_score") or 0) - (record.get("second_team_total_score") or 0)
+        )
+
+        a, b = self._entry(self.teams, first), self._entry(self.teams, second)
+        delta = self.team_k * multiplier * (won - expected_score(a[0], b[0]))
+        self._update(a, "team", first, "first", delta, key)
+        self._update(b, "team", second, "second", -delta, key)
+
+        sides = lineups(record.get("player_stats"))
+        if len(sides) == 2 and all(sides):
+            entries = [[self._entry(self.players, name) for name, _ in side] for side in sides]
+            strength = [sum(entry[0] for entry in side) / len(side) for side in entries]
+            for i, (side, side_entries, label) in enumerate(zip(sides, entries, ("first", "second"))):
+                score = won if i == 0 else 1 - won
+                change = self.player_k * multiplier * (score - expected_score(strength[i], strength[1 - i]))
+                performances = [perf for _, perf in side if perf and perf > 0]
+                mean = sum(performances) / len(performances) if performances else None
+                low, high = PERFORMANCE_WEIGHT
+                for (name, perf), entry in zip(side, side_entries):
+                    weight = 1.0
+                    if mean and perf and perf > 0:
+                        weight = min(high, max(low, perf / mean if score else mean / perf))
+                    self._update(entry, "player", name, label, change * weight, key)
+
+        self.cursor = max(self.cursor, key)
+        self.matches += 1
+        return True
+
+    # ------------------------------------------------------------------ persistência
+    def save(self, ratings_dir: str = RATINGS_DIR) -> None:
+        """
+        Grava as linhas de histórico pendentes como um novo arquivo Parquet e depois o
+        snapshot do estado (atômico), que lista os arquivos de histórico válidos.
+        """
+        history_dir = os.path.join(ratings_dir, "history")
+        os.makedirs(history_dir, exist_ok=True)
+        if self.pending:
+            name = f"part-{time.time_ns()}.parquet"
+            columns = list(zip(*self.pending))
+            table = pa.Table.from_arrays([pa.array(column, type=field.type)
+                                          for column, field in zip(columns, HISTORY_SCHEMA)], schema=HISTORY_SCHEMA)
+            pq.write_table(table, os.path.join(history_dir, name))
+            self.history_parts.append(name)
+            self.pending = []
+        state = {
+            "params": {"team_k": self.team_k, "player_k": self.player_k, "initial": self.initial},
+            "cursor": list(self.cursor),
+            "store_position": list(self.store_position),
+            "matches": self.matches,
+            "history_parts": self.history_parts,
+            "teams": self.teams,
+            "players": self.players,
+        }
+        atomic_write_text(os.path.join(ratings_dir, "state.json"), json.dumps(state, ensure_ascii=False))
+
+    @classmethod
+    def load(cls, ratings_dir: str = RATINGS_DIR) -> "RatingEngine":
+        """Estado salvo por `save` ou um motor vazio se ainda não houver snapshot."""
+        path = os.path.join(ratings_dir, "state.json")
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        engine = cls(**state["params"])
+        engine.cursor = tuple(state["cursor"])
+        engine.store_position = tuple(state.get("store_position", (0, 0)))
+        engine.matches = state["matches"]
+        engine.history_parts = state["history_parts"]
+        engine.teams = state["teams"]
+        engine.players = state["players"]
+        return engine
+
+    def applied_match_ids(self, ratings_dir: str = RATINGS_DIR) -> Set[int]:
+        """Ids das partidas já aplicadas (lê só a coluna match_id do histórico)."""
+        paths = [os.path.join(ratings_dir, "history", name) for name in self.history_parts]
+        if not paths:
+            return set()
+        table = pq.read_table(paths, columns=["match_id"], filters=[("kind", "=", "team")])
+        return set(table.column("match_id").to_pylist())
+
+    def ratings(self, kind: str = "team") -> pd.DataFrame:
+        """Ratings atuais, do maior para o menor."""
+        table = self.teams if kind == "team" else self.players
+        frame = pd.DataFrame.from_dict(table, orient="index", columns=["rating", "matches", "last_data_unix"])
+        return frame.sort_values("rating", ascending=False)
+
+
+def update_ratings(store_dir: str = "data/match_details", ratings_dir: str = RATINGS_DIR,
+                   rebuild: bool = False, records: Optional[Iterable[Dict]] = None) -> Dict[str, float]:
+    """
+    Aplica ao snapshot as partidas do MatchStore (ou `records`) que ainda não entraram, em
+    ordem de data_unix, e grava o novo estado. Do MatchStore só é lido o que foi anexado
+    desde a última atualização. Partidas mais antigas que a última aplicada não podem
+    entrar de forma incremental sem mudar o passado: são ignoradas com um aviso (use
+    `rebuild`, que recalcula tudo do zero).
+    """
+    start = time.perf_counter()
+    if rebuild:
+        shutil.rmtree(ratings_dir, ignore_errors=True)
+    engine = RatingEngine.load(ratings_dir)
+    applied = engine.applied_match_ids(ratings_dir)
+    end = None
+    if records is None:
+        store = open_match_store(store_dir)
+        end = store.end_position()
+        records = store.iter_since(engine.store_position, end)
+
+    # Por id, para ficar só com a versão mais recente de cada partida
+    new: Dict[int, Tuple[Tuple[int, int], Dict]] = {}
+    undated = 0
+    for record in records:
+        key = match_order_key(record)
+        if key is None:
+            undated += 1
+        elif key[1] not in applied:
+            new[key[1]] = (key, slim_record(record))
+    new = sorted(new.values(), key=lambda item: item[0])
+    late = [record for key, record in new if key < engine.cursor]
+    if late:
+        logging.warning(f"{len(late)} partidas anteriores à última aplicada ficaram de fora; "
+                        f"use --rebuild para incluí-las.")
+
+    count = sum(engine.apply(record) for key, record in new if key >= engine.cursor)
+    if end is not None:
+        engine.store_position = end
+    engine.save(ratings_dir)
+    seconds = time.perf_counter() - start
+    logging.info(f"{count} partidas aplicadas aos ratings em {seconds:.2f}s "
+                 f"({engine.matches} no total, {undated} sem data).")
+    return {"applied": count, "late": len(late), "undated": undated, "total": engine.matches, "seconds": seconds}
+
+
+def load_history(ratings_dir: str = RATINGS_DIR, kind: Optional[str] = None) -> pd.DataFrame:
+    """Histórico (Elo antes/depois por partida) em ordem cronológica."""
+    engine = RatingEngine.load(ratings_dir)
+    paths = [os.path.join(ratings_dir, "history", name) for name in engine.history_parts]
+    if not paths:
+        return HISTORY_SCHEMA.empty_table().to_pandas()
+    filters = [("kind", "=", kind)] if kind else None
+    history = pq.read_table(paths, filters=filters).to_pandas()
+    return history.sort_values(["data_unix", "match_id"], kind="stable").reset_index(drop=True)
+
+
+def ratings_at(timestamp_ms: int, kind: str = "team", ratings_dir: str = RATINGS_DIR,
+               history: Optional[pd.DataFrame] = None) -> pd.Series:
+    """
+    Rating de cada time (ou jogador) como estava antes de `timestamp_ms`: o valor depois da
+    última partida estritamente anterior. Para backtests, passe `history` já carregado.
+    """
+    if history is None:
+        history = load_history(ratings_dir, kind)
+    else:
+        history = history[history["kind"] == kind]
+    before = history[history["data_unix"] < timestamp_ms]
+    return before.groupby("name", sort=False)["after"].last().sort_values(ascending=False)
+
+
+def pre_match_ratings(ratings_dir: str = RATINGS_DIR) -> pd.DataFrame:
+    """
+    Uma linha por partida com os Elos conhecidos antes dela (sem vazamento do resultado):
+    Elo de cada time, média do Elo das escalações e a probabilidade Elo do first_team.
+    """
+    history = load_history(ratings_dir)
+    before = history.pivot_table(index="match_id", columns=["kind", "side"], values="before", aggfunc="mean")
+    features = pd.DataFrame(index=before.index)
+    for side in ("first", "second"):
+        features[f"team_elo_{side}"] = before[("team", side)]
+        features[f"player_elo_{side}"] = before[("player", side)] if ("player", side) in before else float("nan")
+    features["elo_expected_first"] = 1.0 / (1.0 + 10 ** ((features["team_elo_second"]
+                                                          - features["team_elo_first"]) / 400.0))
+    return features
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ratings Elo de times e jogadores.")
+    parser.add_argument("--ratings-dir", default=RATINGS_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update = subparsers.add_parser("update", help="Aplica as partidas novas do MatchStore")
+    update.add_argument("--store-dir", default="data/match_details")
+    update.add_argument("--rebuild", action="store_true", help="Recalcula tudo do zero")
+    update.add_argument("--compact-dir", help="Lê as partidas do histórico compacto (compact_history) em vez do MatchStore")
+
+    at = subparsers.add_parser("at", help="Ratings em uma data (YYYY-MM-DD ou data_unix em ms)")
+    at.add_argument("when")
+    at.add_argument("--kind", choices=("team", "player"), default="team")
+    at.add_argument("--top", type=int, default=20)
+
+    args = parser.parse_args(argv)
+    if args.command == "update":
+        records = None
+        if args.compact_dir:
+            from compact_history import CompactHistory
+            records = CompactHistory(args.compact_dir).iter_records()
+        print(update_ratings(args.store_dir, args.ratings_dir, args.rebuild, records))
+    else:
+        when = int(args.when) if args.when.isdigit() else int(pd.Timestamp(args.when).timestamp() * 1000)
+        print(ratings_at(when, args.kind, args.ratings_dir).head(args.top).to_string())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
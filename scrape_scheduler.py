@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import instrumentation
+from hltv_parser import ChallengeError
+from http_fetcher import ThrottledError
+
+
+class TokenBucket:
+    """
+    Limite de taxa por host: `rate` requisições por segundo, com rajadas de até `capacity`.
+    Implementado como GCRA (reserva do horário de saída), sem locks, então o mesmo
+    bucket pode ser usado por vários event loops sucessivos (um por `run_sync`).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._interval = 1.0 / rate
+        self._tolerance = (capacity - 1) * self._interval
+        self._tat = time.monotonic()
+
+    def pause(self, seconds: float) -> None:
+        """Suspende o host (ex.: Retry-After de uma resposta 429) e descarta a rajada acumulada."""
+        self._tat = max(self._tat, time.monotonic() + seconds + self._tolerance)
+
+    def reserve(self) -> float:
+        """Reserva uma ficha e retorna quantos segundos esperar antes de usá-la."""
+        now = time.monotonic()
+        tat = max(self._tat, now)
+        self._tat = tat + self._interval
+        return max(0.0, tat - self._tolerance - now)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AIMDController:
+    """
+    Ajusta o limite de concorrência: aumento aditivo (+1 a cada `limit` sucessos rápidos)
+    e redução multiplicativa em sinais de congestionamento (latência acima do alvo,
+    429 ou desafio do Cloudflare). Reduções ficam espaçadas por `cooldown` segundos
+    para que uma rajada de erros da mesma janela conte uma vez só.
+    """
+
+    def __init__(self, initial: int = 2, minimum: int = 1, maximum: int = 8,
+                 target_latency: float = 8.0, decrease_factor: float = 0.5, cooldown: float = 5.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self._last_decrease = 0.0
+
+    @property
+    def concurrency(self) -> int:
+        return int(self.limit)
+
+    def on_success(self, latency: float) -> None:
+        if latency > self.target_latency:
+            self.on_congestion()
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_congestion(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+        logging.info(f"Congestionamento detectado. Concorrência reduzida para {self.concurrency}.")
+
+
+class _ConcurrencyGate:
+    """Semáforo cujo limite acompanha o AIMDController."""
+
+    def __init__(self, controller: AIMDController):
+        self._controller = controller
+        self._active = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self._controller.concurrency)
+            self._active += 1
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+
+def url_host(item: Any) -> str:
+    """Host de um item: a própria URL ou o campo 'url' de um dicionário."""
+    url = item.get("url") if isinstance(item, dict) else item
+    return urlparse(url).netloc
+
+
+class AsyncScheduler:
+    """
+    Executa uma função (bloqueante ou async) sobre uma lista de itens com asyncio,
+    respeitando um token bucket por host, concorrência adaptativa (AIMD) e
+    retry com backoff exponencial por item.
+
+    `ThrottledError` (429) e `ChallengeError` (Cloudflare) reduzem a concorrência e
+    pausam o host; outras exceções apenas contam como tentativa. O estado (fichas,
+    limite de concorrência, estatísticas) persiste entre chamadas de `run`.
+    """
+
+    def __init__(self, rate_per_host: float = 0.5, burst: float = 1, initial_concurrency: int = 2,
+                 max_concurrency: int = 4, target_latency: float = 8.0, max_retries: int = 3,
+                 backoff_base: float = 2.0, backoff_max: float = 120.0,
+                 host_of: Callable[[Any], str] = url_host):
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.host_of = host_of
+        self.controller = AIMDController(initial=initial_concurrency, maximum=max_concurrency,
+                                         target_latency=target_latency)
+        self.stats = {"success": 0, "retries": 0, "throttled": 0, "challenges": 0, "failed": 0}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _count(self, event: str) -> None:
+        """Atualiza `stats` e o contador `hltv_scheduler_events_total{event}`."""
+        self.stats[event] += 1
+        instrumentation.inc("scheduler_events", event=event)
+
+    def _bucket(self, host: str) -> TokenBucket:
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate_per_host, self.burst)
+        return self._buckets[host]
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.5)
+
+    async def _call(self, job: Callable, item: Any) -> Any:
+        if asyncio.iscoroutinefunction(job):
+            return await job(item)
+        return await asyncio.to_thread(job, item)
+
+    async def run(self, items: Iterable[Any], job: Callable[[Any], Any],
+                  on_done: Optional[Callable[[Any, Any], None]] = None) -> List[Any]:
+        """
+        Processa os itens e retorna os resultados na ordem de entrada
+        (None para os que esgotaram as tentativas). `on_done(item, result)` é chamado
+        a cada item concluído.
+        """
+        items = list(items)
+        results: List[Any] = [None] * len(items)
+        queue: asyncio.Queue = asyncio.Queue()
+        gate = _ConcurrencyGate(self.controller)
+        pending_retries = set()
+        for position in range(len(items)):
+            queue.put_nowait((position, 0))
+
+        async def requeue(position: int, attempt: int, delay: float) -> None:
+            await asyncio.sleep(delay)
+            await queue.put((position, attempt))
+            queue.task_done()
+
+        def finish(position: int, result: Any) -> None:
+            results[position] = result
+            if on_done is not None:
+                on_done(items[position], result)
+            queue.task_done()
+
+        async def worker() -> None:
+            while True:
+                position, attempt = await queue.get()
+                item = items[position]
+                bucket = self._bucket(self.host_of(item))
+                try:
+                    queued = time.monotonic()
+                    async with gate:
+                        instrumentation.observe("concurrency_wait_seconds", time.monotonic() - queued)
+                        queued = time.monotonic()
+                        await bucket.acquire()
+                        start = time.monotonic()
+                        instrumentation.observe("rate_limit_wait_seconds", start - queued)
+                        result = await self._call(job, item)
+                    latency = time.monotonic() - start
+                    instrumentation.observe("job_seconds", latency)
+                    self.controller.on_success(latency)
+                    self._count("success")
+                    finish(position, result)
+                    continue
+                except ThrottledError as e:
+                    self._count("throttled")
+                    self.controller.on_congestion()
+                    delay = e.retry_after if e.retry_after is not None else self._backoff(attempt)
+                    bucket.pause(delay)
+                    logging.warning(f"429 em {self.host_of(item)}. Pausando por {delay:.1f}s.")
+                except ChallengeError as e:
+                    self._count("challenges")
+                    self.controller.on_congestion()
+                    delay = self._backoff(attempt)
+                    bucket.pause(delay)
+                    logging.warning(f"Desafio do Cloudflare ({e}). Pausando por {delay:.1f}s.")
+                except Exception as e:
+                    delay = self._backoff(attempt)
+                    logging.error(f"Erro ao processar {item if not isinstance(item, dict) else item.get('url')}: {e}")
+                finally:
+                    instrumentation.set_gauge("scheduler_concurrency", self.controller.concurrency)
+
+                if attempt + 1 > self.max_retries:
+                    self._count("failed")
+                    finish(position, None)
+                    continue
+                self._count("retries")
+                task = asyncio.create_task(requeue(position, attempt + 1, delay))
+                pending_retries.add(task)
+                task.add_done_callback(pending_retries.discard)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.controller.maximum)]
+        try:
+            await queue.join()
+        finally:
+            for task in workers + list(pending_retries):
+                task.cancel()
+            await asyncio.gather(*workers, *pending_retries, return_exceptions=True)
+        return results
+
+    def run_sync(self, items: Iterable[Any], job: Callable[[Any], Any],
+                 on_done: Optional[Callable[[Any, Any], None]] = None) -> List[Any]:
+        """Versão síncrona de `run`, para os scripts que não usam asyncio."""
+        return asyncio.run(self.run(items, job, on_done))
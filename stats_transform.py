@@ -0,0 +1,111 @@
+import logging
+from typing import Dict, Iterable, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Campos de cada jogador em `player_stats`, como gravados pelo extrator
+PLAYER_STAT_FIELDS = ["team", "player", "k_d", "plus_minus", "adr", "kast", "rating"]
+PLAYER_STATS_TYPE = pa.list_(pa.struct([(field, pa.string()) for field in PLAYER_STAT_FIELDS]))
+
+K_D_PATTERN = r"^\s*(?P<k>\d+)\s*-\s*(?P<d>\d+)\s*$"
+INT_PATTERN = r"^[+-]?\d+$"
+FLOAT_PATTERN = r"^[+-]?(\d+\.?\d*|\.\d+)$"
+
+# Inteiros convertidos viram Int16 (nullable) no pandas, para manter <NA> sem virar float
+PANDAS_TYPES = {pa.int16(): pd.Int16Dtype()}
+
+
+def flatten_player_stats(records: Iterable[Dict], meta: Sequence[str] = ("match_id",)) -> pa.Table:
+    """
+    Tabela Arrow com uma linha por jogador/partida e os valores ainda em texto, mais as
+    colunas `meta` de cada partida. Partidas sem `player_stats` são ignoradas.
+    """
+    records = [record for record in records if record.get("player_stats")]
+    stats = pa.array([record["player_stats"] for record in records], type=PLAYER_STATS_TYPE)
+    parents = pc.list_parent_indices(stats)
+    columns = {key: pc.take(pa.array([record.get(key) for record in records]), parents) for key in meta}
+    flat = stats.flatten()
+    for field in PLAYER_STAT_FIELDS:
+        columns[field] = flat.field(field)
+    return pa.table(columns)
+
+
+def _parse_number(values: pa.ChunkedArray, target: pa.DataType, pattern: str) -> pa.Array:
+    """Converte texto em número; o que não casar com `pattern` vira nulo em vez de erro."""
+    values = pc.utf8_ltrim(pc.utf8_trim_whitespace(values.combine_chunks()), characters="+")
+    try:
+        # Caminho rápido: a coluna inteira é válida (o caso normal)
+        return pc.cast(values, target)
+    except pa.ArrowInvalid:
+        valid = pc.match_substring_regex(values, pattern)
+        return pc.cast(pc.if_else(valid, values, pa.scalar(None, pa.string())), target)
+
+
+def _parse_k_d(values: pa.ChunkedArray) -> Tuple[pa.Array, pa.Array]:
+    """Separa "kills-deaths" em duas colunas int16; valores fora do formato viram nulos."""
+    values = values.combine_chunks()
+    parts = pc.split_pattern(values, "-")
+    if pc.all(pc.equal(pc.list_value_length(parts), 2)).as_py() is not False:
+        try:
+            return (pc.cast(pc.list_element(parts, 0), pa.int16()),
+                    pc.cast(pc.list_element(parts, 1), pa.int16()))
+        except pa.ArrowInvalid:
+            pass
+    k_d = pc.extract_regex(values, K_D_PATTERN)
+    return pc.cast(pc.struct_field(k_d, "k"), pa.int16()), pc.cast(pc.struct_field(k_d, "d"), pa.int16())
+
+
+def parse_player_stats(raw: pa.Table) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Converte as colunas de texto de `flatten_player_stats` em tipos compactos:
+    k, d e plus_minus em Int16, kd/adr/kast/rating em float32 e team/player categóricos.
+
+    Valores que não puderem ser convertidos viram <NA> em vez de interromper a conversão.
+    Retorna (dados, malformados), em que `malformados` tem uma linha por valor inválido
+    com a posição da linha, o campo e o texto original.
+    """
+    k, d = _parse_k_d(raw.column("k_d"))
+    kast = pa.chunked_array([pc.utf8_rtrim(raw.column("kast").combine_chunks(), characters="%")])
+    parsed = {
+        "k": k,
+        "d": d,
+        "plus_minus": _parse_number(raw.column("plus_minus"), pa.int16(), INT_PATTERN),
+        "adr": _parse_number(raw.column("adr"), pa.float32(), FLOAT_PATTERN),
+        "kast": _parse_number(kast, pa.float32(), FLOAT_PATTERN),
+        "rating": _parse_number(raw.column("rating"), pa.float32(), FLOAT_PATTERN),
+    }
+
+    problems = []
+    for field, source in (("k", "k_d"), ("plus_minus", "plus_minus"), ("adr", "adr"),
+                          ("kast", "kast"), ("rating", "rating")):
+        if parsed[field].null_count:
+            rows = pc.indices_nonzero(parsed[field].is_null())
+            problems.append(pd.DataFrame({
+                "row": rows.to_numpy(),
+                "field": source,
+                "value": raw.column(source).take(rows).to_pandas(),
+            }))
+    malformed = (pd.concat(problems, ignore_index=True) if problems
+                 else pd.DataFrame(columns=["row", "field", "value"]))
+
+    columns = {name: raw.column(name) for name in raw.column_names if name not in PLAYER_STAT_FIELDS}
+    columns["team"] = pc.dictionary_encode(raw.column("team"))
+    columns["player"] = pc.dictionary_encode(raw.column("player"))
+    columns.update(parsed)
+    frame = pa.table(columns).to_pandas(types_mapper=PANDAS_TYPES.get)
+    frame["kd"] = (frame["k"].astype("float32") / frame["d"].astype("float32")).astype("float32")
+    return frame, malformed
+
+
+def player_stats_frame(records: Iterable[Dict], meta: Sequence[str] = ("match_id",)) -> pd.DataFrame:
+    """Achata e converte `player_stats`, registrando no log os valores malformados."""
+    frame, malformed = parse_player_stats(flatten_player_stats(records, meta))
+    if len(malformed):
+        logging.warning(f"{len(malformed)} valores malformados em player_stats "
+                        f"({malformed['row'].nunique()} linhas); convertidos para NA.")
+        for row in malformed.head(10).itertuples(index=False):
+            keys = ", ".join(f"{key}={frame.at[row.row, key]}" for key in meta)
+            logging.warning(f"  {keys}: {row.field}={row.value!r}")
+    return frame
@@ -0,0 +1,190 @@
+import hashlib
+import importlib
+import logging
+import os
+import re
+import time
+import tracemalloc
+from typing import Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.svm import SVC
+from xgboost import XGBClassifier
+
+MODEL_CACHE_DIR = "data/model_cache"
+RESULT_COLUMNS = ["Modelo", "Acurácia Treino", "Acurácia Teste", "Diferença Treino-Teste"]
+
+
+def default_models() -> Dict[str, object]:
+    """Os modelos comparados no notebook, com os mesmos hiperparâmetros."""
+    return {
+        "Random Forest Gini": RandomForestClassifier(criterion='gini', n_estimators=100, random_state=42),
+        "Random Forest Entropy": RandomForestClassifier(criterion='entropy', n_estimators=100, random_state=42),
+        "Random Forest Log Loss": RandomForestClassifier(criterion='log_loss', n_estimators=100, random_state=42),
+        "Logistic Regression lbfgs": LogisticRegression(solver='lbfgs', max_iter=5000, random_state=42),
+        "Logistic Regression liblinear": LogisticRegression(solver='liblinear', max_iter=5000, random_state=42),
+        "Logistic Regression newton-cg": LogisticRegression(solver='newton-cg', max_iter=5000, random_state=42),
+        "Logistic Regression newton-cholesky": LogisticRegression(solver='newton-cholesky', max_iter=5000, random_state=42),
+        "Logistic Regression sag": LogisticRegression(solver='sag', max_iter=5000, random_state=42),
+        "Logistic Regression saga": LogisticRegression(solver='saga', max_iter=5000, random_state=42),
+        "Gradient Boosting": GradientBoostingClassifier(n_estimators=100, learning_rate=0.1, random_state=42),
+        "Support Vector Machine rbf": SVC(kernel='rbf', probability=True, random_state=42),
+        "Support Vector Machine poly": SVC(kernel='poly', probability=True, random_state=42),
+        "Support Vector Machine linear": SVC(kernel='linear', probability=True, random_state=42),
+        "Support Vector Machine sigmoid": SVC(kernel='sigmoid', probability=True, random_state=42),
+        "XGBoost": XGBClassifier(n_estimators=100, use_label_encoder=False, eval_metric='logloss', random_state=42),
+    }
+
+
+def data_fingerprint(X, y) -> str:
+    """Hash do conteúdo de X e y (valores, colunas e tipos), independente de onde vieram."""
+    digest = hashlib.sha256()
+    for data in (X, y):
+        if isinstance(data, pd.DataFrame):
+            schema = [(str(column), str(dtype)) for column, dtype in data.dtypes.items()]
+        elif isinstance(data, pd.Series):
+            schema = [(str(data.name), str(data.dtype))]
+        else:
+            data = np.ascontiguousarray(data)
+            digest.update(repr((data.shape, str(data.dtype))).encode())
+            digest.update(data.tobytes())
+            continue
+        digest.update(repr(schema).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def estimator_package_version(model) -> str:
+    """Versão do pacote de topo do estimador (sklearn, xgboost...), que define o formato do pickle."""
+    package = type(model).__module__.split(".")[0]
+    return f"{package}=={getattr(importlib.import_module(package), '__version__', 'unknown')}"
+
+
+def model_key(model, fingerprint: str) -> str:
+    """
+    Chave de cache: classe, hiperparâmetros, versões do scikit-learn e do pacote do estimador
+    (ex.: xgboost) + hash dos dados de treino.
+    """
+    params = sorted((name, repr(value)) for name, value in model.get_params(deep=True).items())
+    versions = f"{sklearn.__version__}|{estimator_package_version(model)}"
+    payload = f"{type(model).__module__}.{type(model).__qualname__}|{params}|{versions}|{fingerprint}"
+    return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+
+def _cache_path(cache_dir: Optional[str], name: str, model, fingerprint: str) -> Optional[str]:
+    if cache_dir is None:
+        return None
+    slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+    return os.path.join(cache_dir, f"{slug}-{model_key(model, fingerprint)}.joblib")
+
+
+def _fit(name: str, model, X, y, cache_path: Optional[str]) -> Tuple[object, Dict]:
+    """
+    Treina um modelo (ou carrega do cache) medindo tempo e pico de memória alocada
+    pelo Python/numpy durante o treino. Roda no processo do worker.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    cached = cache_path is not None and os.path.exists(cache_path)
+    if cached:
+        model = joblib.load(cache_path)
+    else:
+        model.fit(X, y)
+        if cache_path is not None:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            joblib.dump(model, tmp_path)
+            os.replace(tmp_path, cache_path)
+    fit_seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return model, {"Modelo": name, "Em cache": cached, "Tempo de treino (s)": fit_seconds,
+                   "Pico de memória (MiB)": peak / 2 ** 20}
+
+
+def _fit_and_evaluate(name: str, model, X_train, y_train, X_test, y_test,
+                      cache_path: Optional[str]) -> Tuple[object, Dict]:
+    model, stats = _fit(name, model, X_train, y_train, cache_path)
+    start = time.perf_counter()
+    train_acc = accuracy_score(y_train, model.predict(X_train))
+    y_pred = model.predict(X_test)
+    test_acc = accuracy_score(y_test, y_pred)
+    stats.update({
+        "Acurácia Treino": train_acc,
+        "Acurácia Teste": test_acc,
+        "Diferença Treino-Teste": train_acc - test_acc,
+        "Tempo de avaliação (s)": time.perf_counter() - start,
+        "Matriz de Confusão": confusion_matrix(y_test, y_pred),
+        "Relatório de Classificação": classification_report(y_test, y_pred, digits=4),
+    })
+    return model, stats
+
+
+def fit_models(models: Dict[str, object], X, y, n_jobs: int = -1,
+               cache_dir: Optional[str] = MODEL_CACHE_DIR) -> Tuple[Dict[str, object], pd.DataFrame]:
+    """
+    Treina todos os modelos em paralelo (um processo por modelo, via joblib), reaproveitando
+    do cache os que já foram treinados com os mesmos dados e hiperparâmetros.
+    Retorna (modelos treinados, tempo/memória por modelo).
+    """
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = data_fingerprint(X, y)
+    start = time.perf_counter()
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit)(name, model, X, y, _cache_path(cache_dir, name, model, fingerprint))
+        for name, model in models.items()
+    )
+    _log_timing([stats for _, stats in outputs], time.perf_counter() - start)
+    fitted = {stats["Modelo"]: model for model, stats in outputs}
+    return fitted, pd.DataFrame([stats for _, stats in outputs])
+
+
+def evaluate_models(models: Dict[str, object], X_train, y_train, X_test, y_test, n_jobs: int = -1,
+                    cache_dir: Optional[str] = MODEL_CACHE_DIR) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, object]]:
+    """
+    Treina e avalia os modelos em paralelo. Retorna (resultados, detalhes, modelos treinados):
+    `resultados` tem as mesmas colunas do `results_df_geom` do notebook, na ordem de `models`;
+    `detalhes` acrescenta tempo, pico de memória, uso do cache, matriz de confusão e relatório.
+    """
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = data_fingerprint(X_train, y_train)
+    start = time.perf_counter()
+    outputs = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_evaluate)(name, model, X_train, y_train, X_test, y_test,
+                                   _cache_path(cache_dir, name, model, fingerprint))
+        for name, model in models.items()
+    )
+    _log_timing([stats for _, stats in outputs], time.perf_counter() - start)
+    details = pd.DataFrame([stats for _, stats in outputs])
+    fitted = {stats["Modelo"]: model for model, stats in outputs}
+    return details[RESULT_COLUMNS].copy(), details, fitted
+
+
+def _log_timing(stats, wall_seconds: float) -> None:
+    serial = sum(s["Tempo de treino (s)"] for s in stats)
+    cached = sum(s["Em cache"] for s in stats)
+    logging.info(f"{len(stats)} modelos ({cached} do cache) em {wall_seconds:.1f}s "
+                 f"(soma dos tempos individuais: {serial:.1f}s).")
+
+
+def print_report(details: pd.DataFrame) -> None:
+    """Imprime, por modelo, o mesmo relatório que o laço do notebook imprimia."""
+    for row in details.to_dict("records"):
+        print(f"\n{row['Modelo']} - Acurácia Treino: {row['Acurácia Treino']:.4f} | "
+              f"Acurácia Teste: {row['Acurácia Teste']:.4f}")
+        print(f"Overfitting Gap: {row['Diferença Treino-Teste']:.4f}")
+        print(f"Treino: {row['Tempo de treino (s)']:.2f}s{' (cache)' if row['Em cache'] else ''} | "
+              f"Pico de memória: {row['Pico de memória (MiB)']:.1f} MiB")
+        print("\nMatriz de Confusão:")
+        print(row["Matriz de Confusão"])
+        print("\nRelatório de Classificação:")
+        print(row["Relatório de Classificação"])
+        print("-" * 50)